@@ -0,0 +1,185 @@
+# An agent-based version of siqar_test.py in which contact tracing follows the actual contacts.
+# siqar_test.py assumes that every symptomatic positive leads to one asymptomatic in quarantine (delta * Np).
+# Here every agent has a state of siqar_test.py (S, I, Q, A, R, Rq) and contacts on a fixed graph, and a day is
+#   infection  every infectious agent (I or A, not quarantined) infects each of its susceptible contacts with
+#              probability (beta1 + beta2) / (mean degree), symptomatic (I) with probability beta1 / (beta1 + beta2)
+#   testing    half of the Test tests go to the symptomatic, the agents in I and the Flu people with a flu-like
+#              disease (a pool of Flu uninfected people, not agents), so Test * I / (2 * (I + Flu)) positives
+#              on average as in siqar_test.py
+#   tracing    the other half of the tests (and what the symptomatic did not use) go to the contacts of the
+#              positives of the day, found by breadth-first search on the graph up to depth levels: the
+#              contacts of the positives are tested, the positives among them (I or A) are quarantined and
+#              their contacts form the next level. When a level has more contacts than tests left, a random
+#              subset is tested.
+#   recovery   I and A recover (R) with probability gamma1 and gamma2, Q with probability gamma1 (to Rq)
+#
+# The agents are arrays, not objects: the states are one uint8 array, and the graph is in CSR form (the contacts
+# of agent i are indices[indptr[i]:indptr[i+1]], int32, each contact stored in both directions). The infection
+# and the search work on the edges of whole sets of agents at once (the frontier of the search). With Numba the
+# infection runs as a compiled loop over the infectious agents in parallel threads (threads=True; the
+# random numbers of the threads are not seeded, so these runs are not reproducible).
+#
+#   indptr, indices = random_graph(10 ** 6, 10)
+#   history = simulate(indptr, indices, dict(Test=2000, Flu=1000), T=100, depth=2)
+#   history['I'], history['traced']          # the number of agents in I and the positives found by tracing per day
+#
+# python agents.py [n] runs 1e6 agents (or n) for 100 days with and without tracing.
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+    prange = range
+
+STATES = ('S', 'I', 'Q', 'A', 'R', 'Rq')
+S, I, Q, A, R, RQ = range(6)
+PARAMS = dict(beta1=0.25, beta2=0.25, gamma1=0.2, gamma2=0.2, Test=700, Flu=1000)
+
+
+def _jit(f):
+    return njit(cache=True, parallel=True)(f) if njit else f
+
+
+# A random contact graph of n agents with the given mean degree (the contacts drawn uniformly, as in the
+# mixing of the ODE models), in CSR form. Self-contacts are dropped.
+def random_graph(n, degree, seed=0):
+    rng = np.random.default_rng(seed)
+    m = n * degree // 2
+    a = rng.integers(0, n, m, dtype=np.int32)
+    b = rng.integers(0, n, m, dtype=np.int32)
+    keep = a != b
+    a, b = a[keep], b[keep]
+    # both directions, grouped by the first agent
+    source = np.concatenate([a, b])
+    indices = np.concatenate([b, a])
+    del a, b
+    order = np.argsort(source, kind='stable')
+    indices = indices[order]
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(source, minlength=n), out=indptr[1:])
+    return indptr, indices
+
+
+# The contacts of the agents in nodes, as one array (with repetitions).
+def neighbours(indptr, indices, nodes):
+    start, stop = indptr[nodes], indptr[nodes + 1]
+    count = stop - start
+    total = count.sum()
+    if total == 0:
+        return indices[:0]
+    # the positions start[k], ..., stop[k]-1 of every node, without a Python loop
+    offset = np.repeat(start - np.cumsum(count) + count, count)
+    return indices[offset + np.arange(total)]
+
+
+def _infect_numpy(indptr, indices, state, sources, p, rng):
+    contacts = neighbours(indptr, indices, sources)
+    hit = contacts[rng.random(len(contacts)) < p]
+    return np.unique(hit[state[hit] == S])
+
+
+def _infect_kernel(indptr, indices, state, sources, p, flag):
+    for k in prange(len(sources)):
+        i = sources[k]
+        for e in range(indptr[i], indptr[i + 1]):
+            j = indices[e]
+            if state[j] == 0 and np.random.random() < p:
+                flag[j] = 1
+
+
+_infect_jit = _jit(_infect_kernel)
+
+
+def _infect_threads(indptr, indices, state, sources, p, flag):
+    _infect_jit(indptr, indices, state, sources, p, flag)
+    hit = np.flatnonzero(flag)
+    flag[hit] = 0
+    return hit
+
+
+# Trace from the positives of the day with at most budget tests. Returns the agents found positive.
+def _trace(indptr, indices, state, positives, budget, depth, seen, day, rng):
+    found = []
+    frontier = positives
+    seen[frontier] = day
+    for level in range(depth):
+        if budget <= 0 or len(frontier) == 0:
+            break
+        contacts = np.unique(neighbours(indptr, indices, frontier))
+        contacts = contacts[(seen[contacts] != day) & (state[contacts] != Q) & (state[contacts] != RQ)]
+        if len(contacts) > budget:
+            contacts = rng.choice(contacts, budget, replace=False)
+        seen[contacts] = day
+        budget -= len(contacts)
+        frontier = contacts[(state[contacts] == I) | (state[contacts] == A)]
+        state[frontier] = Q
+        found.append(frontier)
+    return np.concatenate(found) if found else positives[:0]
+
+
+# Simulate T days on the graph (indptr, indices) with the parameters p (missing entries take the defaults of
+# siqar_test.py) from I0 and A0 random agents in I and A. depth is the depth of the tracing (0 for none).
+# Returns the number of agents in every state on every day, and the new positives of the testing of the
+# symptomatic and of the tracing, as a dict of arrays of length T.
+def simulate(indptr, indices, p=None, I0=0, A0=500, T=100, depth=1, threads=False, seed=0):
+    p = p or {}
+    p = dict(PARAMS, **p)
+    n = len(indptr) - 1
+    rng = np.random.default_rng(seed)
+    state = np.zeros(n, dtype=np.uint8)
+    start = rng.choice(n, I0 + A0, replace=False)
+    state[start[:I0]], state[start[I0:]] = I, A
+    seen = np.full(n, -1, dtype=np.int32)
+    flag = np.zeros(n, dtype=np.uint8)
+    beta = p['beta1'] + p['beta2']
+    contact = beta / (len(indices) / n)
+    history = {c: np.empty(T, dtype=np.int64) for c in STATES + ('tested', 'traced')}
+    for day in range(T):
+        counts = np.bincount(state, minlength=6)
+        for c, k in zip(STATES, counts):
+            history[c][day] = k
+        infectious = np.flatnonzero((state == I) | (state == A)).astype(np.int32)
+        if threads and njit:
+            new = _infect_threads(indptr, indices, state, infectious, contact, flag)
+        else:
+            new = _infect_numpy(indptr, indices, state, infectious, contact, rng)
+        # the tests of the symptomatic: the positives among the tests drawn from I + Flu
+        sick = infectious[state[infectious] == I]
+        tests = int(min(p['Test'] // 2, len(sick) + p['Flu']))
+        hits = rng.hypergeometric(len(sick), int(p['Flu']), tests) if tests else 0
+        positives = rng.choice(sick, hits, replace=False)
+        # the quarantined of the days before, the new ones do not leave on the day they arrive (siqar_test.py)
+        quarantined = np.flatnonzero(state == Q)
+        state[positives] = Q
+        traced = _trace(indptr, indices, state, positives, int(p['Test']) - tests, depth, seen, day, rng)
+        history['tested'][day], history['traced'][day] = hits, len(traced)
+        # recovery, and the new infections of the day join I or A
+        u = rng.random(len(infectious))
+        still = state[infectious]
+        state[infectious[(still == I) & (u < p['gamma1'])]] = R
+        state[infectious[(still == A) & (u < p['gamma2'])]] = R
+        state[quarantined[rng.random(len(quarantined)) < p['gamma1']]] = RQ
+        state[new] = np.where(rng.random(len(new)) < p['beta1'] / beta, I, A)
+    return history
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    n = int(float(sys.argv[1])) if len(sys.argv) > 1 else 10 ** 6
+    start = time.perf_counter()
+    indptr, indices = random_graph(n, 10)
+    print('%d agents with 10 contacts each: graph in %.1f s, %.0f MB'
+          % (n, time.perf_counter() - start, (indptr.nbytes + indices.nbytes) / 1e6))
+    p = dict(Test=n // 1000, Flu=n // 1000)
+    for depth, threads in ((0, False), (1, False), (2, False), (2, True)):
+        start = time.perf_counter()
+        h = simulate(indptr, indices, p, A0=n // 20000, depth=depth, threads=threads)
+        infected = h['I'] + h['A']
+        print('    tracing depth %d%s: %.1f s for 100 days, peak of I+A %d on day %d, %d positives by testing, '
+              '%d by tracing, %d never infected'
+              % (depth, ' (threads)' if threads else '', time.perf_counter() - start, infected.max(),
+                 infected.argmax(), h['tested'].sum(), h['traced'].sum(), h['S'][-1]))
@@ -0,0 +1,263 @@
+# The best split of a fixed daily budget of tests, or of a fixed daily supply of vaccine doses, among the groups
+# of a stratified model (stratified.py) and over time, to minimize the final size or the peak.
+# The budget is spent in periods of a few days (piecewise constant): in period p, group k gets the share
+# w[p, k] = softmax(z[p])_k of the tests and of the doses (a share of the budget, so every schedule spends
+# the budget exactly and the shares are free parameters z). On top of the rates of stratified.py,
+#   testing      the tests of group k find s * tests_k * I_k / (S_k + I_k) infected people per day, as the r_k of
+#                stratified.py (which stays as the testing outside the budget)
+#   vaccination  the doses go to the susceptible and removed of the group (the infectious are not
+#                vaccinated), and protect efficacy * doses_k * S_k / (S_k + R_k) susceptible people per day (S to R)
+# and the objective is
+#   'final'      the infections within the horizon, the integral of sum_k infection_k
+#   'peak'       the peak of sum_k I_k, smoothed as the L^q mean N (1/T int (sum I / N)^q dt)^(1/q): with q = 20
+#                the days near the peak dominate, and unlike the maximum it has a gradient at every day
+#
+# The model is integrated by RK4 with a fixed step, and the gradient by the shares is the exact gradient of
+# the discrete integration: the adjoint of the RK4 steps is integrated back from the horizon with the vector-
+# Jacobian products of the rates, so one gradient costs about two runs whatever the number of shares (50
+# groups, 13 periods and two budgets are 1300 parameters). Both passes are compiled with Numba (plain NumPy
+# without it). The shares are optimized by L-BFGS from several starts (the first the split in proportion to the
+# sizes of the groups, the others random) in parallel processes, and the best schedule is returned.
+#
+#   strat = Stratified(sizes, contacts, beta=0.27, gamma=0.15)
+#   best = optimize(strat, strat.initial(I0), tests=2e5, doses=5e5, days=180, period=15)
+#   best['tests'], best['doses']     # tests and doses per day of every group in every period, shape (P, K)
+#   best['final'], best['peak']      # and the same for the proportional split: best['baseline']
+#
+# python allocation.py plans tests and doses for 50 age and region groups over 180 days.
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+def _jit(f):
+    return njit(cache=True)(f) if njit else f
+
+
+# The rates of the model in the state y = (S, I, R, c) (c the integral of the objective) with tests and doses
+# per day of every group. Returns dy/dt.
+@_jit
+def _deriv(y, K, N, C, beta, gamma, s, r, v, efficacy, tests, doses, total, q, peak):
+    S, I, R = y[:K], y[K:2 * K], y[2 * K:3 * K]
+    force = beta * (C @ (I / N))
+    infection = (1 - v) * force * S
+    testing = s * (r * N + tests) * I / np.maximum(S + I, 1e-12)
+    vaccination = efficacy * doses * S / np.maximum(S + R, 1e-12)
+    recovery = gamma * I
+    dy = np.empty(3 * K + 1)
+    dy[:K] = -infection - vaccination
+    dy[K:2 * K] = infection - recovery - testing
+    dy[2 * K:3 * K] = recovery + testing + vaccination
+    dy[3 * K] = (I.sum() / total) ** q if peak else infection.sum()
+    return dy
+
+
+# The vector-Jacobian product a . d(dy/dt) by the state, by the tests and by the doses.
+@_jit
+def _vjp(y, a, K, N, C, beta, gamma, s, r, v, efficacy, tests, doses, total, q, peak):
+    S, I, R = y[:K], y[K:2 * K], y[2 * K:3 * K]
+    aS, aI, aR, ac = a[:K], a[K:2 * K], a[2 * K:3 * K], a[3 * K]
+    force = beta * (C @ (I / N))
+    # the cotangents of the flows, from the compartments they leave and enter
+    d_infection = aI - aS + (0.0 if peak else ac)
+    d_testing = aR - aI
+    d_vaccination = aR - aS
+    d_recovery = aR - aI
+    SI = np.maximum(S + I, 1e-12)
+    SR = np.maximum(S + R, 1e-12)
+    tested = s * (r * N + tests)
+    vaccinated = efficacy * doses
+    g = np.zeros(3 * K + 1)
+    g[:K] = (d_infection * (1 - v) * force - d_testing * tested * I / SI ** 2
+             + d_vaccination * vaccinated * R / SR ** 2)
+    g[K:2 * K] = (C.T @ (beta * d_infection * (1 - v) * S)) / N + d_recovery * gamma + d_testing * tested * S / SI ** 2
+    g[2 * K:3 * K] = -d_vaccination * vaccinated * S / SR ** 2
+    if peak:
+        g[K:2 * K] += ac * q * (I.sum() / total) ** (q - 1) / total
+    return g, d_testing * s * I / SI, d_vaccination * efficacy * S / SR
+
+
+# The RK4 steps of h days (steps_per_period per period) with the tests and the doses of every period, of
+# shape (P, K). Returns the state at the beginning of the four stages of every step, the final state and the
+# peak of sum I.
+@_jit
+def _forward(y0, tests, doses, h, steps, steps_per_period, K, N, C, beta, gamma, s, r, v, efficacy, q, peak):
+    total = N.sum()
+    stages = np.empty((steps, 4, 3 * K + 1))
+    y = y0.copy()
+    top = y[K:2 * K].sum()
+    for n in range(steps):
+        p = n // steps_per_period
+        stages[n, 0] = y
+        k1 = _deriv(y, K, N, C, beta, gamma, s, r, v, efficacy, tests[p], doses[p], total, q, peak)
+        stages[n, 1] = y + h / 2 * k1
+        k2 = _deriv(stages[n, 1], K, N, C, beta, gamma, s, r, v, efficacy, tests[p], doses[p], total, q, peak)
+        stages[n, 2] = y + h / 2 * k2
+        k3 = _deriv(stages[n, 2], K, N, C, beta, gamma, s, r, v, efficacy, tests[p], doses[p], total, q, peak)
+        stages[n, 3] = y + h * k3
+        k4 = _deriv(stages[n, 3], K, N, C, beta, gamma, s, r, v, efficacy, tests[p], doses[p], total, q, peak)
+        y = y + h / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+        top = max(top, y[K:2 * K].sum())
+    return stages, y, top
+
+
+# The objective (divided by the population) and its gradient by the tests and the doses of every period,
+# of shape (P, K).
+@_jit
+def _objective(y0, tests, doses, h, steps, steps_per_period, K, N, C, beta, gamma, s, r, v, efficacy, q, peak):
+    total = N.sum()
+    stages, y, top = _forward(y0, tests, doses, h, steps, steps_per_period, K, N, C, beta, gamma, s, r, v,
+                              efficacy, q, peak)
+    c = y[3 * K]
+    if peak:
+        value = (c / (steps * h)) ** (1 / q)
+        dc = value / (q * max(c, 1e-300))
+    else:
+        value = c / total
+        dc = 1 / total
+    # the adjoint, back from the horizon through the stages of every step
+    lam = np.zeros(3 * K + 1)
+    lam[3 * K] = dc
+    d_tests = np.zeros(tests.shape)
+    d_doses = np.zeros(doses.shape)
+    for n in range(steps - 1, -1, -1):
+        p = n // steps_per_period
+        g4, t4, v4 = _vjp(stages[n, 3], h / 6 * lam, K, N, C, beta, gamma, s, r, v, efficacy, tests[p], doses[p],
+                          total, q, peak)
+        g3, t3, v3 = _vjp(stages[n, 2], h / 3 * lam + h * g4, K, N, C, beta, gamma, s, r, v, efficacy, tests[p],
+                          doses[p], total, q, peak)
+        g2, t2, v2 = _vjp(stages[n, 1], h / 3 * lam + h / 2 * g3, K, N, C, beta, gamma, s, r, v, efficacy, tests[p],
+                          doses[p], total, q, peak)
+        g1, t1, v1 = _vjp(stages[n, 0], h / 6 * lam + h / 2 * g2, K, N, C, beta, gamma, s, r, v, efficacy, tests[p],
+                          doses[p], total, q, peak)
+        lam = lam + g1 + g2 + g3 + g4
+        d_tests[p] += t1 + t2 + t3 + t4
+        d_doses[p] += v1 + v2 + v3 + v4
+    return value, d_tests, d_doses
+
+
+class _Problem:
+    def __init__(self, strat, y0, days, period, tests, doses, efficacy, objective, q, substeps):
+        if objective not in ('final', 'peak'):
+            raise ValueError('the objective is \'final\' or \'peak\', not %s' % objective)
+        if days % period:
+            raise ValueError('the horizon of %d days is not a whole number of periods of %d days' % (days, period))
+        self.K, self.P = strat.K, days // period
+        self.budgets = np.array([tests, doses], dtype=float)
+        self.model = (self.K, strat.sizes, strat.contacts.toarray(), np.ascontiguousarray(strat.beta),
+                      np.ascontiguousarray(strat.gamma), np.ascontiguousarray(strat.s), np.ascontiguousarray(strat.r),
+                      np.ascontiguousarray(strat.v), float(efficacy), float(q), objective == 'peak')
+        self.y0 = np.append(np.ravel(y0), 0.0)
+        self.h = 1 / substeps
+        self.steps, self.steps_per_period = days * substeps, period * substeps
+
+    # The tests and the doses per day, of shape (2, P, K), from the shares z of shape (2, P, K).
+    def schedule(self, z):
+        w = np.exp(z - z.max(axis=-1, keepdims=True))
+        return self.budgets[:, None, None] * w / w.sum(axis=-1, keepdims=True)
+
+    def __call__(self, x):
+        z = x.reshape(2, self.P, self.K)
+        u = self.schedule(z)
+        value, d_tests, d_doses = _objective(self.y0, u[0], u[1], self.h, self.steps, self.steps_per_period,
+                                             *self.model)
+        # through the softmax: dJ/dz = u * (dJ/du - sum_k w_k dJ/du_k)
+        g = np.stack([d_tests, d_doses])
+        w = u / np.maximum(self.budgets[:, None, None], 1e-300)
+        return value, (u * (g - (w * g).sum(axis=-1, keepdims=True))).ravel()
+
+    # The infections within the horizon and the peak of sum I of a schedule u of shape (2, P, K).
+    def outcome(self, u):
+        model = self.model[:-1] + (False,)
+        _, y, top = _forward(self.y0, u[0], u[1], self.h, self.steps, self.steps_per_period, *model)
+        return dict(final=float(y[3 * self.K]), peak=float(top))
+
+
+def _start(problem, z0, iterations):
+    from scipy.optimize import minimize
+
+    with np.errstate(all='ignore'):
+        res = minimize(problem, z0.ravel(), jac=True, method='L-BFGS-B', options=dict(maxiter=iterations))
+    return res.fun, res.x, res.nit
+
+
+# The best split of tests (per day) and doses (per day) among the groups of strat (a stratified.Stratified)
+# in periods of period days over days days (a multiple of period, else ValueError) from the state y0 (shape
+# (3, K)), minimizing objective ('final' or 'peak'). efficacy: the protection of a dose, q: the exponent of the
+# smoothed peak, substeps: the RK4 steps per day, starts: the number of starts of L-BFGS, iterations: the
+# iterations per start.
+# Returns a dict with the tests and doses per day of shape (P, K), the final size and the peak of the schedule,
+# and those of the split in proportion to the sizes of the groups (baseline).
+def optimize(strat, y0, tests=0, doses=0, days=180, period=15, efficacy=0.9, objective='final', q=20, substeps=2,
+             starts=8, iterations=200, seed=0, workers=None):
+    problem = _Problem(strat, y0, days, period, tests, doses, efficacy, objective, q, substeps)
+    rng = np.random.default_rng(seed)
+    proportional = np.broadcast_to(np.log(strat.sizes), (2, problem.P, problem.K))
+    z0 = [proportional] + [proportional + rng.normal(0, 1, proportional.shape) for _ in range(starts - 1)]
+    workers = min(workers or os.cpu_count(), starts)
+    if workers == 1:
+        results = [_start(problem, z, iterations) for z in z0]
+    else:
+        # the starts run in workers from a fork server (a fork after the parallel loops of diffeq.py hangs)
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('forkserver')) as pool:
+            results = list(pool.map(_start, [problem] * starts, z0, [iterations] * starts))
+    value, x, _ = min(results, key=lambda r: r[0])
+    u = problem.schedule(x.reshape(2, problem.P, problem.K))
+    baseline = problem.schedule(np.array(proportional))
+    return dict(tests=u[0], doses=u[1], objective=value, iterations=sum(r[2] for r in results),
+                baseline=dict(problem.outcome(baseline), tests=baseline[0], doses=baseline[1]), **problem.outcome(u))
+
+
+if __name__ == '__main__':
+    import time
+
+    from stratified import Stratified
+
+    # 5 age groups in 10 regions: the young have more contacts, mostly among themselves, and a tenth of the
+    # contacts are with the other regions
+    rng = np.random.default_rng(1)
+    ages, regions = 5, 10
+    K = ages * regions
+    sizes = rng.uniform(1e6, 4e6, K)
+    activity = np.array([1.6, 1.3, 1.0, 0.7, 0.5])
+    mixing = np.eye(ages) * 2 + np.outer(activity, activity)
+    travel = np.full((regions, regions), 0.1 / (regions - 1)) + np.eye(regions) * (0.9 - 0.1 / (regions - 1))
+    C = np.kron(travel, mixing)
+    C /= C.sum(axis=1, keepdims=True)
+    strat = Stratified(sizes, C, beta=0.25 * np.tile(activity, regions), gamma=0.15)
+    y0 = strat.initial(np.where(rng.random(K) < 0.2, 1000, 0))
+    total = sizes.sum()
+
+    # the adjoint gradient against finite differences
+    problem = _Problem(strat, y0, 180, 15, 2e5, 5e5, 0.9, 'final', 20, 2)
+    z = rng.normal(0, 1, 2 * problem.P * K)
+    problem(z)
+    start = time.perf_counter()
+    value, grad = problem(z)
+    seconds = time.perf_counter() - start
+    e = rng.normal(0, 1, z.size)
+    numeric = (problem(z + 1e-6 * e)[0] - problem(z - 1e-6 * e)[0]) / 2e-6
+    print('%d groups, %d periods: the gradient by %d shares in %.1f ms, %.1e from finite differences'
+          % (K, problem.P, z.size, 1e3 * seconds, abs(grad @ e - numeric) / abs(numeric)))
+
+    for objective in ('final', 'peak'):
+        start = time.perf_counter()
+        best = optimize(strat, y0, tests=2e5, doses=5e5, days=180, period=15, objective=objective)
+        b = best['baseline']
+        print('%s: %.1f s (%d iterations of 8 starts), infections %.1f%% of N (proportional split %.1f%%), '
+              'peak %.2f%% (%.2f%%)' % (objective, time.perf_counter() - start, best['iterations'],
+                                        100 * best['final'] / total, 100 * b['final'] / total,
+                                        100 * best['peak'] / total, 100 * b['peak'] / total))
+        for name in ('tests', 'doses'):
+            by_age = best[name].reshape(-1, regions, ages).sum(axis=1) / best[name].sum(axis=1, keepdims=True)
+            print('    %s by age group (youngest first), days 0-15 %s, days 165-180 %s'
+                  % (name, ' '.join('%3.0f%%' % (100 * x) for x in by_age[0]),
+                     ' '.join('%3.0f%%' % (100 * x) for x in by_age[-1])))
@@ -0,0 +1,173 @@
+# Benchmarks of the solvers on every model, and a check against a stored baseline.
+# The models are taken from their declarations (models.py, diffeq.py), so nothing is plotted and no window
+# opens. Every model is integrated on the grid of its script with every backend:
+#   odeint        scipy.integrate.odeint with the vectorized right-hand side of models.py
+#   LSODA, BDF    scipy.integrate.solve_ivp, BDF with the analytic Jacobian of jacobians_generated.py
+#   compiled      the RK45 of compiled.py, compiled together with the kernel (Numba)
+#   batch         RK4 of sweep.py on a batch of runs (the time is per run)
+# and the difference equations (siqar_test.py, sir_diff.py) with the compiled and the NumPy loop of diffeq.py.
+# For every run it records the wall time (the best of several runs), the evaluations of the right-hand side
+# (and of the Jacobian), the peak of the memory allocated (tracemalloc), the largest deviation from a
+# reference (odeint with rtol=1e-11, or the NumPy loop for the difference equations) relative to N, and
+# the largest drift of the population (the sum of the compartments, which the transitions conserve).
+#
+#   python bench.py            runs the benchmarks and compares them with bench.json (written on the first run,
+#                              it is not in git since the times depend on the machine)
+#   python bench.py save       writes the results to bench.json as the new baseline
+#
+# The comparison fails (exit status 1) when a run is slower than the baseline by more than a factor
+# 1 + slower, needs more evaluations of the right-hand side, deviates 10 times more from the reference
+# (and more than 1e-9 of N), or when the population drifts by more than 1e-6 of N.
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from diffeq import DIFFERENCE
+from models import MODELS
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench.json')
+
+
+# The compartments of the population: all but those filled from or emptied to outside (e.g. Np of siqar_test.py).
+def population(m):
+    outside = {c for s, d, rate in m.transitions if s is None or d is None for c in (s, d)}
+    return [i for i, c in enumerate(m.compartments) if c not in outside]
+
+
+# The backends as functions of (model, y0, t, args) returning the trajectory of shape (len(t), n_compartments)
+# and the evaluations of the right-hand side and of the Jacobian.
+def _odeint(m, y, t, args):
+    from scipy.integrate import odeint
+
+    ret, info = odeint(m.deriv, y, t, args=args, rtol=1e-8, atol=1e-6, mxstep=10000, full_output=True)
+    return ret, int(info['nfe'][-1]), int(info['nje'][-1])
+
+
+def _solve_ivp(method):
+    def run(m, y, t, args):
+        from scipy.integrate import solve_ivp
+
+        from jacobians_generated import JACOBIANS
+
+        options = dict(jac=lambda s, z: JACOBIANS[m.name](z, s, *args)) if method == 'BDF' else {}
+        sol = solve_ivp(lambda s, z: m.deriv(z, s, *args), (t[0], t[-1]), y, method, t_eval=t,
+                        rtol=1e-8, atol=1e-6, **options)
+        if not sol.success:
+            raise RuntimeError('%s failed on %s: %s' % (method, m.name, sol.message))
+        return sol.y.T, sol.nfev, sol.njev
+    return run
+
+
+def _compiled(m, y, t, args):
+    from compiled import RK45
+
+    ret, nfev = RK45[m.name](y, t, np.array(args, dtype=float), 1e-8, 1e-6)
+    return ret, nfev, 0
+
+
+def _batch(m, y, t, args, runs=100, substeps=10):
+    from sweep import rk4
+
+    ret = rk4(m.deriv, np.repeat(y[None], runs, axis=0), t, args, substeps)
+    return ret[:, 0], 4 * substeps * (len(t) - 1), 0
+
+
+def _difference(backend):
+    def run(m, y, t, args):
+        from diffeq import _run
+
+        out = np.empty((1, len(m.compartments), len(t)))
+        _run(m, tuple(np.atleast_1d(a) for a in args), y[None].copy(), 0, out, backend)
+        return out[0].T, len(t), 0
+    return run
+
+
+BACKENDS = dict(odeint=_odeint, LSODA=_solve_ivp('LSODA'), BDF=_solve_ivp('BDF'), compiled=_compiled, batch=_batch)
+DIFFERENCE_BACKENDS = dict(compiled=_difference('numba'), numpy=_difference('numpy'))
+
+
+# The best time of at least repeat runs, and of more for short runs (at least 0.5 s in all), so that the
+# times are stable enough to compare.
+def _measure(f, repeat):
+    f()
+    seconds = []
+    while len(seconds) < repeat or sum(seconds) < 0.5:
+        start = time.perf_counter()
+        f()
+        seconds.append(time.perf_counter() - start)
+    tracemalloc.start()
+    ret = f()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return ret, min(seconds), peak
+
+
+# Run the benchmarks. Returns {'<model>/<backend>': dict(seconds, rhs, jac, memory, deviation, drift)}.
+def bench(models=None, repeat=3):
+    from scipy.integrate import odeint
+
+    results = {}
+    for table, backends in ((MODELS, BACKENDS), (DIFFERENCE, DIFFERENCE_BACKENDS)):
+        for name, m in table.items():
+            if models is not None and name not in models:
+                continue
+            args, y = m.batch()
+            args, y = tuple(float(a[0]) for a in args), y[0]
+            t = np.asarray(m.t, dtype=float)
+            N = dict(zip(m.params, args))['N']
+            keep = population(m)
+            if table is MODELS:
+                reference = odeint(m.deriv, y, t, args=args, rtol=1e-11, atol=1e-8, mxstep=100000)
+            else:
+                reference = _difference('numpy')(m, y, t, args)[0]
+            for backend, run in backends.items():
+                (ret, rhs, jac), seconds, peak = _measure(lambda: run(m, y, t, args), repeat)
+                if backend == 'batch':
+                    seconds /= 100
+                results['%s/%s' % (name, backend)] = dict(
+                    seconds=seconds, rhs=int(rhs), jac=int(jac), memory=peak,
+                    deviation=float(np.abs(ret - reference).max() / N),
+                    drift=float(np.abs(ret[:, keep].sum(axis=1) - y[keep].sum()).max() / N))
+    return results
+
+
+# The failures of results against the baseline, as lines of text.
+def compare(results, baseline, slower=1.0):
+    failures = []
+    for key, r in results.items():
+        if r['drift'] > 1e-6:
+            failures.append('%s: the population drifts by %.1e of N' % (key, r['drift']))
+        b = baseline.get(key)
+        if b is None:
+            continue
+        if r['seconds'] > (1 + slower) * b['seconds']:
+            failures.append('%s: %.3g ms instead of %.3g ms' % (key, 1e3 * r['seconds'], 1e3 * b['seconds']))
+        if r['rhs'] > b['rhs']:
+            failures.append('%s: %d evaluations of the right-hand side instead of %d' % (key, r['rhs'], b['rhs']))
+        if r['deviation'] > max(10 * b['deviation'], 1e-9):
+            failures.append('%s: deviation %.1e of N instead of %.1e' % (key, r['deviation'], b['deviation']))
+    return failures
+
+
+if __name__ == '__main__':
+    results = bench()
+    print('%-32s %10s %8s %6s %10s %10s %10s' % ('model/backend', 'time', 'rhs', 'jac', 'memory', 'deviation', 'drift'))
+    for key, r in results.items():
+        print('%-32s %8.3fms %8d %6d %8.0fkB %10.1e %10.1e'
+              % (key, 1e3 * r['seconds'], r['rhs'], r['jac'], r['memory'] / 1e3, r['deviation'], r['drift']))
+    if sys.argv[1:] == ['save'] or not os.path.exists(BASELINE):
+        with open(BASELINE, 'w') as f:
+            json.dump(results, f, indent=1)
+        print('baseline written to %s' % BASELINE)
+    else:
+        with open(BASELINE) as f:
+            failures = compare(results, json.load(f))
+        for line in failures:
+            print('FAIL ' + line)
+        print('%d regressions against %s' % (len(failures), BASELINE))
+        sys.exit(1 if failures else 0)
@@ -0,0 +1,158 @@
+# What-if branches of a scenario, integrated from checkpoints of their common past instead of from t = 0.
+# A branch changes some parameters from a given day on, e.g. Branch(30, {'Test': 6000}) for 6000 tests a
+# day from day 30 in siqrar.py, or Branch(40, {'t_ld': 40}) for the lockdown of seir_ld.py at day 40
+# instead of 50. A branch can have a parent branch, so the branches form a tree whose root is the base
+# scenario, e.g. a lockdown at day 40 within each of the testing policies from day 30.
+# Every branch is integrated only from its day on, starting from the state of its parent on that day
+# (the checkpoint), and its trajectory before that day is copied from the parent. The branches of one
+# depth of the tree are independent: those starting on the same day are integrated together as one batch
+# (sweep.py), and the batches are spread over worker processes.
+#
+#   policies = [Branch(30, {'Test': x}) for x in range(2000, 10000, 100)]
+#   ret, stats = run('siqrar', policies)    # ret[i] is the trajectory of policies[i], (len(t), n_compartments)
+#
+# python branches.py runs a tree of 1000 branches of siqrar.py and compares the cost with integrating
+# every branch from t = 0.
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from models import MODELS
+
+
+class Branch:
+    # time: the day from which the changes apply, changes: the new values of parameters,
+    # parent: the branch it departs from (None for the base scenario)
+    def __init__(self, time, changes, parent=None):
+        self.time = float(time)
+        self.changes = dict(changes)
+        self.parent = parent
+        if parent is not None and self.time < parent.time:
+            raise ValueError('a branch at %g cannot depart from a branch at %g' % (self.time, parent.time))
+
+
+def _suffix(model, args, y, grid, method, options):
+    from sweep import rk4, rk45
+
+    integrate = rk4 if method == 'rk4' else rk45
+    return integrate(MODELS[model].deriv, y, grid, args, **options)
+
+
+# Integrate the branches of the base scenario (p, y0; missing entries take the defaults of the script) on
+# the time points t with the method of sweep.py. Returns the trajectories of the branches as an array of shape
+# (n_branches, len(t), n_compartments), and the days integrated by all the runs together (the base scenario
+# included), compared with integrating every branch from the start.
+def run(model, branches, p=None, y0=None, t=None, method='rk4', workers=None, **options):
+    p, y0 = p or {}, y0 or {}
+    m = MODELS[model]
+    t = np.asarray(m.t if t is None else t, dtype=float)
+    base = dict(m.params, **p)
+    args, y = m.batch(base, y0)
+    # the base scenario is the root of the tree
+    root = Branch(t[0], {})
+    nodes = [root] + list(branches)
+    index = {id(b): i for i, b in enumerate(nodes)}
+    parent = [None] + [index[id(b.parent if b.parent is not None else root)] for b in branches]
+    params = [base]
+    for b, i in zip(branches, parent[1:]):
+        if i >= len(params):
+            raise ValueError('a parent branch must come before its children in the list')
+        params.append(dict(params[i], **b.changes))
+    depth = [0]
+    for i in parent[1:]:
+        depth.append(depth[i] + 1)
+    # the children of every branch, and the branches of every depth
+    children, levels = {}, {}
+    for j, i in enumerate(parent[1:], 1):
+        children.setdefault(i, []).append(j)
+    for j, d in enumerate(depth):
+        levels.setdefault(d, []).append(j)
+    ret = np.empty((len(nodes), len(t), len(m.compartments)))
+    start = np.zeros((len(nodes), len(m.compartments)))
+    start[0] = y[0]
+    stats = dict(days=0.0, full=float(len(branches) * (t[-1] - t[0])))
+    workers = workers or os.cpu_count()
+    # not forked: after the parallel loops of diffeq.py (Numba with TBB) a forked worker hangs
+    context = multiprocessing.get_context('forkserver')
+    with ProcessPoolExecutor(workers, mp_context=context) if workers > 1 else _Serial() as pool:
+        for d in range(max(depth) + 1):
+            # the batches: the branches of depth d starting on the same day
+            groups = {}
+            for j in levels[d]:
+                groups.setdefault(nodes[j].time, []).append(j)
+            jobs = []
+            for time, members in groups.items():
+                # the time points of the output and the days of the children, from the day of the branch on
+                times = [time] + list(t[t > time]) + [nodes[c].time for j in members for c in children.get(j, [])]
+                grid = np.unique(times)
+                q = {k: np.array([params[j][k] for j in members], dtype=float) for k in m.params}
+                jobs.append((time, members, grid,
+                             pool.submit(_suffix, model, m.args(q), start[members], grid, method, options)))
+                stats['days'] += len(members) * (t[-1] - time)
+            for time, members, grid, job in jobs:
+                out = job.result()
+                for k, j in enumerate(members):
+                    # the past from the parent, the rest from the integration
+                    if parent[j] is not None:
+                        ret[j] = ret[parent[j]]
+                    on = np.searchsorted(grid, t[t >= time])
+                    ret[j, t >= time] = out[on, k]
+                    for c in children.get(j, []):
+                        start[c] = out[np.searchsorted(grid, nodes[c].time), k]
+    return ret[1:], stats
+
+
+# A stand-in for the process pool when running in one process.
+class _Serial:
+    class _Done:
+        def __init__(self, value):
+            self.value = value
+
+        def result(self):
+            return self.value
+
+    def submit(self, f, *args):
+        return self._Done(f(*args))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+if __name__ == '__main__':
+    import time
+
+    from events import Event, integrate
+
+    t = np.linspace(0, 100, 101)
+    # 50 testing policies from days 10 to 50, each with 19 reductions of the contacts 10 days later
+    policies = [Branch(day, {'Test': float(x)}) for day in (10, 20, 30, 40, 50) for x in np.linspace(3000, 8000, 10)]
+    branches = list(policies)
+    for b in policies:
+        for f in np.linspace(0.5, 0.95, 19):
+            beta = float(round(f * 0.25, 4))
+            branches.append(Branch(b.time + 10, {'beta1': beta, 'beta2': beta}, b))
+    start = time.perf_counter()
+    ret, stats = run('siqrar', branches, dict(Test=500), t=t)
+    print('%d branches of siqrar: %.2f s, %.0f days integrated instead of %.0f from day 0'
+          % (len(branches), time.perf_counter() - start, stats['days'], stats['full']))
+    # compare a branch and a sub-branch with an integration from day 0 with the changes as events
+    for i in (7, len(policies) + 30):
+        b = branches[i]
+        events = [Event('branch', b.time, b.changes)]
+        if b.parent is not None:
+            events.insert(0, Event('parent', b.parent.time, b.parent.changes))
+        ref, _ = integrate('siqrar', events, dict(Test=500), t=t)
+        print('    branch at day %g %s: max deviation from the integration from day 0 %.1e of N'
+              % (b.time, b.changes, np.abs(ret[i] - ref).max() / 1e8))
+
+    lockdowns = [Branch(day, {'t_ld': day}) for day in range(20, 50)]
+    ret, stats = run('seir_ld', lockdowns)
+    I = ret[:, :, 2]
+    print('seir_ld with the lockdown on days 20 ... 49: peak of I from %.0f to %.0f, %.0f days integrated instead '
+          'of %.0f' % (I[0].max(), I[-1].max(), stats['days'], stats['full']))
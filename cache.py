@@ -0,0 +1,179 @@
+# A cache of the solutions of the models, so that the same configuration is not integrated again.
+# The key of a solution is a hash of everything it depends on: the generated code of the model (Model.key,
+# which changes with the equations), the parameters and the initial values (S0, I0, Q0, A0, R0, ...) after
+# the defaults of the script are filled in, the time grid, the solver and its options. A solution is
+# looked up first in memory (the most recently used ones of this process), then on disk, where the files
+# are named <model>_<model key>_<hash>.npz. When a model is first used, its files with another model key
+# (from before a change of the equations) are deleted, and when the files exceed the size limit the least
+# recently used ones are deleted.
+#
+#   ret = solve('trasym', dict(cap=2000))              # as odeint, (len(t), n_compartments)
+#   ret = solve('siqrar', p, y0, method='rk4')         # as sweep, for arrays of parameters
+#   print(CACHE.report())                              # hits, misses and the time saved
+#
+# python cache.py runs the scripts twice, and the second time from the cache.
+
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from models import MODELS
+
+
+class Cache:
+    # directory: the cache on disk (default __pycache__/results next to models.py), size: its limit in
+    # bytes, memory: the number of solutions kept in memory
+    def __init__(self, directory=None, size=1e9, memory=256):
+        self.directory = directory or os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__', 'results')
+        self.size = size
+        self.memory = memory
+        self._memory = OrderedDict()
+        self._checked = set()
+        self._disk = None
+        self._mtime = None
+        self.stats = dict(memory=0, disk=0, misses=0, saved=0.0, spent=0.0)
+
+    def key(self, m, args, y, t, method, options):
+        h = hashlib.sha1()
+        h.update(json.dumps([method, sorted(options.items())], default=repr).encode())
+        for a in (np.stack(np.broadcast_arrays(*args)), y, t):
+            a = np.ascontiguousarray(a, dtype=float)
+            h.update(repr(a.shape).encode())
+            h.update(a.tobytes())
+        return '%s_%s_%s' % (m.name, m.key, h.hexdigest()[:24])
+
+    # Delete the files of a model left from other versions of its equations.
+    def _check(self, m):
+        if m.name in self._checked or not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            model, _, rest = name.rpartition('_')[0].rpartition('_')
+            if model == m.name and not name.startswith('%s_%s_' % (m.name, m.key)):
+                os.remove(os.path.join(self.directory, name))
+        self._checked.add(m.name)
+
+    # The files are listed only when their total (counted up from the last listing, replaced files twice)
+    # may exceed the limit, not on every put. The count is of the files of this process: when the directory
+    # changed since its last put (its mtime), another process shares it and the files are listed again.
+    def _evict(self, added):
+        if self._disk is not None:
+            self._disk += added
+            if self._disk <= self.size:
+                return
+        files = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith('.npz')]
+        stats = sorted((s.st_mtime, s.st_size, f) for s, f in ((os.stat(f), f) for f in files))
+        total = sum(size for _, size, _ in stats)
+        for _, size, f in stats:
+            if total <= self.size:
+                break
+            os.remove(f)
+            total -= size
+        self._disk = total
+
+    def get(self, key):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.stats['memory'] += 1
+            ret, seconds = self._memory[key]
+            self.stats['saved'] += seconds
+            return ret
+        path = os.path.join(self.directory, key + '.npz')
+        try:
+            with np.load(path) as f:
+                ret, seconds = f['ret'], float(f['seconds'])
+            os.utime(path)
+        except (OSError, KeyError, ValueError):
+            return None
+        self.stats['disk'] += 1
+        self.stats['saved'] += seconds
+        self._remember(key, ret, seconds)
+        return ret
+
+    def put(self, key, ret, seconds):
+        self._remember(key, ret, seconds)
+        os.makedirs(self.directory, exist_ok=True)
+        if os.stat(self.directory).st_mtime_ns != self._mtime:
+            self._disk = None
+        tmp = os.path.join(self.directory, '%s.%d.tmp.npz' % (key, os.getpid()))
+        np.savez(tmp, ret=ret, seconds=seconds)
+        added = os.path.getsize(tmp)
+        os.replace(tmp, os.path.join(self.directory, key + '.npz'))
+        self._evict(added)
+        self._mtime = os.stat(self.directory).st_mtime_ns
+
+    def _remember(self, key, ret, seconds):
+        ret.flags.writeable = False
+        self._memory[key] = (ret, seconds)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory:
+            self._memory.popitem(last=False)
+
+    # Solve a model with the parameters p and the initial values y0 (missing entries take the defaults
+    # of the script) on the time points t, with odeint (the default) or a method of sweep.py.
+    # The result is read-only, as it is shared with the cache.
+    def solve(self, model, p=None, y0=None, t=None, method='odeint', **options):
+        p, y0 = p or {}, y0 or {}
+        m = MODELS[model]
+        t = np.asarray(m.t if t is None else t, dtype=float)
+        args, y = m.batch(p, y0)
+        self._check(m)
+        key = self.key(m, args, y, t, method, options)
+        ret = self.get(key)
+        if ret is not None:
+            return ret
+        start = time.perf_counter()
+        if method == 'odeint':
+            from scipy.integrate import odeint
+
+            if len(y) != 1:
+                raise ValueError('odeint solves one scenario, use method=\'rk4\' or \'rk45\' for arrays of parameters')
+            ret = odeint(m.deriv, y[0], t, args=tuple(a[0] for a in args), **options)
+        else:
+            from sweep import sweep
+
+            ret = sweep(model, p, y0, t, method, **options)
+        seconds = time.perf_counter() - start
+        self.stats['misses'] += 1
+        self.stats['spent'] += seconds
+        self.put(key, ret, seconds)
+        return ret
+
+    def report(self):
+        s = self.stats
+        lookups = s['memory'] + s['disk'] + s['misses']
+        return ('%d lookups: %d hits in memory, %d on disk, %d misses (hit rate %.0f%%), %.2f s solving, %.2f s saved'
+                % (lookups, s['memory'], s['disk'], s['misses'], 100 * (s['memory'] + s['disk']) / max(lookups, 1),
+                   s['spent'], s['saved']))
+
+
+CACHE = Cache()
+solve = CACHE.solve
+
+
+if __name__ == '__main__':
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        for memory in (256, 0):
+            cache = Cache(directory, memory=memory)
+            for repeat in range(3):
+                for model in MODELS:
+                    cache.solve(model, rtol=1e-8, atol=1e-6)
+                    cache.solve(model, method='rk4')
+            print('%s: %s' % ('in memory and on disk' if memory else 'on disk only', cache.report()))
+
+        # a change of the equations gives other keys, and the old entries are deleted on first use
+        m = MODELS['trasym']
+        before = len(os.listdir(directory))
+        changed = type(m)(m.name, m.compartments, m.params, m.transitions[:-1] + (('A', 'R', '0.5 * gamma2 * A'),),
+                          m.initial, m.t, m.derived, m.observables)
+        MODELS['trasym'] = changed
+        cache = Cache(directory)
+        cache.solve('trasym')
+        print('after a change of trasym: %s, %d files before and %d after'
+              % (cache.report(), before, len(os.listdir(directory))))
+        MODELS['trasym'] = m
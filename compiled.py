@@ -0,0 +1,140 @@
+# Compiled right-hand sides of the ODE models in models.py.
+# Every kernel k(y, t, p) (generated by models.py) takes a single state y, the time t and the
+# parameters p as a float array in the order of MODELS[name].params, and returns dy/dt.
+# With Numba the kernels are compiled to machine code and cached on disk (in __pycache__),
+# so only the first run pays for the compilation.
+# Without Numba the same functions run as plain Python, so everything below still works.
+#
+# The Jacobians of jacobians_generated.py are compiled in the same way (JACOBIANS), and odeint can call both directly,
+# without a Python wrapper in between:
+#   p = params('siqr')
+#   ret = odeint(KERNELS['siqr'], y0, t, args=(p,), Dfun=JACOBIANS['siqr'])
+# solve() goes further and runs the whole integration (Dormand-Prince RK45) inside compiled code,
+# so there is no Python callback at all; solve(..., method='lsoda') is the odeint above, for stiff cases.
+# scipy's odeint and solve_ivp do not accept a LowLevelCallable, which is why the integration
+# loop is compiled here instead of passing a cfunc to scipy.
+#
+# python compiled.py prints the speedup for every model.
+
+import types
+
+import numpy as np
+
+from jacobians_generated import KERNELS as _JACOBIANS
+from models import MODELS
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+def _jit(f):
+    return njit(cache=True)(f) if njit else f
+
+
+KERNELS = {name: _jit(m.kernel) for name, m in MODELS.items()}
+JACOBIANS = {name: _jit(_JACOBIANS[name]) for name in MODELS}
+
+
+# The parameters of a model as the float array expected by the kernels, defaults from the script.
+def params(model, **p):
+    return np.array([float(p.get(k, v)) for k, v in MODELS[model].params.items()])
+
+
+# Dormand-Prince RK45 with error control, stepping exactly onto every point of t, for the kernel f (a global
+# of the copies in RK45 below). Returns the array of shape (len(t), n_compartments) and the number of calls of f.
+# Where the step underflows (a singular right-hand side, e.g. siqrar.py when A + Flu reaches 0) the rest is NaN.
+def _rk45(y0, t, p, rtol, atol):
+    y = y0.copy()
+    ret = np.empty((len(t), len(y)))
+    ret[0] = y
+    s, h = t[0], 0.1
+    k1 = f(y, s, p)
+    nfev = 1
+    for i in range(len(t) - 1):
+        while s < t[i+1]:
+            if h > t[i+1] - s:
+                h = t[i+1] - s
+            k2 = f(y + h * (1/5 * k1), s + h/5, p)
+            k3 = f(y + h * (3/40 * k1 + 9/40 * k2), s + 3*h/10, p)
+            k4 = f(y + h * (44/45 * k1 - 56/15 * k2 + 32/9 * k3), s + 4*h/5, p)
+            k5 = f(y + h * (19372/6561 * k1 - 25360/2187 * k2 + 64448/6561 * k3 - 212/729 * k4), s + 8*h/9, p)
+            k6 = f(y + h * (9017/3168 * k1 - 355/33 * k2 + 46732/5247 * k3 + 49/176 * k4 - 5103/18656 * k5), s + h, p)
+            y5 = y + h * (35/384 * k1 + 500/1113 * k3 + 125/192 * k4 - 2187/6784 * k5 + 11/84 * k6)
+            k7 = f(y5, s + h, p)
+            nfev += 6
+            err = h * (71/57600 * k1 - 71/16695 * k3 + 71/1920 * k4 - 17253/339200 * k5 + 22/525 * k6 - 1/40 * k7)
+            norm = np.sqrt(np.mean((err / (atol + rtol * np.maximum(np.abs(y), np.abs(y5)))) ** 2))
+            if norm <= 1:
+                s, y, k1 = s + h, y5, k7
+            h *= min(5.0, max(0.2, 0.9 * norm ** -0.2)) if norm > 0 else 5.0
+            if not h > 1e-12 * max(1.0, abs(s)):
+                ret[i+1:] = np.nan
+                return ret, nfev
+        ret[i+1] = y
+    return ret, nfev
+
+
+# A copy of _rk45 for every version of every model, with the kernel as the global f, so that the cache of
+# Numba on disk is reused by new processes (it is not for a kernel passed as an argument, whose type differs
+# in every process) and keeps one index per kernel.
+def _copy(m):
+    copy = types.FunctionType(_rk45.__code__, dict(_rk45.__globals__, f=KERNELS[m.name]),
+                              '_rk45_%s_%s' % (m.name, m.key))
+    copy.__qualname__ = copy.__name__
+    return _jit(copy)
+
+
+RK45 = {name: _copy(m) for name, m in MODELS.items()}
+
+
+# Integrate a model over the time grid t with the integrator compiled together with the kernel (method
+# 'rk45'), or with odeint calling the compiled kernel and Jacobian ('lsoda').
+# p and y0 are dicts overriding the defaults of the script. Without Numba this falls back to
+# odeint with the vectorized right-hand side and Jacobian.
+def solve(model, p=None, y0=None, t=None, rtol=1e-8, atol=1e-6, method='rk45'):
+    p, y0 = p or {}, y0 or {}
+    m = MODELS[model]
+    pp = dict(m.params, **p)
+    init = m.initial(pp, y0)
+    y = np.array([init[c] for c in m.compartments], dtype=float)
+    t = m.t if t is None else np.asarray(t, dtype=float)
+    if method not in ('rk45', 'lsoda'):
+        raise ValueError('no method %s' % method)
+    if njit is None:
+        from scipy.integrate import odeint
+        from jacobians_generated import JACOBIANS as vectorized
+        return odeint(m.deriv, y, t, args=m.args(pp), Dfun=vectorized[model], rtol=rtol, atol=atol)
+    if method == 'lsoda':
+        from scipy.integrate import odeint
+        return odeint(KERNELS[model], y, t, args=(params(model, **pp),), Dfun=JACOBIANS[model], rtol=rtol,
+                      atol=atol)
+    return RK45[model](y, t, params(model, **pp), rtol, atol)[0]
+
+
+if __name__ == '__main__':
+    import time
+    from scipy.integrate import odeint
+
+    def best(f, n=5):
+        times = []
+        for i in range(n):
+            start = time.perf_counter()
+            f()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    print('%-22s %12s %12s %12s %12s %9s' % ('model', 'odeint (py)', 'odeint (jit)', '+ jacobian', 'solve',
+                                              'speedup'))
+    for name, m in MODELS.items():
+        p = params(name)
+        init = m.initial(m.params)
+        y0 = np.array([init[c] for c in m.compartments], dtype=float)
+        solve(name)
+        py = best(lambda: odeint(m.deriv, y0, m.t, args=m.args(m.params), rtol=1e-8, atol=1e-6))
+        jit = best(lambda: odeint(KERNELS[name], y0, m.t, args=(p,), rtol=1e-8, atol=1e-6))
+        jac = best(lambda: solve(name, method='lsoda'))
+        full = best(lambda: solve(name))
+        print('%-22s %10.2fms %10.2fms %10.2fms %10.2fms %8.1fx'
+              % (name, py * 1e3, jit * 1e3, jac * 1e3, full * 1e3, py / full))
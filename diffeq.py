@@ -0,0 +1,159 @@
+# The difference equations of siqar_test.py and sir_diff.py for many scenarios in lockstep.
+# A difference equation x[t+1] = x[t] + f(x[t]) is declared as a Model of models.py, with the
+# transitions giving f, so the same generated deriv and kernel are used as for the ODE models.
+# The one-day lag of the contact tracing in siqar_test.py (delta * Np, with Np the new symptomatic
+# positives of the day before) is kept as an extra component Np: it is refilled every day with
+# Test * I / (2 * (I + Flu)) and emptied the next day, so that Np[t+1] = Test * I[t] / (2 * (I[t] + Flu)).
+# Np is not a compartment of the population.
+#
+# simulate() returns the whole history as one contiguous array of shape (n_scenarios, n_compartments, T).
+# stream() yields it in blocks of days, so long horizons do not keep the full history in memory.
+# With Numba the days are stepped in a compiled loop, otherwise every day is one NumPy step for all
+# the scenarios together.
+#
+# python diffeq.py runs 100000 scenarios of siqar_test.py over 365 days.
+
+import types
+
+import numpy as np
+
+from models import Model, _susceptible_rest
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+
+DIFFERENCE = {m.name: m for m in (
+    # siqar_test.py
+    Model('siqar_test', ('S', 'I', 'Q', 'A', 'R', 'Rq', 'Np'),
+          dict(N=100000000, Flu=1000, beta1=0.25, beta2=0.25, gamma1=0.2, gamma2=0.2, delta=1, Test=700),
+          [('S', 'I', 'beta1 * (I+A) * S / N'),
+           ('S', 'A', 'beta2 * S * (I+A) / N'),
+           ('I', 'Q', 'Test * I / (2 * (I + Flu))'),
+           ('A', 'Q', 'delta * Np'),
+           ('I', 'R', 'gamma1 * I'),
+           ('A', 'R', 'gamma2 * A'),
+           ('Q', 'Rq', 'gamma1 * Q'),
+           (None, 'Np', 'Test * I / (2 * (I + Flu))'),
+           ('Np', None, 'Np')],
+          _susceptible_rest(I=0, Q=0, A=500, R=0, Rq=0, Np=0), np.arange(50),
+          observables={'Infected': 'I + A', 'Positive': 'Q + Rq',
+                       'New positive': 'Test * I / (2 * (I + Flu)) + Test * I / (2 * (A + Flu))',
+                       'Positivity rate': 'I / (I + Flu)'}),
+    # sir_diff.py
+    Model('sir_diff', 'SIR',
+          dict(N=100000000, beta=0.25, gamma=0.2),
+          [('S', 'I', 'beta * I * S / N'),
+           ('I', 'R', 'gamma * I')],
+          _susceptible_rest(I=1, R=0), np.arange(100)),
+)}
+
+
+# Step the states y of shape (n, n_compartments) through the days t0, t0+1, ..., writing the state of
+# day t0+j into out[:, :, j]. On return y holds the state of the day after the last one in out.
+def _advance_numpy(m, args, y, t0, out):
+    for j in range(out.shape[2]):
+        out[:, :, j] = y
+        y += m.deriv(y, t0 + j, *args)
+
+
+def _advance(p, y, t0, out):
+    for i in prange(y.shape[0]):
+        x = y[i].copy()
+        for j in range(out.shape[2]):
+            out[i, :, j] = x
+            x += kernel(x, t0 + j, p[i])
+        y[i] = x
+
+
+_ADVANCE = {}
+
+
+def _advancer(m):
+    if njit is None:
+        return None
+    if m.name not in _ADVANCE:
+        # a copy of _advance for every version of the model with the kernel as a global, so that the cache of
+        # Numba keeps one index per kernel: a shared index also holds the kernels of the other models, and
+        # loading it fails when their generated modules are not imported (or no longer exist after a change of
+        # the equations). Passed as an argument, the kernel would also miss the cache in every new process.
+        copy = types.FunctionType(_advance.__code__, dict(_advance.__globals__, kernel=njit(cache=True)(m.kernel)),
+                                  '_advance_%s_%s' % (m.name, m.key))
+        copy.__qualname__ = copy.__name__
+        _ADVANCE[m.name] = njit(cache=True, parallel=True)(copy)
+    return _ADVANCE[m.name]
+
+
+def _setup(model, p, y0, backend):
+    if backend not in ('auto', 'numba', 'numpy'):
+        raise ValueError('no backend %s' % backend)
+    m = DIFFERENCE[model]
+    args, y = m.batch(p, y0)
+    return m, args, np.array(y)
+
+
+def _run(m, args, y, t0, out, backend):
+    advance = _advancer(m) if backend in ('auto', 'numba') else None
+    if advance is None:
+        _advance_numpy(m, args, y, t0, out)
+    else:
+        advance(np.ascontiguousarray(np.stack(args, axis=-1)), y, t0, out)
+
+
+# The whole history of T days for arrays of parameters p and initial values y0 (dicts of arrays of
+# length n_scenarios, missing entries take the defaults of the script), of shape (n_scenarios, n_compartments, T).
+# S, I, Q, A, R, Rq, Np = simulate('siqar_test')[0] gives the arrays of the script.
+def simulate(model, p=None, y0=None, T=None, dtype=float, backend='auto'):
+    p, y0 = p or {}, y0 or {}
+    m, args, y = _setup(model, p, y0, backend)
+    T = len(m.t) if T is None else T
+    out = np.empty((len(y), len(m.compartments), T), dtype=dtype)
+    _run(m, args, y, 0, out, backend)
+    return out
+
+
+# The history in blocks of at most chunk days: yields (t0, block) with block[:, :, j] the states of day t0+j.
+# The same buffer is reused for every block, copy it to keep it.
+def stream(model, p=None, y0=None, T=None, chunk=32, dtype=float, backend='auto'):
+    p, y0 = p or {}, y0 or {}
+    m, args, y = _setup(model, p, y0, backend)
+    T = len(m.t) if T is None else T
+    block = np.empty((len(y), len(m.compartments), min(chunk, T)), dtype=dtype)
+    for t0 in range(0, T, chunk):
+        out = block[:, :, :min(chunk, T - t0)]
+        _run(m, args, y, t0, out, backend)
+        yield t0, out
+
+
+if __name__ == '__main__':
+    import time
+
+    # the loop of siqar_test.py for one scenario
+    S, I, Q, A, R, Rq = simulate('siqar_test')[0, :6]
+    N, Flu, beta1, beta2, gamma1, gamma2, delta, Test = DIFFERENCE['siqar_test'].params.values()
+    s, i, q, a, r, rq, Np = N - 500, 0, 0, 500, 0, 0, 0
+    for x in range(49):
+        s, i, q, a, r, rq, Np = (s - (beta1+beta2) * (i+a) * s / N,
+                                 i + beta1 * (i+a) * s / N - Test * i / (2 * (i + Flu)) - gamma1 * i,
+                                 q + Test * i / (2 * (i + Flu)) + delta * Np - gamma1 * q,
+                                 a + beta2 * s * (i+a) / N - delta * Np - gamma2 * a,
+                                 r + gamma1 * i + gamma2 * a,
+                                 rq + gamma1 * q,
+                                 Test * i / (2 * (i + Flu)))
+    print('deviation from the loop of siqar_test.py:',
+          np.abs(np.array([S, I, Q, A, R, Rq])[:, -1] - [s, i, q, a, r, rq]).max())
+
+    n = 100000
+    rng = np.random.default_rng(0)
+    p = dict(Test=rng.uniform(0, 2000, n), beta1=rng.uniform(0.2, 0.3, n), beta2=rng.uniform(0.2, 0.3, n))
+    y0 = dict(A=rng.uniform(100, 1000, n))
+    for backend in ('numba', 'numpy') if njit else ('numpy',):
+        list(stream('siqar_test', p, y0, T=2, backend=backend))
+        start = time.perf_counter()
+        peak = np.zeros(n)
+        for t0, block in stream('siqar_test', p, y0, T=365, backend=backend):
+            peak = np.maximum(peak, (block[:, 1] + block[:, 3]).max(axis=1))
+        print('%d scenarios x 365 days (%s): %.2f s, median peak of I+A %.0f'
+              % (n, backend, time.perf_counter() - start, np.median(peak)))
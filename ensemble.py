@@ -0,0 +1,138 @@
+# Monte Carlo ensembles over uncertain parameters, run on all cores.
+# The parameters (and initial values) are drawn from priors given as the name of a method of
+# numpy.random.Generator with its arguments, e.g.
+#   priors = {'beta1': ('uniform', 0.2, 0.3), 'gamma1': ('normal', 0.2, 0.02), 'Test': ('uniform', 1000, 3000),
+#             'A': ('uniform', 500, 2000), 'Flu': 1000}
+# (lists instead of tuples as well, e.g. from JSON)
+#   q = ensemble('siqrar', priors, 100000)
+#   q['Infected'][1]   # the median of I+A at every time point
+# The draws are made in batches, each with its own random stream derived from (seed, batch number),
+# so the result does not depend on the number of workers. The batches are split among worker
+# processes, which integrate a whole batch at once (sweep.py for the ODE models, diffeq.py for the
+# difference equations) and add the observables of the batch to histograms in shared memory, under a lock.
+# Only the histograms of size (n_outputs, T, n_bins) are kept (about 1.3 MB per output and 100 days), shared
+# by all the workers, so the memory depends neither on the size of the ensemble nor on the number of
+# workers, and the quantiles are read off the histograms at the end. The bins are logarithmic with 100 bins per
+# decade, so the quantiles have a relative precision of about 2%.
+#
+# python ensemble.py runs 100000 draws of siqrar.py on 1 and on all cores.
+
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from diffeq import DIFFERENCE
+from models import MODELS
+
+# The edges of the bins: values below 1e-6 (including zero and negative ones) go to the first bin.
+EDGES = np.concatenate([[-np.inf], np.logspace(-6, 10, 1601)])
+
+
+def _model(model):
+    return MODELS[model] if model in MODELS else DIFFERENCE[model]
+
+
+def _draw(m, priors, rng, n):
+    p, y0 = {}, {}
+    for k, v in priors.items():
+        value = getattr(rng, v[0])(*v[1:], size=n) if isinstance(v, (tuple, list)) else np.full(n, float(v))
+        (y0 if k in m.compartments else p)[k] = value
+    return p, y0
+
+
+# The trajectories of a batch as an array of shape (T, n, n_compartments) and the arguments of the model,
+# on the grid of the script for T=None.
+def _solve(m, p, y0, T):
+    args, y = m.batch(p, y0)
+    if m.name in MODELS:
+        from sweep import rk4
+        return rk4(m.deriv, y, m.t if T is None else np.arange(T, dtype=float), args), args
+    from diffeq import simulate
+    return np.moveaxis(simulate(m.name, p, y0, T), -1, 0), args
+
+
+def _worker(model, priors, n, batch, seed, outputs, T, shm_name, shape, lock, w, n_workers):
+    m = _model(model)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    hist = np.ndarray(shape, dtype=np.int64, buffer=shm.buf)
+    for b in range(w, -(-n // batch), n_workers):
+        rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(b,)))
+        size = min(batch, n - b * batch)
+        p, y0 = _draw(m, priors, rng, size)
+        # draws which diverge (as siqrar.py can) end up in the outermost bins
+        with np.errstate(over='ignore', invalid='ignore'):
+            ret, args = _solve(m, p, y0, T)
+        for i, name in enumerate(outputs):
+            x = np.broadcast_to(m.observe(name, ret, args), ret.shape[:2])
+            idx = np.searchsorted(EDGES, x, side='right') - 1
+            idx += np.arange(len(x))[:, None] * len(EDGES)
+            counts = np.bincount(idx.ravel(), minlength=hist[i].size).reshape(hist[i].shape)
+            with lock:
+                hist[i] += counts
+    del hist
+    shm.close()
+
+
+# Quantiles from histograms of shape (..., n_bins), interpolated linearly inside the bins.
+def _quantiles(hist, quantiles):
+    cum = np.cumsum(hist, axis=-1)
+    total = cum[..., -1:]
+    lower = np.append(0, EDGES[1:])
+    upper = np.append(EDGES[1:], EDGES[-1])
+    ret = []
+    for q in quantiles:
+        k = np.minimum((cum < q * total).sum(axis=-1), hist.shape[-1] - 1)
+        below = np.take_along_axis(cum, k[..., None], -1)[..., 0] - np.take_along_axis(hist, k[..., None], -1)[..., 0]
+        inside = np.take_along_axis(hist, k[..., None], -1)[..., 0]
+        frac = np.where(inside > 0, (q * total[..., 0] - below) / np.maximum(inside, 1), 0)
+        ret.append(lower[k] + frac * (upper[k] - lower[k]))
+    return np.array(ret)
+
+
+# Run n draws of the model from the priors and return a dict {output: array of shape (len(quantiles), T)}.
+# outputs are observables of the model (see models.py) or expressions of the compartments and parameters.
+def ensemble(model, priors, n, outputs=('Infected', 'Positive', 'New positive'), quantiles=(0.05, 0.5, 0.95),
+             T=None, batch=10000, seed=0, workers=None):
+    m = _model(model)
+    workers = min(workers or os.cpu_count(), -(-n // batch))
+    shape = (len(outputs), len(m.t) if T is None else T, len(EDGES))
+    shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 8)
+    try:
+        hist = np.ndarray(shape, dtype=np.int64, buffer=shm.buf)
+        hist[:] = 0
+        # The workers are started by a fork server: a fork of a process which has run the parallel loops of
+        # diffeq.py hangs, since the threading layer of Numba (TBB) does not survive a fork.
+        context = multiprocessing.get_context('forkserver')
+        args = (model, priors, n, batch, seed, outputs, T, shm.name, shape, context.Lock())
+        if workers == 1:
+            _worker(*args, 0, 1)
+        else:
+            processes = [context.Process(target=_worker, args=args + (w, workers)) for w in range(workers)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+            if any(process.exitcode for process in processes):
+                raise RuntimeError('a worker of the ensemble failed')
+        total = hist.copy()
+        del hist
+    finally:
+        shm.close()
+        shm.unlink()
+    return dict(zip(outputs, np.moveaxis(_quantiles(total, quantiles), 0, 1)))
+
+
+if __name__ == '__main__':
+    import time
+
+    priors = {'beta1': ('uniform', 0.2, 0.3), 'beta2': ('uniform', 0.2, 0.3), 'gamma1': ('uniform', 0.15, 0.25),
+              'gamma2': ('uniform', 0.15, 0.25), 'Test': ('uniform', 1000, 3000), 'A': ('uniform', 500, 2000)}
+    for workers in sorted({1, os.cpu_count()}):
+        start = time.perf_counter()
+        q = ensemble('siqrar', priors, 100000, workers=workers)
+        print('100000 draws of siqrar on %d cores: %.2f s' % (workers, time.perf_counter() - start))
+    for name, value in q.items():
+        print('%-14s day %g: 5%% %12.0f  50%% %12.0f  95%% %12.0f'
+              % ((name, MODELS['siqrar'].t[-1]) + tuple(value[:, -1])))
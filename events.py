@@ -0,0 +1,235 @@
+# Integration of the models with interventions as events, instead of switches inside the right-hand side.
+# seir_ld.py switches the contact rate at t_ld with where(t < t_ld, ...) and trasym.py caps the tracing
+# with minimum(delta * I, cap). Such a kink makes the adaptive solvers shrink and reject their steps
+# around the switch. Here the integration is split at the exact times of the switches:
+#   - the switches of the model itself (where and minimum in the rates) are locked: inside a piece the
+#     branch is fixed by a parameter, so the right-hand side is smooth, and the time where the condition
+#     changes is found as the root of (left - right) of the condition on the dense output of the solver;
+#   - interventions are Events which change the parameters at a given time (e.g. Event('tests', 40,
+#     {'Test': 5000})) or when a condition on the state becomes true (e.g. Event('lockdown', 'I + A > 1e6',
+#     {'beta1': 'beta1 / 2'})), with the new values numbers or expressions of the state and the parameters.
+# At every switch the solver is restarted from the state at the switch.
+#
+# ret, stats = integrate('trasym')
+#   ret has the shape (len(t), n_compartments) as odeint, stats has one entry for every piece of the
+#   integration, with the event which ends it and the steps, rejected steps (for the Runge-Kutta
+#   methods), evaluations of the right-hand side and of the Jacobian taken by the solver in it.
+#
+# python events.py compares the steps with odeint and solve_ivp on the switching right-hand sides.
+
+import re
+
+import numpy as np
+
+from models import MODELS, Model
+
+_LOCKED = {}
+
+
+class Event:
+    # name: for the statistics, when: a time (in days) or a condition like 'I > 1e6' on the compartments,
+    # the parameters and t, set: the new values of parameters, numbers or expressions like the rates,
+    # once: the event fires only the first time the condition becomes true
+    def __init__(self, name, when, set, once=True):
+        self.name = name
+        self.when = when
+        self.set = dict(set)
+        self.once = once
+
+
+# The calls name(...) in expr as (start, end, arguments), the arguments split at the top-level commas.
+def _calls(expr, name):
+    ret = []
+    for match in re.finditer(r'\b%s\(' % name, expr):
+        depth, args, begin = 0, [], match.end()
+        for i in range(match.end() - 1, len(expr)):
+            if expr[i] == '(':
+                depth += 1
+            elif expr[i] == ')':
+                depth -= 1
+                if depth == 0:
+                    args.append(expr[begin:i].strip())
+                    break
+            elif expr[i] == ',' and depth == 1:
+                args.append(expr[begin:i].strip())
+                begin = i + 1
+        ret.append((match.start(), i + 1, args))
+    return ret
+
+
+# A condition 'left < right' (or >, <=, >=) as the expression of which it tells the sign, left - right
+# for > and right - left for <, so that the condition holds when the expression is positive.
+def _sign(cond):
+    match = re.fullmatch(r'(.+?)\s*([<>]=?)\s*(.+)', cond.strip())
+    if match is None:
+        raise ValueError('the condition %r is not a comparison' % cond)
+    left, op, right = match.groups()
+    return '(%s) - (%s)' % ((left, right) if op[0] == '>' else (right, left))
+
+
+# The model with every where(cond, x, y) and minimum(x, y) of the rates replaced by where(_s0 > 0.5, x, y),
+# where the parameter _s0 (1 or 0) is the branch, and the conditions of the switches.
+def locked(m):
+    if m.name not in _LOCKED:
+        switches, transitions = [], []
+        for source, target, rate in m.transitions:
+            calls = [(a, b, args, args[0]) for a, b, args in _calls(rate, 'where')]
+            calls += [(a, b, [None] + args, '%s < %s' % tuple(args)) for a, b, args in _calls(rate, 'minimum')]
+            for a, b, args, cond in sorted(calls, reverse=True):
+                rate = rate[:a] + 'where(_s%d > 0.5, %s, %s)' % (len(switches), args[1], args[2]) + rate[b:]
+                switches.append(cond)
+            transitions.append((source, target, rate))
+        params = dict(m.params, **{'_s%d' % i: 0.0 for i in range(len(switches))})
+        _LOCKED[m.name] = (Model(m.name + '_locked', m.compartments, params, transitions, m.initial, m.t,
+                                 m.derived, m.observables), switches)
+    return _LOCKED[m.name]
+
+
+# Integrate the model with the events from p and y0 (missing entries take the defaults of the script)
+# over the time points t with one of the solvers of scipy.integrate (RK45, DOP853, LSODA, BDF, ...).
+# Events at a time at or before t[0] apply from the start.
+# Returns the states of shape (len(t), n_compartments) and the statistics of the pieces, as a list of
+# dicts with the event ending the piece ('end' for the last one), its time and the counts of the solver.
+def integrate(model, events=(), p=None, y0=None, t=None, method='RK45', rtol=1e-8, atol=1e-6):
+    import scipy.integrate
+    from scipy.optimize import brentq
+
+    p, y0 = p or {}, y0 or {}
+    m, switches = locked(MODELS[model])
+    t = m.t if t is None else np.asarray(t, dtype=float)
+    p = dict(m.params, **p)
+    init = m.initial(p, y0)
+    y = np.array([init[c] for c in m.compartments], dtype=float)
+    # the expressions compiled once, since they are evaluated at every step
+    compiled = lambda expr: compile(expr, expr, 'eval')
+    signs = [compiled(_sign(cond)) for cond in switches]
+    times = sorted((e.when, i) for i, e in enumerate(events) if not isinstance(e.when, str))
+    conditions = [(i, compiled(_sign(e.when))) for i, e in enumerate(events) if isinstance(e.when, str)]
+    fired = np.zeros(len(events), dtype=bool)
+
+    def value(expr, s, x):
+        return m.observe(expr, x, m.args(p), s)
+
+    def fire(i, s, x):
+        p.update({k: value(v, s, x) if isinstance(v, str) else v for k, v in events[i].set.items()})
+        fired[i] = True
+
+    # the events at or before the start set the parameters from the start
+    for w, i in times:
+        if w <= t[0]:
+            fire(i, t[0], y)
+    for k, cond in enumerate(signs):
+        p['_s%d' % k] = float(value(cond, t[0], y) > 0)
+    holds = [value(cond, t[0], y) >= 0 for i, cond in conditions]
+    for (i, cond), now in zip(conditions, holds):
+        if now:
+            fire(i, t[0], y)
+    ret = np.empty((len(t), len(m.compartments)))
+    ret[0] = y
+    stats = []
+    s, k = t[0], 1
+    while s < t[-1]:
+        stop = min([w for w, i in times if w > s] + [t[-1]])
+        args = m.args(p)
+        solver = getattr(scipy.integrate, method)(lambda s, x: m.deriv(x, s, *args), s, y, stop,
+                                                  rtol=rtol, atol=atol)
+        piece = dict(event='end', t=stop, steps=0, rejected=0 if hasattr(solver, 'n_stages') else None,
+                     rhs=0, jac=0)
+        while True:
+            before = solver.nfev
+            message = solver.step()
+            if solver.status == 'failed':
+                raise RuntimeError('%s failed at t = %g: %s' % (method, solver.t, message))
+            piece['steps'] += 1
+            if piece['rejected'] is not None:
+                piece['rejected'] += (solver.nfev - before) // solver.n_stages - 1
+            dense = solver.dense_output()
+            # the first switch or event in the step
+            first = (solver.t, None)
+            for j, expr in enumerate(signs):
+                if (value(expr, solver.t, solver.y) > 0) != (p['_s%d' % j] > 0.5):
+                    g = lambda r: value(expr, r, dense(r))
+                    root = brentq(g, solver.t_old, solver.t, xtol=1e-12) if g(solver.t_old) * g(solver.t) < 0 \
+                        else solver.t_old
+                    first = min(first, (root, ('switch', j)), key=lambda x: x[0])
+            for j, (i, expr) in enumerate(conditions):
+                now = value(expr, solver.t, solver.y) >= 0
+                if now and not holds[j] and not (events[i].once and fired[i]):
+                    g = lambda r: value(expr, r, dense(r))
+                    root = brentq(g, solver.t_old, solver.t, xtol=1e-12) if g(solver.t_old) < 0 else solver.t_old
+                    first = min(first, (root, ('event', i)), key=lambda x: x[0])
+                holds[j] = now
+            end = first[0]
+            while k < len(t) and t[k] <= end:
+                ret[k] = dense(t[k]) if t[k] < solver.t else solver.y
+                k += 1
+            if first[1] is not None or solver.status == 'finished':
+                break
+        y = dense(end) if end < solver.t else solver.y.copy()
+        piece.update(rhs=solver.nfev, jac=solver.njev, t=end)
+        if first[1] is not None:
+            kind, j = first[1]
+            if kind == 'switch':
+                p['_s%d' % j] = 1.0 - p['_s%d' % j]
+                piece['event'] = switches[j]
+            else:
+                fire(j, end, y)
+                piece['event'] = events[j].name
+        else:
+            for w, i in times:
+                if w == end:
+                    fire(i, end, y)
+                    piece['event'] = events[i].name
+        # the conditions as at the end of the piece, which can be before the end of the last step
+        holds = [value(cond, end, y) >= 0 for i, cond in conditions]
+        stats.append(piece)
+        s = end
+    return ret, stats
+
+
+if __name__ == '__main__':
+    import time
+
+    from scipy.integrate import odeint, solve_ivp
+
+    def row(name, steps, rejected, rhs, seconds, ret, ref):
+        print('%-34s %6s %9s %6d %8.1f ms   max deviation %.2e of N'
+              % (name, steps, '-' if rejected is None else rejected, rhs, seconds * 1000,
+                 np.abs(ret - ref).max() / ref[0].sum()))
+
+    for model in ('seir_ld', 'trasym'):
+        m = MODELS[model]
+        args = m.args(m.params)
+        init = m.initial(m.params)
+        y = [init[c] for c in m.compartments]
+        ref, stats = integrate(model, rtol=1e-12, atol=1e-6)
+        print('%s, switches %s' % (model, [s['event'] for s in stats]))
+        print('%-34s %6s %9s %6s' % ('', 'steps', 'rejected', 'rhs'))
+
+        start = time.perf_counter()
+        ret, info = odeint(m.deriv, y, m.t, args=args, full_output=True)
+        row('odeint (switch in the rhs)', info['nst'][-1], None, info['nfe'][-1], time.perf_counter() - start, ret, ref)
+        start = time.perf_counter()
+        sol = solve_ivp(lambda s, x: m.deriv(x, s, *args), (m.t[0], m.t[-1]), y, rtol=1e-8, atol=1e-6,
+                        dense_output=True)
+        steps = len(sol.t) - 1
+        # one evaluation at the start, one for the first step size and 6 for every attempted step
+        row('solve_ivp RK45 (switch in the rhs)', steps, (sol.nfev - 2) // 6 - steps, sol.nfev,
+            time.perf_counter() - start, sol.sol(m.t).T, ref)
+        for method in ('RK45', 'LSODA'):
+            start = time.perf_counter()
+            ret, stats = integrate(model, method=method)
+            seconds = time.perf_counter() - start
+            total = lambda key: None if stats[0][key] is None else sum(s[key] for s in stats)
+            row('events %s' % method, total('steps'), total('rejected'), total('rhs'), seconds, ret, ref)
+        for s in stats:
+            print('    until t = %7.3f (%s): %d steps, %d rhs' % (s['t'], s['event'], s['steps'], s['rhs']))
+        print()
+
+    events = [Event('lockdown', 'I + A > 1e5', {'beta1': 'beta1 / 2', 'beta2': 'beta2 / 2'}),
+              Event('more tests', 60, {'Test': 5000})]
+    ret, stats = integrate('siqrar', events, dict(Test=500), t=np.linspace(0, 100, 101))
+    print('siqrar with 500 tests per day, a lockdown when I + A exceeds 1e5 and 5000 tests per day from day 60:')
+    for s in stats:
+        print('    until t = %7.3f (%s): %d steps, %s rejected, %d rhs'
+              % (s['t'], s['event'], s['steps'], s['rejected'], s['rhs']))
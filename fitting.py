@@ -0,0 +1,181 @@
+# Fitting the parameters of a model to observed daily positives (and tests).
+# The model prediction is the observable 'New positive' of the model (see models.py) on every day, and
+# when the number of tests of every day is given (for the models with the parameter Test), it is rescaled to
+# them, i.e. the predicted positives are the positivity rate of the model (New positive / Test) times the
+# tests of the day.
+# The parameters (e.g. beta1, beta2, Test in siqrar.py, or beta0, beta1, t_ld in seir_ld.py) are
+# estimated by maximizing the Poisson likelihood (loss='poisson') or by least squares (loss='lsq').
+#
+# The gradient of the loss is exact: the sensitivities dy/dp are integrated together with the model,
+#   d/dt (dy/dp) = df/dy . dy/dp + df/dp,
+# with df/dy and df/dp derived with SymPy (as in jacobian.py). The switch of the contact rate at t_ld
+# (seir_ld.py) is integrated as two pieces, and the sensitivity to t_ld is the jump f(t_ld-) - f(t_ld+)
+# at the switch. The optimization (L-BFGS-B in the logarithms of the parameters) starts from several
+# random points in the bounds, which run in parallel processes, and the best fit is returned.
+#
+#   best = fit('siqrar', positives, tests, params=('beta1', 'beta2', 'Test'))
+#   best['beta1'], best['loss']
+#
+# python fitting.py fits synthetic data of siqrar.py and seir_ld.py.
+
+import multiprocessing
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from models import MODELS
+
+_SENSITIVITIES = {}
+
+
+# The right-hand side of the model extended by the sensitivities s = dy/dq to the parameters names q,
+# and the observable with its derivative d(obs)/dq = d(obs)/dy . s + d(obs)/dq, as NumPy functions of
+# (z, t, *args) with z = (y, s) flattened.
+def _sensitivities(m, names, observable):
+    key = (m.name, names, observable)
+    if key not in _SENSITIVITIES:
+        import sympy as sp
+        from jacobian import symbolic
+
+        y, t, p, f, env = symbolic(m)
+        q = [p[list(m.params).index(k)] for k in names]
+        s = sp.Matrix(len(y), len(q), lambda i, j: sp.Symbol('s_%d_%d' % (i, j)))
+        ds = f.jacobian(y) * s + f.jacobian(q)
+        obs = sp.Matrix([eval(m.observables.get(observable, observable), {}, env)])
+        dobs = obs.jacobian(y) * s + obs.jacobian(q)
+        args = (list(y) + list(s), t) + tuple(p)
+        _SENSITIVITIES[key] = (sp.lambdify(args, list(f) + list(ds), 'numpy', cse=True),
+                               sp.lambdify(args, list(obs) + list(dobs), 'numpy', cse=True))
+    return _SENSITIVITIES[key]
+
+
+def _augmented(z, t, rhs, args):
+    return rhs(z, t, *args)
+
+
+# The observable on the days t and its derivatives by the parameters names, of shapes (T,) and (T, k).
+# Raises RuntimeError where the model cannot be integrated (e.g. siqrar.py when A + Flu reaches 0).
+def predict(model, p, names, t, observable='New positive'):
+    from scipy.integrate import ODEintWarning, odeint
+
+    m = MODELS[model]
+    p = dict(m.params, **p)
+    args = m.args(p)
+    rhs, obs = _sensitivities(m, tuple(names), observable)
+    n, k = len(m.compartments), len(names)
+    init = m.initial(p)
+    z = np.concatenate([[init[c] for c in m.compartments], np.zeros(n * k)])
+    # the pieces between the switches, with the switch times in the time grid
+    switch = p.get('t_ld')
+    pieces = [t] if switch is None or not t[0] < switch < t[-1] else \
+        [np.append(t[t < switch], switch), np.insert(t[t > switch], 0, switch)]
+    Z = []
+    for i, ti in enumerate(pieces):
+        if i > 0:
+            z = Z[-1][-1].copy()
+            Z[-1] = Z[-1][:-1]
+            if 't_ld' in names:
+                # delaying the switch keeps the rates before the switch for longer
+                jump = m.deriv(z[:n], switch * (1 - 1e-12), *args) - m.deriv(z[:n], switch, *args)
+                z[n:].reshape(n, k)[:, list(names).index('t_ld')] += jump
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', ODEintWarning)
+            Zi, info = odeint(_augmented, z, ti, args=(rhs, args), rtol=1e-8, atol=1e-6, mxstep=10000,
+                              tcrit=[switch] if i < len(pieces) - 1 else None, full_output=True)
+        if info['message'] != 'Integration successful.':
+            raise RuntimeError('%s with %s: %s' % (model, p, info['message']))
+        Z.append(Zi)
+        if i > 0 and ti[0] not in t:
+            Z[-1] = Z[-1][1:]
+    Z = np.concatenate(Z)
+    ret = np.array([np.broadcast_arrays(*obs(z, ti, *args)) for z, ti in zip(Z, t)], dtype=float)
+    return ret[:, 0], ret[:, 1:]
+
+
+# The loss and its gradient by the logarithms of the parameters (infinite where the model cannot be integrated).
+def _loss(logq, model, names, fixed, t, positives, tests, loss):
+    q = np.exp(logq)
+    p = dict(fixed, **dict(zip(names, q)))
+    try:
+        mu, dmu = predict(model, p, names, t)
+    except RuntimeError:
+        return np.inf, np.zeros_like(logq)
+    if tests is not None:
+        mu, dmu = mu * tests / p['Test'], dmu * (tests / p['Test'])[:, None]
+        if 'Test' in names:
+            dmu[:, list(names).index('Test')] -= mu / p['Test']
+    if loss == 'poisson':
+        mu = np.maximum(mu, 1e-9)
+        value = np.sum(mu - positives * np.log(mu))
+        dvalue = (1 - positives / mu) @ dmu
+    else:
+        value = np.sum((mu - positives) ** 2)
+        dvalue = 2 * (mu - positives) @ dmu
+    return value, dvalue * q
+
+
+def _start(logq0, bounds, *args):
+    from scipy.optimize import minimize
+
+    with np.errstate(all='ignore'):
+        res = minimize(_loss, logq0, args=args, jac=True, method='L-BFGS-B', bounds=bounds)
+    return res.fun, res.x
+
+
+# Fit the parameters names of the model to the observed daily positives (and tests) on the days t
+# (default 0, 1, 2, ...). bounds maps a parameter to (low, high), by default a factor 10 around the
+# value of the script (t_ld within the observed days). p sets the other parameters.
+# Returns a dict of the fitted parameters and the loss.
+def fit(model, positives, tests=None, params=('beta1', 'beta2', 'Test'), t=None, p=None, bounds=None,
+        loss='poisson', starts=8, seed=0, workers=None):
+    p, bounds = p or {}, bounds or {}
+    m = MODELS[model]
+    positives = np.asarray(positives, dtype=float)
+    tests = None if tests is None else np.asarray(tests, dtype=float)
+    if tests is not None and 'Test' not in m.params:
+        raise ValueError('%s has no parameter Test to rescale to the tests' % model)
+    t = np.arange(len(positives), dtype=float) if t is None else np.asarray(t, dtype=float)
+    fixed = dict(m.params, **p)
+    default = dict((k, (fixed[k] / 10, fixed[k] * 10)) for k in params)
+    if 't_ld' in params:
+        default['t_ld'] = (t[1], t[-2])
+    bounds = np.log([bounds.get(k, default[k]) for k in params])
+    rng = np.random.default_rng(seed)
+    logq0 = rng.uniform(bounds[:, 0], bounds[:, 1], (starts, len(params)))
+    args = (model, tuple(params), fixed, t, positives, tests, loss)
+    # the starts may follow difference equations in the same process, whose TBB threads do not survive a fork
+    context = multiprocessing.get_context('forkserver')
+    with ProcessPoolExecutor(min(workers or os.cpu_count(), starts), mp_context=context) as pool:
+        results = list(pool.map(_start, logq0, [bounds] * starts, *([a] * starts for a in args)))
+    value, logq = min(results, key=lambda r: r[0])
+    return dict(zip(params, np.exp(logq)), loss=value)
+
+
+if __name__ == '__main__':
+    import time
+
+    rng = np.random.default_rng(1)
+    t = np.arange(40.0)
+    true = dict(beta1=0.3, beta2=0.2, Test=400)
+    tests = rng.integers(300, 500, len(t)).astype(float)
+    mu, _ = predict('siqrar', true, ('beta1',), t)
+    positives = rng.poisson(np.maximum(mu * tests / true['Test'], 0))
+    # Test is not identifiable from these data: the positivity hardly depends on it (400 tests a day remove
+    # few of the infected), so the loss is flat in Test and it is given rather than fitted. The bounds keep
+    # away from beta1 >> beta2, where the tests drain A + Flu to 0 and the model cannot be integrated.
+    start = time.perf_counter()
+    best = fit('siqrar', positives, tests, params=('beta1', 'beta2'), p=dict(Test=true['Test']),
+               bounds=dict(beta1=(0.1, 1), beta2=(0.1, 1)))
+    print('siqrar:  %.1f s, true %s' % (time.perf_counter() - start, true))
+    print('         fitted %s' % {k: round(float(v), 3) for k, v in best.items()})
+
+    t = np.arange(100.0)
+    true = dict(beta0=0.5, beta1=0.12, t_ld=42)
+    mu, _ = predict('seir_ld', true, ('beta0',), t)
+    positives = rng.poisson(np.maximum(mu, 0))
+    start = time.perf_counter()
+    best = fit('seir_ld', positives, params=('beta0', 'beta1', 't_ld'))
+    print('seir_ld: %.1f s, true %s' % (time.perf_counter() - start, true))
+    print('         fitted %s' % {k: round(float(v), 3) for k, v in best.items()})
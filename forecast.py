@@ -0,0 +1,188 @@
+# Online forecasts: the state of a model in many regions, updated every day with the new positives.
+# Instead of integrating the grid of a script from a fixed initial state, a Forecaster keeps the current
+# state of every region as an ensemble of members (an ensemble Kalman filter, EnKF). Every day it
+#   1. advances the members by one day (RK4 on all the regions and members as one batch, sweep.py), with
+#      the number of tests of that day if given (the parameter Test of siqctr.py and siqrar.py),
+#   2. compares the positives of the day predicted by every member (the observable New positive integrated
+#      over the day) with the reported positives, and moves the members towards the report by the Kalman
+#      gain of every region, with the variance of the report taken as that of a Poisson count times noise.
+# Some parameters (e.g. the contact rate beta1) can be estimated along with the state: they are part of
+# the state of the filter (as logarithms, with a small random walk every day so that they can drift),
+# and every member has its own values. Nothing of the past is kept or integrated again: a forecast
+# starts from the current members, so the spread of the forecast includes the uncertainty of the state.
+#
+#   f = Forecaster('siqrar', regions=300, p=dict(N=N), estimate={'beta1': 0.3})
+#   for positives, tests in reports:
+#       f.assimilate(positives, tests)           # arrays of shape (n_regions,)
+#   q = f.forecast(14)                           # quantiles of the positives over the next 14 days
+#
+# python forecast.py follows 300 regions of siqrar.py with unknown contact rates for 60 days.
+
+import numpy as np
+
+from models import MODELS
+from sweep import rk4_step
+
+
+class Forecaster:
+    # model: the name of a model in models.py, regions: the number of regions, p and y0: the parameters and
+    # the initial values (scalars or arrays of shape (n_regions,), missing entries take the defaults of the
+    # script), estimate: the parameters to estimate with their first guess (the spread of the members
+    # around it is lognormal with the standard deviation spread), observation: the expression of the positives
+    # per day (default the observable New positive), members: the size of the ensemble, noise: the variance
+    # of a report relative to a Poisson count, drift: the daily random walk of the estimated parameters
+    # (in log), inflation: the factor on the deviations of the members from their mean before every update
+    def __init__(self, model, regions, p=None, y0=None, estimate=None, observation=None, members=50, noise=4.0,
+                 spread=0.3, drift=0.02, inflation=1.05, t=0.0, seed=0):
+        p, y0, estimate = p or {}, y0 or {}, estimate or {}
+        self.m = m = MODELS[model]
+        unknown = [k for k in estimate if k not in m.params]
+        if unknown:
+            raise ValueError('%s has no parameters %s to estimate' % (model, ', '.join(unknown)))
+        self.observation = observation or m.observables.get('New positive')
+        if self.observation is None:
+            raise ValueError('%s has no observable New positive, give the observation' % model)
+        self.observation = compile(self.observation, '<observation>', 'eval')
+        self.estimate = list(estimate)
+        self.noise, self.drift, self.inflation = noise, drift, inflation
+        self.rng = np.random.default_rng(seed)
+        self.regions, self.members = regions, members
+        self.t = float(t)
+        # the estimated parameters are in the state, a value given for them in p is only a placeholder
+        p = dict({'N': m.params['N']}, **p)
+        p.update({k: 1.0 for k in self.estimate})
+        args, y = m.batch({k: np.broadcast_to(np.asarray(v, dtype=float), (regions,)) for k, v in p.items()}, y0)
+        if len(y) != regions:
+            raise ValueError('%d regions in p and y0, expected %d' % (len(y), regions))
+        # the fixed parameters of every member, shape (n_regions * members,)
+        self.args = [np.repeat(a, members) for a in args]
+        # the state of the filter: the compartments and the logarithms of the estimated parameters,
+        # shape (n_regions, members, n_compartments + n_estimated)
+        k = len(m.compartments)
+        self.x = np.empty((regions, members, k + len(self.estimate)))
+        self.x[:, :, :k] = y[:, None, :]
+        for j, (name, guess) in enumerate(estimate.items()):
+            self.x[:, :, k + j] = np.log(guess) + spread * self.rng.standard_normal((regions, members))
+
+    # The arguments of deriv for the members in the state x, with the tests of the day if given.
+    def _args(self, x, tests):
+        args = list(self.args)
+        k = len(self.m.compartments)
+        names = list(self.m.params)
+        for j, name in enumerate(self.estimate):
+            args[names.index(name)] = np.exp(x[..., k + j]).ravel()
+        if tests is not None:
+            if 'Test' not in names:
+                raise ValueError('%s has no parameter Test for the tests' % self.m.name)
+            args[names.index('Test')] = np.repeat(np.broadcast_to(np.asarray(tests, dtype=float), (self.regions,)),
+                                                  x.shape[1])
+        return args
+
+    # Advance the states y (shape (n, n_compartments)) by one day with the arguments args. Returns the
+    # new states and the positives of the day, integrated along the steps as an extra compartment.
+    def _day(self, y, t, args, substeps):
+        m, code = self.m, self.observation
+
+        def f(z, s, *args):
+            out = np.empty_like(z)
+            m.deriv(z[:, :-1], s, *args, out=out[:, :-1])
+            out[:, -1] = m.observe(code, z[:, :-1], args, s)
+            return out
+
+        z = np.concatenate([y, np.zeros((len(y), 1))], axis=1)
+        h = 1.0 / substeps
+        for i in range(substeps):
+            z = rk4_step(f, z, t + i * h, h, args)
+        return np.maximum(z[:, :-1], 0), z[:, -1]
+
+    # Assimilate the report of one day: positives (and the tests, if the model has the parameter Test) of
+    # shape (n_regions,); nan for a region without a report. Returns the mean of the predicted positives
+    # of the day before the update.
+    def assimilate(self, positives, tests=None, substeps=10):
+        n, r, k = self.members, self.regions, len(self.m.compartments)
+        x = self.x
+        if self.estimate:
+            x[:, :, k:] += self.drift * self.rng.standard_normal((r, n, len(self.estimate)))
+        y, h = self._day(x[:, :, :k].reshape(-1, k), self.t, self._args(x, tests), substeps)
+        x[:, :, :k] = y.reshape(r, n, k)
+        h = h.reshape(r, n)
+        self.t += 1
+        # the Kalman update of every region, with perturbed reports so that the spread stays consistent
+        d = np.asarray(positives, dtype=float)
+        seen = np.isfinite(d)
+        mean = x.mean(axis=1, keepdims=True)
+        x[:] = mean + self.inflation * (x - mean)
+        a = x - x.mean(axis=1, keepdims=True)
+        b = h - h.mean(axis=1, keepdims=True)
+        R = self.noise * np.maximum(np.where(seen, d, 0), 1)
+        gain = np.einsum('rnd,rn->rd', a, b) / (n - 1) / ((b * b).sum(axis=1) / (n - 1) + R)[:, None]
+        reports = np.where(seen, d, 0)[:, None] + np.sqrt(R)[:, None] * self.rng.standard_normal((r, n))
+        innovation = np.where(seen[:, None], reports - h, 0)
+        x += gain[:, None, :] * innovation[:, :, None]
+        x[:, :, :k] = np.maximum(x[:, :, :k], 0)
+        return h.mean(axis=1)
+
+    # The mean and the standard deviation of the compartments and of the estimated parameters of every
+    # region, as dicts of arrays of shape (n_regions,).
+    def state(self):
+        k = len(self.m.compartments)
+        names = list(self.m.compartments) + self.estimate
+        values = np.concatenate([self.x[:, :, :k], np.exp(self.x[:, :, k:])], axis=2)
+        return ({c: values[:, :, i].mean(axis=1) for i, c in enumerate(names)},
+                {c: values[:, :, i].std(axis=1) for i, c in enumerate(names)})
+
+    # The positives of the next days from the current members (which are left unchanged), with the tests of
+    # the coming days (shape (days, n_regions), default the parameter Test). Returns the quantiles of the
+    # positives of every day over the members, of shape (len(quantiles), days, n_regions).
+    def forecast(self, days, tests=None, quantiles=(0.05, 0.5, 0.95), substeps=10):
+        n, r, k = self.members, self.regions, len(self.m.compartments)
+        y = self.x[:, :, :k].reshape(-1, k)
+        ret = np.empty((days, r, n))
+        for i in range(days):
+            y, h = self._day(y, self.t + i, self._args(self.x, None if tests is None else tests[i]), substeps)
+            ret[i] = h.reshape(r, n)
+        return np.quantile(ret, quantiles, axis=2)
+
+
+if __name__ == '__main__':
+    import time
+
+    from sweep import rk4
+
+    m = MODELS['siqrar']
+    rng = np.random.default_rng(1)
+    r, T = 300, 60
+    # the truth: regions of different sizes and contact rates, and a number of tests varying from day to day
+    N = np.round(10 ** rng.uniform(5.5, 7.5, r))
+    beta1 = rng.uniform(0.15, 0.35, r)
+    p = dict(N=N, beta1=beta1, Flu=N / 1e3)
+    y0 = dict(A=N / 1e5)
+    tests = np.round(N / 1e4 * rng.uniform(0.5, 1.5, (T + 14, r)))
+    t = np.arange(T + 15.0)
+    args, y = m.batch(p, y0)
+    Test = list(m.params).index('Test')
+    truth = [y]
+    for i in range(T + 14):
+        args = args[:Test] + (tests[i],) + args[Test + 1:]
+        truth.append(rk4(m.deriv, truth[-1], t[i:i + 2], args)[-1])
+    truth = np.array(truth)
+    rates = np.array([m.observe('New positive', truth[i], args[:Test] + (tests[i],) + args[Test + 1:])
+                      for i in range(T + 14)])
+    positives = rng.poisson(np.maximum(rates, 0))
+
+    f = Forecaster('siqrar', r, dict(N=N, Flu=N / 1e3), dict(A=N / 1e5), estimate={'beta1': 0.25})
+    start = time.perf_counter()
+    for day in range(T):
+        f.assimilate(positives[day], tests[day])
+    seconds = time.perf_counter() - start
+    mean, std = f.state()
+    print('%d regions, %d members: %.1f ms per day, error of beta1 %.3f (spread %.3f, prior error %.3f)'
+          % (r, f.members, 1000 * seconds / T, np.abs(mean['beta1'] - beta1).mean(), std['beta1'].mean(),
+             np.abs(0.25 - beta1).mean()))
+    start = time.perf_counter()
+    q = f.forecast(14, tests[T:])
+    seconds = time.perf_counter() - start
+    inside = (positives[T:] >= q[0]) & (positives[T:] <= q[2])
+    error = np.abs(q[1] - positives[T:]) / np.maximum(positives[T:], 1)
+    print('14-day forecast in %.1f ms: %.0f%% of the reports within the 90%% band, median relative error %.1f%%'
+          % (1000 * seconds, 100 * inside.mean(), 100 * np.median(error)))
@@ -0,0 +1,161 @@
+# Instrumented runs of odeint: what the solver did and where the time went, for one run or for a survey
+# of many parameter sets, to find the slow (stiff) regions of parameter space.
+# odeint (LSODA) switches between the Adams method for non-stiff stretches and BDF for stiff ones; with
+# full_output it reports at every time point of the grid the cumulative steps, evaluations of the right-
+# hand side and of the Jacobian, the last step size and the method in use. run() keeps these per interval
+# of the grid and the points where the method switched. The right-hand side is not wrapped: wrapping it in
+# Python to count and time its calls costs about 5% of a run, while odeint counts the calls anyway. The
+# time of one call is sampled once per model instead, on states along the first run, and the time in the
+# right-hand side is the calls times that. The rest of the wall time is the solver itself (the linear
+# algebra of BDF, the step control), and an instrumented run takes a few percent longer than a plain one.
+#
+#   ret, r = run('trasym', dict(cap=2000))
+#   r['steps'], r['rhs'], r['jac'], r['switches']        # [(t, 'Adams' or 'BDF'), ...]
+#   records = survey('massteststratified', dict(r=np.linspace(0, 0.1, 50)))
+#   write_json(records, 'profile.json'); write_folded(records, 'profile.folded')
+#
+# The folded file has one line "model;parameters;method;part microseconds" per interval of the grid and
+# part (rhs, solver), the input of flamegraph.pl and speedscope, so that the parameter sets (and within
+# them the method) that take the time stand out.
+#
+# python instrument.py surveys siqrar.py over Flu and Test and reports the slowest parameter sets.
+
+import json
+import time
+
+import numpy as np
+
+from models import MODELS
+
+# the methods of LSODA by their number in mused
+NAMES = np.array(['?', 'Adams', 'BDF'])
+_COST = {}
+
+
+# The time of one call of the right-hand side of m, measured once per model on states along a run (it
+# hardly depends on the state, the arrays have the same size at every call).
+def _cost(m, ret, t, args, calls=200):
+    if m.name not in _COST:
+        states = ret[np.linspace(0, len(ret) - 1, calls).astype(int)]
+        start = time.perf_counter()
+        for y, s in zip(states, np.linspace(t[0], t[-1], calls)):
+            m.deriv(y, s, *args)
+        _COST[m.name] = (time.perf_counter() - start) / calls
+    return _COST[m.name]
+
+
+# One instrumented run of odeint with the parameters p and the initial values y0 (missing entries take the
+# defaults of the script). Returns the trajectory and a record (a dict) with
+# the wall time, the estimated time in the right-hand side, the steps, the calls of the right-hand side
+# and of the Jacobian, and per interval of the grid (t[i-1], t[i]] the steps, the calls, the last step
+# size and the method in use, and the switches of the method.
+def run(model, p=None, y0=None, t=None, rtol=1e-8, atol=1e-6, **options):
+    from scipy.integrate import odeint
+
+    p, y0 = p or {}, y0 or {}
+    m = MODELS[model]
+    pp = dict(m.params, **p)
+    init = m.initial(pp, y0)
+    args = tuple(float(pp[k]) for k in m.params)
+    y = np.array([init[c] for c in m.compartments], dtype=float)
+    t = np.asarray(m.t if t is None else t, dtype=float)
+    start = time.perf_counter()
+    ret, info = odeint(m.deriv, y, t, args=args, rtol=rtol, atol=atol, full_output=True, **options)
+    wall = time.perf_counter() - start
+    calls = int(info['nfe'][-1])
+    rhs = calls * _cost(m, ret, t, args)
+    method = NAMES[info['mused']]
+    switches = [(float(t[i + 1]), method[i]) for i in np.flatnonzero(info['mused'][1:] != info['mused'][:-1]) + 1]
+    record = dict(model=model, params=dict(zip(m.params, args)), wall=wall, rhs_seconds=min(rhs, wall),
+                  steps=int(info['nst'][-1]), rhs=calls, jac=int(info['nje'][-1]),
+                  success=info['message'] == 'Integration successful.', message=info['message'],
+                  switches=switches, t=t[1:], interval_steps=np.diff(info['nst'], prepend=0),
+                  interval_rhs=np.diff(info['nfe'], prepend=0), step_size=info['hu'], method=method)
+    return ret, record
+
+
+# Instrumented runs of all the parameter sets of the arrays in p and y0 (of one length). Returns the records.
+def survey(model, p=None, y0=None, t=None, **options):
+    p, y0 = p or {}, y0 or {}
+    m = MODELS[model]
+    args, y = m.batch(p, y0)
+    records = []
+    for i in range(len(y)):
+        q = {k: float(a[i]) for k, a in zip(m.params, args)}
+        z = {c: float(v) for c, v in zip(m.compartments, y[i])}
+        records.append(run(model, q, z, t, **options)[1])
+    return records
+
+
+def write_json(records, path):
+    with open(path, 'w') as f:
+        json.dump(records, f, default=np.ndarray.tolist)
+
+
+# The records as folded stacks: every interval of the grid splits its share of the wall time (in proportion
+# to its calls of the right-hand side) into the right-hand side and the solver. Only the parameters which
+# vary among the records are part of the stack.
+def folded(records):
+    varying = [k for k in records[0]['params'] if len({r['params'][k] for r in records}) > 1]
+    lines = {}
+    for r in records:
+        name = ','.join('%s=%.4g' % (k, r['params'][k]) for k in varying) or 'default'
+        calls = max(r['rhs'], 1)
+        for method, n in zip(r['method'], r['interval_rhs']):
+            share = r['wall'] * n / calls
+            for part, seconds in (('rhs', share * r['rhs_seconds'] / r['wall']),
+                                  ('solver', share * (1 - r['rhs_seconds'] / r['wall']))):
+                key = '%s;%s;%s;%s' % (r['model'], name, method, part)
+                lines[key] = lines.get(key, 0) + seconds
+    return ['%s %d' % (key, round(seconds * 1e6)) for key, seconds in lines.items() if round(seconds * 1e6) > 0]
+
+
+def write_folded(records, path):
+    with open(path, 'w') as f:
+        f.write('\n'.join(folded(records)) + '\n')
+
+
+if __name__ == '__main__':
+    import os
+    import tempfile
+
+    from scipy.integrate import odeint
+
+    from sweep import grid
+
+    # the overhead of the instrumentation, against plain odeint on the same runs
+    m = MODELS['massteststratified']
+    args, y = m.batch()
+    args = tuple(a[0] for a in args)
+    runs = (('plain', lambda: odeint(m.deriv, y[0], m.t, args=args, rtol=1e-8, atol=1e-6)),
+            ('instrumented', lambda: run('massteststratified')))
+    times = {name: [] for name, f in runs}
+    for i in range(50):
+        for name, f in runs:
+            start = time.perf_counter()
+            f()
+            times[name].append(time.perf_counter() - start)
+    best = {name: np.median(v) for name, v in times.items()}
+    print('massteststratified: %.2f ms plain, %.2f ms instrumented, overhead %.1f%%'
+          % (1e3 * best['plain'], 1e3 * best['instrumented'], 100 * (best['instrumented'] / best['plain'] - 1)))
+
+    _, r = run('trasym')
+    print('trasym: %d steps, %d calls of the right-hand side (%.0f%% of %.1f ms), %d of the Jacobian, switches %s'
+          % (r['steps'], r['rhs'], 100 * r['rhs_seconds'] / r['wall'], 1e3 * r['wall'], r['jac'], r['switches']))
+
+    # siqrar over the confounding Flu and the tests: few Flu and many tests make the test terms stiff
+    p, y0 = grid('siqrar', Flu=np.logspace(0, 4, 10), Test=np.linspace(0, 10000, 10))
+    records = survey('siqrar', p, y0, t=np.linspace(0, 100, 101))
+    records.sort(key=lambda r: -r['wall'])
+    print('siqrar over (Flu, Test): %d runs, %.0f ms in all' % (len(records), 1e3 * sum(r['wall'] for r in records)))
+    for r in records[:3] + records[-1:]:
+        print('    Flu = %5.0f, Test = %5.0f: %6.2f ms, %4d steps, %4d calls, %3d Jacobians, %d switches, %s'
+              % (r['params']['Flu'], r['params']['Test'], 1e3 * r['wall'], r['steps'], r['rhs'], r['jac'],
+                 len(r['switches']), 'BDF from day %g' % r['switches'][0][0] if r['switches'] else 'Adams'))
+    with tempfile.TemporaryDirectory() as directory:
+        write_json(records, os.path.join(directory, 'profile.json'))
+        write_folded(records, os.path.join(directory, 'profile.folded'))
+        with open(os.path.join(directory, 'profile.folded')) as f:
+            lines = f.read().split('\n')
+        print('    profile.json %.0f kB, profile.folded %d stacks, e.g. %s'
+              % (os.path.getsize(os.path.join(directory, 'profile.json')) / 1e3, len(lines) - 1, lines[0]))
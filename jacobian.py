@@ -0,0 +1,117 @@
+# Analytic Jacobians of the ODE models in models.py, derived with SymPy.
+# Without a Jacobian odeint (LSODA) estimates it by finite differences, i.e. n_compartments extra
+# calls of the right-hand side every time the Jacobian is updated, which is often when the
+# saturating test terms (Test * I / (I + Flu), Test * I / (C + I), s * r * N * I / (S+I)) are stiff.
+#
+# python jacobian.py        derives the Jacobians once and writes them to jacobians_generated.py as NumPy code
+# python jacobian.py bench  compares odeint with and without Dfun (RHS/Jacobian evaluations and wall time)
+#
+# The generated functions have the signature of deriv, so they can be passed directly:
+#   odeint(m.deriv, y0, t, args=m.args(p), Dfun=JACOBIANS[m.name])
+#   solve_ivp(..., method='LSODA', jac=lambda t, y, *args: JACOBIANS[m.name](y, t, *args))
+# As the right-hand sides, they also take a batch of states and return shape (..., n, n).
+# KERNELS[name](y, t, p) is the Jacobian of a single state, with the signature of m.kernel.
+
+import sys
+
+from models import MODELS
+
+
+# The right-hand side of a model in SymPy, from the equations generated by models.py.
+# Returns the symbols of the compartments, the time and the parameters, the right-hand side as a
+# column matrix, and the namespace of all the symbols and the intermediate quantities of the equations
+# (in which e.g. the observables of the model can be evaluated).
+def symbolic(m):
+    import sympy as sp
+
+    y = sp.symbols(m.compartments)
+    t = sp.Symbol('t')
+    p = sp.symbols(tuple(m.params))
+    env = dict(zip(m.compartments, y), t=t, **dict(zip(m.params, p)))
+    env.update(where=lambda cond, a, b: sp.Piecewise((a, cond), (b, True)), minimum=sp.Min)
+    for line in m.equations():
+        name, expr = line.split(' = ', 1)
+        env[name] = eval(expr, {}, env)
+    return y, t, p, sp.Matrix([env['d%sdt' % c] for c in m.compartments]), env
+
+
+def _generate(m):
+    import sympy as sp
+    from sympy.printing.numpy import NumPyPrinter
+    from sympy.printing.pycode import PythonCodePrinter
+
+    y, t, p, f, env = symbolic(m)
+    J = f.jacobian(y)
+    entries = [(i, j, J[i, j]) for i in range(J.rows) for j in range(J.cols) if J[i, j] != 0]
+    subs, exprs = sp.cse([e for i, j, e in entries], symbols=sp.numbered_symbols('x'))
+    ret = []
+    # vectorized as deriv, and for a single state as kernel (conditional expressions instead of np.select)
+    for printer, header, zeros, index in (
+            (NumPyPrinter(), ['def %s(y, t, %s):' % (m.name, ', '.join(m.params)),
+                              '    %s = np.moveaxis(y, -1, 0)' % ', '.join(m.compartments)],
+             'np.zeros(np.shape(y) + (%d,))' % J.cols, '...,'),
+            (PythonCodePrinter(), ['def %s_kernel(y, t, p):' % m.name,
+                                   '    %s, = y' % ', '.join(m.compartments),
+                                   '    %s, = p' % ', '.join(m.params)],
+             'np.zeros((%d, %d))' % (J.rows, J.cols), '')):
+        def code(e):
+            return printer.doprint(e).replace('numpy.', 'np.').replace('math.', 'np.')
+
+        lines = header + ['    %s = %s' % (s, code(e)) for s, e in subs]
+        lines += ['    J = %s' % zeros]
+        lines += ['    J[%s%d, %d] = %s' % (index and index + ' ', i, j, code(e))
+                  for (i, j, _), e in zip(entries, exprs)]
+        lines += ['    return J']
+        ret.append('\n'.join(lines))
+    return '\n\n\n'.join(ret)
+
+
+def generate(path='jacobians_generated.py'):
+    out = ['# Generated by jacobian.py from the right-hand sides in models.py, do not edit.',
+           '# J[..., i, j] is the derivative of the i-th component of deriv by the j-th compartment.',
+           '# <model>_kernel(y, t, p) is the same for a single state with the parameters as an array, as the kernels',
+           '# of models.py (compiled.py compiles them with Numba).',
+           '',
+           'import numpy as np',
+           '']
+    for m in MODELS.values():
+        out += ['', '# %s.py' % m.name, _generate(m), '']
+    # one model per line, to keep the lines short
+    out += ['', 'JACOBIANS = {'] + ["    '%s': %s," % (n, n) for n in MODELS] + ['}']
+    out += ['KERNELS = {'] + ["    '%s': %s_kernel," % (n, n) for n in MODELS] + ['}', '']
+    with open(path, 'w') as f:
+        f.write('\n'.join(out))
+
+
+# odeint with and without the Jacobian on the scenarios of the scripts and on stiffer ones.
+def bench():
+    import time
+    import numpy as np
+    from scipy.integrate import odeint
+    from jacobians_generated import JACOBIANS
+
+    scenarios = [(name, {}) for name in MODELS] + [
+        ('siqrar', dict(Flu=10)), ('siqrar', dict(Flu=1, Test=20000)), ('siqctr', dict(C=100)),
+        ('masstest', dict(r=0.5)), ('massteststratified', dict(r=0.5)),
+    ]
+    print('%-22s %-18s %18s %18s' % ('model', 'scenario', 'no Dfun: nfe/nje/ms', 'Dfun: nfe/nje/ms'))
+    for name, change in scenarios:
+        m = MODELS[name]
+        p = dict(m.params, **change)
+        init = m.initial(p)
+        y0 = np.array([init[c] for c in m.compartments], dtype=float)
+        row = []
+        for Dfun in (None, JACOBIANS[name]):
+            start = time.perf_counter()
+            ret, info = odeint(m.deriv, y0, m.t, args=m.args(p), Dfun=Dfun, full_output=True, rtol=1e-8, atol=1e-6)
+            ms = (time.perf_counter() - start) * 1e3
+            row.append('%6d/%4d/%6.1f' % (info['nfe'][-1], info['nje'][-1], ms))
+        label = ','.join('%s=%g' % kv for kv in change.items()) or 'script'
+        print('%-22s %-18s %18s %18s' % (name, label, row[0], row[1]))
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['bench']:
+        bench()
+    else:
+        generate()
@@ -0,0 +1,604 @@
+# Generated by jacobian.py from the right-hand sides in models.py, do not edit.
+# J[..., i, j] is the derivative of the i-th component of deriv by the j-th compartment.
+# <model>_kernel(y, t, p) is the same for a single state with the parameters as an array, as the kernels
+# of models.py (compiled.py compiles them with Numba).
+
+import numpy as np
+
+
+# siqr.py
+def siqr(y, t, N, beta, gamma, delta):
+    S, I, Q, R = np.moveaxis(y, -1, 0)
+    x0 = I + R + S
+    x1 = beta/x0
+    x2 = I*S*beta/x0**2
+    x3 = -I*x1 + x2
+    x4 = -S*x1 + x2
+    J = np.zeros(np.shape(y) + (4,))
+    J[..., 0, 0] = x3
+    J[..., 0, 1] = x4
+    J[..., 0, 3] = x2
+    J[..., 1, 0] = -x3
+    J[..., 1, 1] = -delta - gamma - x4
+    J[..., 1, 3] = -x2
+    J[..., 2, 1] = delta
+    J[..., 2, 2] = -gamma
+    J[..., 3, 1] = gamma
+    J[..., 3, 2] = gamma
+    return J
+
+
+def siqr_kernel(y, t, p):
+    S, I, Q, R, = y
+    N, beta, gamma, delta, = p
+    x0 = I + R + S
+    x1 = beta/x0
+    x2 = I*S*beta/x0**2
+    x3 = -I*x1 + x2
+    x4 = -S*x1 + x2
+    J = np.zeros((4, 4))
+    J[0, 0] = x3
+    J[0, 1] = x4
+    J[0, 3] = x2
+    J[1, 0] = -x3
+    J[1, 1] = -delta - gamma - x4
+    J[1, 3] = -x2
+    J[2, 1] = delta
+    J[2, 2] = -gamma
+    J[3, 1] = gamma
+    J[3, 2] = gamma
+    return J
+
+
+# siqctr.py
+def siqctr(y, t, N, Test, C, beta, gamma):
+    S, I, Q, R = np.moveaxis(y, -1, 0)
+    x0 = I + R + S
+    x1 = beta/x0
+    x2 = I*S*beta/x0**2
+    x3 = -I*x1 + x2
+    x4 = -S*x1 + x2
+    x5 = C + I
+    x6 = Test/x5
+    x7 = I*Test/x5**2
+    J = np.zeros(np.shape(y) + (4,))
+    J[..., 0, 0] = x3
+    J[..., 0, 1] = x4
+    J[..., 0, 3] = x2
+    J[..., 1, 0] = -x3
+    J[..., 1, 1] = -gamma - x4 - x6 + x7
+    J[..., 1, 3] = -x2
+    J[..., 2, 1] = x6 - x7
+    J[..., 2, 2] = -gamma
+    J[..., 3, 1] = gamma
+    J[..., 3, 2] = gamma
+    return J
+
+
+def siqctr_kernel(y, t, p):
+    S, I, Q, R, = y
+    N, Test, C, beta, gamma, = p
+    x0 = I + R + S
+    x1 = beta/x0
+    x2 = I*S*beta/x0**2
+    x3 = -I*x1 + x2
+    x4 = -S*x1 + x2
+    x5 = C + I
+    x6 = Test/x5
+    x7 = I*Test/x5**2
+    J = np.zeros((4, 4))
+    J[0, 0] = x3
+    J[0, 1] = x4
+    J[0, 3] = x2
+    J[1, 0] = -x3
+    J[1, 1] = -gamma - x4 - x6 + x7
+    J[1, 3] = -x2
+    J[2, 1] = x6 - x7
+    J[2, 2] = -gamma
+    J[3, 1] = gamma
+    J[3, 2] = gamma
+    return J
+
+
+# siqrar.py
+def siqrar(y, t, N, Flu, beta1, beta2, gamma1, gamma2, Test):
+    S, I, Q, A, R, Rq = np.moveaxis(y, -1, 0)
+    x0 = N**(-1.0)
+    x1 = x0*(A + I)
+    x2 = beta1*x1
+    x3 = beta2*x1
+    x4 = S*x0
+    x5 = beta1*x4
+    x6 = beta2*x4
+    x7 = -x5 - x6
+    x8 = -gamma1
+    x9 = 2*Flu
+    x10 = 2*I
+    x11 = x10 + x9
+    x12 = Test/x11
+    x13 = Test*x10
+    x14 = x13/x11**2
+    x15 = 2*A + x9
+    x16 = Test/x15
+    x17 = x13/x15**2
+    J = np.zeros(np.shape(y) + (6,))
+    J[..., 0, 0] = -x2 - x3
+    J[..., 0, 1] = x7
+    J[..., 0, 3] = x7
+    J[..., 1, 0] = x2
+    J[..., 1, 1] = -x12 + x14 + x5 + x8
+    J[..., 1, 3] = x5
+    J[..., 2, 1] = x12 - x14 + x16
+    J[..., 2, 2] = x8
+    J[..., 2, 3] = -x17
+    J[..., 3, 0] = x3
+    J[..., 3, 1] = -x16 + x6
+    J[..., 3, 3] = -gamma2 + x17 + x6
+    J[..., 4, 1] = gamma1
+    J[..., 4, 3] = gamma2
+    J[..., 5, 2] = gamma1
+    return J
+
+
+def siqrar_kernel(y, t, p):
+    S, I, Q, A, R, Rq, = y
+    N, Flu, beta1, beta2, gamma1, gamma2, Test, = p
+    x0 = 1/N
+    x1 = x0*(A + I)
+    x2 = beta1*x1
+    x3 = beta2*x1
+    x4 = S*x0
+    x5 = beta1*x4
+    x6 = beta2*x4
+    x7 = -x5 - x6
+    x8 = -gamma1
+    x9 = 2*Flu
+    x10 = 2*I
+    x11 = x10 + x9
+    x12 = Test/x11
+    x13 = Test*x10
+    x14 = x13/x11**2
+    x15 = 2*A + x9
+    x16 = Test/x15
+    x17 = x13/x15**2
+    J = np.zeros((6, 6))
+    J[0, 0] = -x2 - x3
+    J[0, 1] = x7
+    J[0, 3] = x7
+    J[1, 0] = x2
+    J[1, 1] = -x12 + x14 + x5 + x8
+    J[1, 3] = x5
+    J[2, 1] = x12 - x14 + x16
+    J[2, 2] = x8
+    J[2, 3] = -x17
+    J[3, 0] = x3
+    J[3, 1] = -x16 + x6
+    J[3, 3] = -gamma2 + x17 + x6
+    J[4, 1] = gamma1
+    J[4, 3] = gamma2
+    J[5, 2] = gamma1
+    return J
+
+
+# seir_ld.py
+def seir_ld(y, t, N, gamma, sigma, beta0, beta1, t_ld):
+    S, E, I, R = np.moveaxis(y, -1, 0)
+    x0 = np.select([np.less(t, t_ld),True], [beta0,beta1], default=np.nan)/N
+    x1 = I*x0
+    x2 = S*x0
+    J = np.zeros(np.shape(y) + (4,))
+    J[..., 0, 0] = -x1
+    J[..., 0, 2] = -x2
+    J[..., 1, 0] = x1
+    J[..., 1, 1] = -sigma
+    J[..., 1, 2] = x2
+    J[..., 2, 1] = sigma
+    J[..., 2, 2] = -gamma
+    J[..., 3, 2] = gamma
+    return J
+
+
+def seir_ld_kernel(y, t, p):
+    S, E, I, R, = y
+    N, gamma, sigma, beta0, beta1, t_ld, = p
+    x0 = ((beta0) if (t < t_ld) else (beta1))/N
+    x1 = I*x0
+    x2 = S*x0
+    J = np.zeros((4, 4))
+    J[0, 0] = -x1
+    J[0, 2] = -x2
+    J[1, 0] = x1
+    J[1, 1] = -sigma
+    J[1, 2] = x2
+    J[2, 1] = sigma
+    J[2, 2] = -gamma
+    J[3, 2] = gamma
+    return J
+
+
+# sirs.py
+def sirs(y, t, N, beta, gamma, xi):
+    S, I, R = np.moveaxis(y, -1, 0)
+    x0 = beta/N
+    x1 = I*x0
+    x2 = -S*x0
+    J = np.zeros(np.shape(y) + (3,))
+    J[..., 0, 0] = -x1
+    J[..., 0, 1] = x2
+    J[..., 0, 2] = xi
+    J[..., 1, 0] = x1
+    J[..., 1, 1] = -gamma - x2
+    J[..., 2, 1] = gamma
+    J[..., 2, 2] = -xi
+    return J
+
+
+def sirs_kernel(y, t, p):
+    S, I, R, = y
+    N, beta, gamma, xi, = p
+    x0 = beta/N
+    x1 = I*x0
+    x2 = -S*x0
+    J = np.zeros((3, 3))
+    J[0, 0] = -x1
+    J[0, 1] = x2
+    J[0, 2] = xi
+    J[1, 0] = x1
+    J[1, 1] = -gamma - x2
+    J[2, 1] = gamma
+    J[2, 2] = -xi
+    return J
+
+
+# trasym.py
+def trasym(y, t, N, beta1, beta2, gamma1, gamma2, delta, cap):
+    S, I, Q, A, R = np.moveaxis(y, -1, 0)
+    x0 = N**(-1.0)
+    x1 = x0*(A + I)
+    x2 = beta1*x1
+    x3 = beta2*x1
+    x4 = S*x0
+    x5 = beta1*x4
+    x6 = beta2*x4
+    x7 = -x5 - x6
+    x8 = delta*(np.select([np.greater(I*delta - cap, 0),np.equal(I*delta - cap, 0),True], [0,1/2,1], default=np.nan))
+    J = np.zeros(np.shape(y) + (5,))
+    J[..., 0, 0] = -x2 - x3
+    J[..., 0, 1] = x7
+    J[..., 0, 3] = x7
+    J[..., 1, 0] = x2
+    J[..., 1, 1] = -gamma1 + x5 - x8
+    J[..., 1, 3] = x5
+    J[..., 2, 1] = x8
+    J[..., 2, 2] = -gamma1
+    J[..., 3, 0] = x3
+    J[..., 3, 1] = x6
+    J[..., 3, 3] = -gamma2 + x6
+    J[..., 4, 1] = gamma1
+    J[..., 4, 2] = gamma1
+    J[..., 4, 3] = gamma2
+    return J
+
+
+def trasym_kernel(y, t, p):
+    S, I, Q, A, R, = y
+    N, beta1, beta2, gamma1, gamma2, delta, cap, = p
+    x0 = 1/N
+    x1 = x0*(A + I)
+    x2 = beta1*x1
+    x3 = beta2*x1
+    x4 = S*x0
+    x5 = beta1*x4
+    x6 = beta2*x4
+    x7 = -x5 - x6
+    x8 = delta*(((0) if (I*delta - cap > 0) else (1/2) if (I*delta - cap == 0) else (1)))
+    J = np.zeros((5, 5))
+    J[0, 0] = -x2 - x3
+    J[0, 1] = x7
+    J[0, 3] = x7
+    J[1, 0] = x2
+    J[1, 1] = -gamma1 + x5 - x8
+    J[1, 3] = x5
+    J[2, 1] = x8
+    J[2, 2] = -gamma1
+    J[3, 0] = x3
+    J[3, 1] = x6
+    J[3, 3] = -gamma2 + x6
+    J[4, 1] = gamma1
+    J[4, 2] = gamma1
+    J[4, 3] = gamma2
+    return J
+
+
+# tracing.py
+def tracing(y, t, N, beta1, beta2, gamma1, gamma2, delta1, delta2):
+    S, I, Q, A, R = np.moveaxis(y, -1, 0)
+    x0 = N**(-1.0)
+    x1 = x0*(A + I)
+    x2 = beta1*x1
+    x3 = beta2*x1
+    x4 = S*x0
+    x5 = beta1*x4
+    x6 = beta2*x4
+    x7 = -x5 - x6
+    J = np.zeros(np.shape(y) + (5,))
+    J[..., 0, 0] = -x2 - x3
+    J[..., 0, 1] = x7
+    J[..., 0, 3] = x7
+    J[..., 1, 0] = x2
+    J[..., 1, 1] = -delta1 - gamma1 + x5
+    J[..., 1, 3] = x5
+    J[..., 2, 1] = delta1
+    J[..., 2, 2] = -gamma1
+    J[..., 2, 3] = delta2
+    J[..., 3, 0] = x3
+    J[..., 3, 1] = x6
+    J[..., 3, 3] = -delta2 - gamma2 + x6
+    J[..., 4, 1] = gamma1
+    J[..., 4, 2] = gamma1
+    J[..., 4, 3] = gamma2
+    return J
+
+
+def tracing_kernel(y, t, p):
+    S, I, Q, A, R, = y
+    N, beta1, beta2, gamma1, gamma2, delta1, delta2, = p
+    x0 = 1/N
+    x1 = x0*(A + I)
+    x2 = beta1*x1
+    x3 = beta2*x1
+    x4 = S*x0
+    x5 = beta1*x4
+    x6 = beta2*x4
+    x7 = -x5 - x6
+    J = np.zeros((5, 5))
+    J[0, 0] = -x2 - x3
+    J[0, 1] = x7
+    J[0, 3] = x7
+    J[1, 0] = x2
+    J[1, 1] = -delta1 - gamma1 + x5
+    J[1, 3] = x5
+    J[2, 1] = delta1
+    J[2, 2] = -gamma1
+    J[2, 3] = delta2
+    J[3, 0] = x3
+    J[3, 1] = x6
+    J[3, 3] = -delta2 - gamma2 + x6
+    J[4, 1] = gamma1
+    J[4, 2] = gamma1
+    J[4, 3] = gamma2
+    return J
+
+
+# masstest.py
+def masstest(y, t, N, beta, gamma, r, s):
+    S, I, R = np.moveaxis(y, -1, 0)
+    x0 = beta/N
+    x1 = I*x0
+    x2 = S*x0
+    x3 = I + S
+    x4 = N*r*s
+    x5 = I*x4/x3**2
+    x6 = x4/x3
+    x7 = -x5
+    J = np.zeros(np.shape(y) + (3,))
+    J[..., 0, 0] = -x1
+    J[..., 0, 1] = -x2
+    J[..., 1, 0] = x1 + x5
+    J[..., 1, 1] = -gamma + x2 + x5 - x6
+    J[..., 2, 0] = x7
+    J[..., 2, 1] = gamma + x6 + x7
+    return J
+
+
+def masstest_kernel(y, t, p):
+    S, I, R, = y
+    N, beta, gamma, r, s, = p
+    x0 = beta/N
+    x1 = I*x0
+    x2 = S*x0
+    x3 = I + S
+    x4 = N*r*s
+    x5 = I*x4/x3**2
+    x6 = x4/x3
+    x7 = -x5
+    J = np.zeros((3, 3))
+    J[0, 0] = -x1
+    J[0, 1] = -x2
+    J[1, 0] = x1 + x5
+    J[1, 1] = -gamma + x2 + x5 - x6
+    J[2, 0] = x7
+    J[2, 1] = gamma + x6 + x7
+    return J
+
+
+# massteststratified.py
+def massteststratified(y, t, N, beta, gamma, mu, r, s, a):
+    S1, S2, I1, I2, R1, R2 = np.moveaxis(y, -1, 0)
+    x0 = a**(-1.0)
+    x1 = mu*x0
+    x2 = N**(-1.0)
+    x3 = I2*x2
+    x4 = I1*x2
+    x5 = 1 - a
+    x6 = x0*(-x1*x5 + 1)
+    x7 = beta*(x1*x3 + x4*x6)
+    x8 = beta*x2
+    x9 = S1*x8
+    x10 = x6*x9
+    x11 = x1*x9
+    x12 = (1 - mu)/x5
+    x13 = beta*(x1*x4 + x12*x3)
+    x14 = S2*x8
+    x15 = x1*x14
+    x16 = -x12*x14
+    x17 = I1 + S1
+    x18 = N*r*s
+    x19 = I1*x18/x17**2
+    x20 = x18/x17
+    x21 = -x19
+    J = np.zeros(np.shape(y) + (6,))
+    J[..., 0, 0] = -x7
+    J[..., 0, 2] = -x10
+    J[..., 0, 3] = -x11
+    J[..., 1, 1] = -x13
+    J[..., 1, 2] = -x15
+    J[..., 1, 3] = x16
+    J[..., 2, 0] = x19 + x7
+    J[..., 2, 2] = -gamma + x10 + x19 - x20
+    J[..., 2, 3] = x11
+    J[..., 3, 1] = x13
+    J[..., 3, 2] = x15
+    J[..., 3, 3] = -gamma - x16
+    J[..., 4, 0] = x21
+    J[..., 4, 2] = gamma + x20 + x21
+    J[..., 5, 3] = gamma
+    return J
+
+
+def massteststratified_kernel(y, t, p):
+    S1, S2, I1, I2, R1, R2, = y
+    N, beta, gamma, mu, r, s, a, = p
+    x0 = 1/a
+    x1 = mu*x0
+    x2 = 1/N
+    x3 = I2*x2
+    x4 = I1*x2
+    x5 = 1 - a
+    x6 = x0*(-x1*x5 + 1)
+    x7 = beta*(x1*x3 + x4*x6)
+    x8 = beta*x2
+    x9 = S1*x8
+    x10 = x6*x9
+    x11 = x1*x9
+    x12 = (1 - mu)/x5
+    x13 = beta*(x1*x4 + x12*x3)
+    x14 = S2*x8
+    x15 = x1*x14
+    x16 = -x12*x14
+    x17 = I1 + S1
+    x18 = N*r*s
+    x19 = I1*x18/x17**2
+    x20 = x18/x17
+    x21 = -x19
+    J = np.zeros((6, 6))
+    J[0, 0] = -x7
+    J[0, 2] = -x10
+    J[0, 3] = -x11
+    J[1, 1] = -x13
+    J[1, 2] = -x15
+    J[1, 3] = x16
+    J[2, 0] = x19 + x7
+    J[2, 2] = -gamma + x10 + x19 - x20
+    J[2, 3] = x11
+    J[3, 1] = x13
+    J[3, 2] = x15
+    J[3, 3] = -gamma - x16
+    J[4, 0] = x21
+    J[4, 2] = gamma + x20 + x21
+    J[5, 3] = gamma
+    return J
+
+
+# vaccinationstratified.py
+def vaccinationstratified(y, t, N, beta, gamma, mu, r, a):
+    S1, S2, I1, I2, R1, R2 = np.moveaxis(y, -1, 0)
+    x0 = a**(-1.0)
+    x1 = mu*x0
+    x2 = N**(-1.0)
+    x3 = I2*x2
+    x4 = I1*x2
+    x5 = 1 - a
+    x6 = x0*(-x1*x5 + 1)
+    x7 = beta*(1 - r)
+    x8 = x7*(x1*x3 + x4*x6)
+    x9 = S1*x7
+    x10 = -x2*x6*x9
+    x11 = x1*x2
+    x12 = x11*x9
+    x13 = (1 - mu)/x5
+    x14 = beta*(x1*x4 + x13*x3)
+    x15 = S2*beta
+    x16 = x11*x15
+    x17 = -x13*x15*x2
+    J = np.zeros(np.shape(y) + (6,))
+    J[..., 0, 0] = -x8
+    J[..., 0, 2] = x10
+    J[..., 0, 3] = -x12
+    J[..., 1, 1] = -x14
+    J[..., 1, 2] = -x16
+    J[..., 1, 3] = x17
+    J[..., 2, 0] = x8
+    J[..., 2, 2] = -gamma - x10
+    J[..., 2, 3] = x12
+    J[..., 3, 1] = x14
+    J[..., 3, 2] = x16
+    J[..., 3, 3] = -gamma - x17
+    J[..., 4, 2] = gamma
+    J[..., 5, 3] = gamma
+    return J
+
+
+def vaccinationstratified_kernel(y, t, p):
+    S1, S2, I1, I2, R1, R2, = y
+    N, beta, gamma, mu, r, a, = p
+    x0 = 1/a
+    x1 = mu*x0
+    x2 = 1/N
+    x3 = I2*x2
+    x4 = I1*x2
+    x5 = 1 - a
+    x6 = x0*(-x1*x5 + 1)
+    x7 = beta*(1 - r)
+    x8 = x7*(x1*x3 + x4*x6)
+    x9 = S1*x7
+    x10 = -x2*x6*x9
+    x11 = x1*x2
+    x12 = x11*x9
+    x13 = (1 - mu)/x5
+    x14 = beta*(x1*x4 + x13*x3)
+    x15 = S2*beta
+    x16 = x11*x15
+    x17 = -x13*x15*x2
+    J = np.zeros((6, 6))
+    J[0, 0] = -x8
+    J[0, 2] = x10
+    J[0, 3] = -x12
+    J[1, 1] = -x14
+    J[1, 2] = -x16
+    J[1, 3] = x17
+    J[2, 0] = x8
+    J[2, 2] = -gamma - x10
+    J[2, 3] = x12
+    J[3, 1] = x14
+    J[3, 2] = x16
+    J[3, 3] = -gamma - x17
+    J[4, 2] = gamma
+    J[5, 3] = gamma
+    return J
+
+
+JACOBIANS = {
+    'siqr': siqr,
+    'siqctr': siqctr,
+    'siqrar': siqrar,
+    'seir_ld': seir_ld,
+    'sirs': sirs,
+    'trasym': trasym,
+    'tracing': tracing,
+    'masstest': masstest,
+    'massteststratified': massteststratified,
+    'vaccinationstratified': vaccinationstratified,
+}
+KERNELS = {
+    'siqr': siqr_kernel,
+    'siqctr': siqctr_kernel,
+    'siqrar': siqrar_kernel,
+    'seir_ld': seir_ld_kernel,
+    'sirs': sirs_kernel,
+    'trasym': trasym_kernel,
+    'tracing': tracing_kernel,
+    'masstest': masstest_kernel,
+    'massteststratified': massteststratified_kernel,
+    'vaccinationstratified': vaccinationstratified_kernel,
+}
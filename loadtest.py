@@ -0,0 +1,95 @@
+# A load test of server.py: clients which move a slider, each with its own keep-alive connection, sending
+# requests for 365-day solves of siqrar.py (Test) and vaccinationstratified.py (r) as fast as the answers
+# come. The values of the sliders are drawn from a grid, so that requests repeat (as when a slider is moved
+# back and forth) and hit the cache or coalesce with one another; --unique draws new values every time, so
+# every request is solved.
+#
+#   python loadtest.py [--url http://127.0.0.1:8765] [--requests 2000] [--clients 8] [--unique] [--binary]
+#
+# Without --url it starts a server in this process, with an empty cache. It prints the latency percentiles
+# and the counters of the server.
+
+import argparse
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+
+
+def _client(url, n, seed, unique, binary, latencies, errors):
+    rng = np.random.default_rng(None if unique else seed)
+    address = urlsplit(url)
+    connection = http.client.HTTPConnection(address.hostname, address.port)
+    for i in range(n):
+        if i % 2:
+            query = dict(model='siqrar', Test=rng.uniform(0, 5000) if unique else 100 * rng.integers(0, 51))
+        else:
+            query = dict(model='vaccinationstratified', r=rng.uniform(0, 1) if unique else rng.integers(0, 21) / 20)
+        query.update(T=365, format='binary' if binary else 'json')
+        start = time.perf_counter()
+        connection.request('GET', '/solve?' + urlencode(query))
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        if response.status != 200:
+            errors.append(response.status)
+    connection.close()
+
+
+# Send requests from clients threads. Returns the latencies in seconds, the wall time and the errors.
+def load(url, requests=2000, clients=8, unique=False, binary=False):
+    latencies, errors = [], []
+    threads = [threading.Thread(target=_client,
+                                args=(url, requests // clients, seed, unique, binary, latencies, errors))
+               for seed in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return np.array(latencies), time.perf_counter() - start, errors
+
+
+def _get(url, path):
+    connection = http.client.HTTPConnection(urlsplit(url).hostname, urlsplit(url).port)
+    connection.request('GET', path)
+    ret = json.loads(connection.getresponse().read())
+    connection.close()
+    return ret
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test of server.py.')
+    parser.add_argument('--url', default=None, help='a running server (default: start one here)')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--unique', action='store_true', help='no repeated requests')
+    parser.add_argument('--binary', action='store_true', help='binary arrays instead of JSON')
+    options = parser.parse_args()
+    server = None
+    url = options.url
+    if url is None:
+        import tempfile
+
+        from cache import Cache
+        from server import serve
+
+        directory = tempfile.TemporaryDirectory()
+        start = time.perf_counter()
+        server = serve(0, warm=('siqrar', 'vaccinationstratified'), cache=Cache(directory.name, memory=4096),
+                       background=True)
+        url = 'http://127.0.0.1:%d' % server.server_address[1]
+        print('server with warm workers started in %.1f s' % (time.perf_counter() - start))
+    latencies, seconds, errors = load(url, options.requests, options.clients, options.unique, options.binary)
+    p50, p90, p99 = 1e3 * np.percentile(latencies, [50, 90, 99])
+    print('%d requests from %d clients in %.1f s (%.0f per second): p50 %.1f ms, p90 %.1f ms, p99 %.1f ms, '
+          'max %.1f ms, %d errors' % (len(latencies), options.clients, seconds, len(latencies) / seconds, p50, p90,
+                                      p99, 1e3 * latencies.max(), len(errors)))
+    print('server: %s' % _get(url, '/stats'))
+    if server:
+        server.shutdown()
+        server.service.close()
+        directory.cleanup()
@@ -0,0 +1,153 @@
+# Many regional copies of a model of models.py (e.g. siqr.py for every prefecture) coupled by travel.
+# mobility[i, j] is the rate (per day) at which the people of region i move to region j, so that every
+# compartment X which travels (by default all but the quarantined Q and Rq) gets
+#   dX_j/dt += sum_i mobility[i, j] * X_i - X_j * sum_k mobility[j, k]
+# on top of the equations of the model in region j, with the parameters of every region.
+# If the flows N_i * mobility[i, j] are symmetric (commuting back and forth), the populations stay constant.
+#
+# The state is stored as structure of arrays, one contiguous array of the regions per compartment
+# (shape (n_compartments, n_regions), flattened for the solver), and the whole system is integrated as
+# one ODE. The Jacobian is sparse: the Jacobian of the model (jacobians_generated.py) in every region plus the
+# mobility matrix for every travelling compartment, so the stiff solvers (BDF, Radau) only factorize a
+# sparse matrix. Instead of the whole history (n_compartments, n_regions, len(t)), solve() returns a
+# reduction of the state at every time point, by default the national totals of the compartments.
+#
+#   meta = Metapopulation('siqr', mobility, p=dict(N=populations), y0=dict(I=seeds))
+#   totals, final = meta.solve(np.linspace(0, 365, 366))
+#
+# python metapopulation.py couples 2000 regions of siqrar.py.
+
+import numpy as np
+
+from models import MODELS
+
+
+# The entries of the Jacobian of a model which can be nonzero, as a boolean matrix (n_compartments x
+# n_compartments): a transition (source, target, rate) changes source and target by the compartments named in
+# its rate (directly or through the derived quantities).
+def _structure(m):
+    derived = {}
+    for k, v in m.derived:
+        names = set(compile(v, k, 'eval').co_names)
+        derived[k] = names.union(*(derived.get(name, set()) for name in names))
+    index = {c: i for i, c in enumerate(m.compartments)}
+    pattern = np.zeros((len(index), len(index)), dtype=bool)
+    for source, target, rate in m.transitions:
+        names = set(compile(rate, source, 'eval').co_names)
+        names = names.union(*(derived.get(name, set()) for name in names))
+        for c in names & set(index):
+            pattern[index[source], index[c]] = pattern[index[target], index[c]] = True
+    return pattern
+
+
+class Metapopulation:
+    # model: the name of a model in models.py, mobility: the travel rates (n_regions x n_regions, dense or
+    # scipy.sparse, the diagonal is ignored), p and y0: dicts of arrays of length n_regions (missing entries
+    # take the defaults of the script) as in Model.batch, mobile: the compartments which travel
+    def __init__(self, model, mobility, p=None, y0=None, mobile=None):
+        import scipy.sparse as sp
+
+        p, y0 = p or {}, y0 or {}
+        self.m = m = MODELS[model]
+        mobility = sp.csr_matrix(mobility, dtype=float)
+        mobility.setdiag(0)
+        mobility.eliminate_zeros()
+        self.n = mobility.shape[0]
+        args, y = m.batch(p, y0)
+        if len(y) == 1:
+            args, y = m.batch(dict(p, N=np.full(self.n, m.params['N'])), y0)
+        if len(y) != self.n:
+            raise ValueError('%d regions in p and y0, but %d in the mobility matrix' % (len(y), self.n))
+        self.args = args
+        self.y0 = np.ascontiguousarray(y.T)
+        mobile = [c for c in m.compartments if c not in ('Q', 'Rq')] if mobile is None else mobile
+        self.mobile = [m.compartments.index(c) for c in mobile]
+        # the travel of one compartment as a matrix L, dX/dt = L @ X
+        self.travel = (mobility.T - sp.diags(np.asarray(mobility.sum(axis=1)).ravel())).tocsr()
+        self._pattern = None
+
+    # The right-hand side for the flattened state of length n_compartments * n_regions.
+    def deriv(self, y, t):
+        y = y.reshape(-1, self.n)
+        out = np.empty_like(y)
+        # the model in all the regions at once, with the compartments on the last axis
+        self.m.deriv(y.T, t, *self.args, out=out.T)
+        for c in self.mobile:
+            out[c] += self.travel @ y[c]
+        return out.ravel()
+
+    # The Jacobian of deriv as a sparse matrix in CSC format.
+    def jacobian(self, y, t):
+        import scipy.sparse as sp
+
+        from jacobians_generated import JACOBIANS
+
+        n, k = self.n, len(self.m.compartments)
+        local = JACOBIANS[self.m.name](y.reshape(k, n).T, t, *self.args)
+        if self._pattern is None:
+            # the entries of the model which can be nonzero in any state, and the travel blocks
+            a, b = np.nonzero(_structure(self.m))
+            regions = np.arange(n)
+            travel = self.travel.tocoo()
+            rows = [(a[:, None] * n + regions).ravel()] + [c * n + travel.row for c in self.mobile]
+            cols = [(b[:, None] * n + regions).ravel()] + [c * n + travel.col for c in self.mobile]
+            self._pattern = a, b, np.concatenate(rows), np.concatenate(cols)
+        a, b, rows, cols = self._pattern
+        data = np.concatenate([local[:, a, b].T.ravel()] + [self.travel.tocoo().data] * len(self.mobile))
+        return sp.csc_matrix((data, (rows, cols)), shape=(n * k, n * k))
+
+    # Integrate over the time points t with a solver of scipy.integrate, RK45 or for stiff parameters (e.g.
+    # many tests on few infected) BDF or Radau, which use the sparse Jacobian. reduce(state, t) maps the state
+    # of shape (n_compartments, n_regions) at a time point to an array, by default the national totals of the
+    # compartments.
+    # Returns the reductions stacked over t and the final state of shape (n_compartments, n_regions).
+    def solve(self, t, method='RK45', reduce=None, rtol=1e-6, atol=1e-3):
+        import scipy.integrate
+
+        reduce = (lambda y, s: y.sum(axis=1)) if reduce is None else reduce
+        k = len(self.m.compartments)
+        options = dict(jac=lambda s, y: self.jacobian(y, s)) if method in ('BDF', 'Radau') else {}
+        solver = getattr(scipy.integrate, method)(lambda s, y: self.deriv(y, s), t[0], self.y0.ravel(), t[-1],
+                                                  rtol=rtol, atol=atol, **options)
+        ret = [reduce(self.y0, t[0])]
+        i = 1
+        while i < len(t):
+            message = solver.step()
+            if solver.status == 'failed':
+                raise RuntimeError('%s failed at t = %g: %s' % (method, solver.t, message))
+            dense = solver.dense_output()
+            while i < len(t) and t[i] <= solver.t:
+                y = solver.y if t[i] == solver.t else dense(t[i])
+                ret.append(reduce(y.reshape(k, self.n), t[i]))
+                i += 1
+        return np.array(ret), solver.y.reshape(k, self.n).copy()
+
+
+if __name__ == '__main__':
+    import time
+
+    import scipy.sparse as sp
+    from scipy.spatial import cKDTree
+
+    n = 2000
+    rng = np.random.default_rng(0)
+    # regions on a square, commuting to the 6 nearest ones with symmetric flows of 1% of the smaller population
+    xy = rng.random((n, 2))
+    N = np.round(10 ** rng.uniform(4, 6.5, n))
+    dist, near = cKDTree(xy).query(xy, 7)
+    rows, cols = np.repeat(np.arange(n), 6), near[:, 1:].ravel()
+    flows = sp.csr_matrix((0.01 * np.minimum(N[rows], N[cols]), (rows, cols)), shape=(n, n))
+    flows = (flows + flows.T) / 2
+    mobility = sp.diags(1 / N) @ flows
+    seeds = np.where(np.arange(n) == 0, 1000.0, 0)
+    p = dict(N=N, Flu=N / 1e5, Test=N * 2e-5)
+    meta = Metapopulation('siqrar', mobility, p, dict(S=N - seeds, A=seeds))
+    t = np.linspace(0, 365, 366)
+    for method in ('RK45', 'BDF'):
+        start = time.perf_counter()
+        totals, final = meta.solve(t, method=method)
+        S, I, Q, A, R, Rq = totals.T
+        print('%d regions of siqrar, %s: %.1f s, national peak of I+A %.0f on day %d, regions reached %d, '
+              'population kept within %.1e'
+              % (n, method, time.perf_counter() - start, (I + A).max(), np.argmax(I + A),
+                 (final[4] + final[5] > 1).sum(), np.abs(totals.sum(axis=1) / N.sum() - 1).max()))
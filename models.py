@@ -0,0 +1,269 @@
+# The compartment models of this repository, declared once as compartments plus transitions.
+# Every transition (source, target, rate) moves rate individuals per day from the compartment
+# source to target (None for outside the population), and the differential equations are
+# generated from the transitions: dX/dt = (rates of the transitions into X) - (rates out of X).
+# The equations are the same as in siqr.py, siqrar.py, ... (see README.md).
+#
+# From the declaration two right-hand sides are generated on first use:
+#   m.deriv(y, t, *args, out=None)  vectorized, y can be a single state (as in odeint) or a batch of
+#                                   shape (n_runs, n_compartments) with the parameters scalars or arrays
+#                                   of shape (n_runs,). It writes into out if given.
+#   m.kernel(y, t, p)               a single state with the parameters as a float array in the order
+#                                   of m.params, which compiled.py compiles with Numba.
+#   m.rates(y, t, p)                the rates of the transitions, as kernel (for stochastic.py).
+# The generated code is written to __pycache__/models/ under a hash of the declaration, so that
+# Numba can cache the compiled kernels on disk and any change of the equations gives a new file.
+#
+# Importing this module only imports NumPy; SciPy and matplotlib are imported by the solvers and plots.
+
+import hashlib
+import importlib.util
+import os
+import sys
+
+import numpy as np
+
+
+class Model:
+    # name: the name of the script, compartments: the names of the components of y,
+    # params: the default parameters (in the order of the arguments of deriv),
+    # transitions: (source, target, rate) with the rate an expression of the compartments, the parameters,
+    # the time t and the functions where and minimum of NumPy,
+    # derived: quantities computed from the parameters before the rates, e.g. N1 = a * N,
+    # initial: initial(p, y0) returns the initial values of the compartments from the parameters p
+    # and the initial values y0 which override the defaults, t: the default grid of time points (in days),
+    # observables: the quantities plotted by the script (e.g. New positive) as expressions like the rates
+    def __init__(self, name, compartments, params, transitions, initial, t, derived=(), observables=None):
+        self.name = name
+        self.compartments = tuple(compartments)
+        self.params = dict(params)
+        self.transitions = tuple(transitions)
+        self.derived = tuple(derived)
+        self.initial = initial
+        self.t = t
+        self.observables = dict(observables or {})
+        self._module = None
+
+    def args(self, p):
+        return tuple(p[k] for k in self.params)
+
+    # The arguments of deriv and the initial states for a batch of runs, from dicts p and y0 of arrays
+    # of length n_runs (missing entries take the defaults of the script).
+    # Returns (args, y) with every argument of shape (n_runs,) and y of shape (n_runs, n_compartments).
+    def batch(self, p=None, y0=None):
+        p, y0 = p or {}, y0 or {}
+        n = max([np.size(v) for v in list(p.values()) + list(y0.values())] + [1])
+        p = {k: np.broadcast_to(np.asarray(p.get(k, v), dtype=float), (n,)) for k, v in self.params.items()}
+        init = self.initial(p, y0)
+        y = np.stack([np.broadcast_to(np.asarray(init[c], dtype=float), (n,)) for c in self.compartments], axis=-1)
+        return self.args(p), y
+
+    # The observable name (or any expression of the compartments and the parameters) along the
+    # trajectories y with the compartments on the last axis, e.g. observe('New positive', ret, m.args(p)).
+    def observe(self, name, y, args, t=None):
+        env = dict(zip(self.compartments, np.moveaxis(y, -1, 0)), t=t, where=np.where, minimum=np.minimum)
+        env.update(zip(self.params, args))
+        for k, v in self.derived:
+            env[k] = eval(v, {}, env)
+        return eval(self.observables.get(name, name), {}, env)
+
+    # A hash of the generated code, which changes whenever the equations of the model change.
+    @property
+    def key(self):
+        return hashlib.sha1(self.source().encode()).hexdigest()[:16]
+
+    # The right-hand side as lines of code, in terms of the names of the compartments and the parameters.
+    def equations(self):
+        lines = ['%s = %s' % d for d in self.derived]
+        lines += ['f%d = %s' % (i, rate) for i, (source, target, rate) in enumerate(self.transitions)]
+        for c in self.compartments:
+            terms = ['+ f%d' % i for i, tr in enumerate(self.transitions) if tr[1] == c]
+            terms += ['- f%d' % i for i, tr in enumerate(self.transitions) if tr[0] == c]
+            rhs = ' '.join(terms) if terms else '0'
+            rhs = rhs[2:] if rhs.startswith('+ ') else '-' + rhs[2:] if rhs.startswith('- ') else rhs
+            lines.append('d%sdt = %s' % (c, rhs))
+        return lines
+
+    def source(self):
+        n = len(self.compartments)
+        body = ['    ' + line for line in self.equations()]
+        out = ['# Generated by models.py from the declaration of the model %s, do not edit.' % self.name,
+               '',
+               'import numpy as np',
+               'from numpy import where, minimum',
+               '',
+               '',
+               'def deriv(y, t, %s, out=None):' % ', '.join(self.params),
+               '    %s, = np.moveaxis(y, -1, 0)' % ', '.join(self.compartments)]
+        out += body
+        out += ['    if out is None:',
+                '        out = np.empty(np.shape(y))']
+        out += ['    out[..., %d] = d%sdt' % (i, c) for i, c in enumerate(self.compartments)]
+        out += ['    return out',
+                '',
+                '',
+                'def kernel(y, t, p):',
+                '    %s, = y' % ', '.join(self.compartments),
+                '    %s, = p' % ', '.join(self.params)]
+        out += body
+        out += ['    dydt = np.empty(%d)' % n]
+        out += ['    dydt[%d] = d%sdt' % (i, c) for i, c in enumerate(self.compartments)]
+        out += ['    return dydt',
+                '',
+                '',
+                'def rates(y, t, p):',
+                '    %s, = y' % ', '.join(self.compartments),
+                '    %s, = p' % ', '.join(self.params)]
+        out += ['    ' + line for line in self.equations()[:len(self.derived) + len(self.transitions)]]
+        out += ['    f = np.empty(%d)' % len(self.transitions)]
+        out += ['    f[%d] = f%d' % (i, i) for i in range(len(self.transitions))]
+        out += ['    return f', '']
+        return '\n'.join(out)
+
+    def module(self):
+        if self._module is None:
+            path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__', 'models',
+                                '%s_%s.py' % (self.name, self.key))
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = '%s.%d' % (path, os.getpid())
+                with open(tmp, 'w') as f:
+                    f.write(self.source())
+                os.replace(tmp, path)
+            spec = importlib.util.spec_from_file_location('models_%s_%s' % (self.name, self.key), path)
+            module = importlib.util.module_from_spec(spec)
+            # registered, so that the functions can be found by name (e.g. by the cache of Numba)
+            sys.modules[spec.name] = module
+            spec.loader.exec_module(module)
+            self._module = module
+        return self._module
+
+    @property
+    def deriv(self):
+        return self.module().deriv
+
+    @property
+    def kernel(self):
+        return self.module().kernel
+
+    @property
+    def rates(self):
+        return self.module().rates
+
+
+# Initial conditions as in the scripts: everyone else, S0, is susceptible to infection initially.
+def _susceptible_rest(**default):
+    def initial(p, y0=None):
+        y0 = y0 or {}
+        rest = {k: y0.get(k, v) for k, v in default.items()}
+        return dict(S=y0.get('S', p['N'] - sum(rest.values())), **rest)
+    return initial
+
+
+def _stratified(p, y0=None):
+    y0 = y0 or {}
+    a, N = p['a'], p['N']
+    I10, I20, R10, R20 = (y0.get(k, v) for k, v in (('I1', 100*a), ('I2', 100*a), ('R1', 0), ('R2', 0)))
+    rest = N - I10 - I20 - R10 - R20
+    return dict(S1=y0.get('S1', a * rest), S2=y0.get('S2', (1-a) * rest), I1=I10, I2=I20, R1=R10, R2=R20)
+
+
+# The force of infection on the two groups of massteststratified.py and vaccinationstratified.py
+_FOI1 = 'beta * (S1 * I1 * (1 - mu * N2/N1) / N1 + S1 * I2 * mu / N1)'
+_FOI2 = 'beta * (S2 * I1 *  mu * N2/N1 / N2 + S2 * I2 * (1-mu) / N2)'
+_GROUPS = (('N1', 'a * N'), ('N2', '(1-a) * N'))
+
+MODELS = {m.name: m for m in (
+    # siqr.py
+    Model('siqr', 'SIQR',
+          dict(N=100000000, beta=0.35, gamma=0.25, delta=0.03),
+          [('S', 'I', 'beta * S * I / (S+I+R)'),
+           ('I', 'R', 'gamma * I'),
+           ('I', 'Q', 'delta * I'),
+           ('Q', 'R', 'gamma * Q')],
+          _susceptible_rest(I=10000, Q=0, R=0), np.linspace(0, 1000, 1000)),
+    # siqctr.py, Test tests per day among the infected and C with a confounding disease
+    Model('siqctr', 'SIQR',
+          dict(N=100000000, Test=6000, C=100000, beta=0.35, gamma=0.25),
+          [('S', 'I', 'beta * S * I / (S+I+R)'),
+           ('I', 'R', 'gamma * I'),
+           ('I', 'Q', 'Test * I /(C + I)'),
+           ('Q', 'R', 'gamma * Q')],
+          _susceptible_rest(I=10000, Q=0, R=0), np.linspace(0, 200, 200),
+          observables={'New positive': 'Test * I /(C + I)'}),
+    # siqrar.py, half of the tests on I + Flu and half on A + Flu
+    Model('siqrar', ('S', 'I', 'Q', 'A', 'R', 'Rq'),
+          dict(N=100000000, Flu=1000, beta1=0.25, beta2=0.25, gamma1=0.2, gamma2=0.2, Test=2000),
+          [('S', 'I', 'beta1 * S * (I+A) / N'),
+           ('S', 'A', 'beta2 * S * (I+A) / N'),
+           ('I', 'Q', 'Test * I / (2 * (I + Flu))'),
+           ('A', 'Q', 'Test * I / (2 * (A + Flu))'),
+           ('I', 'R', 'gamma1 * I'),
+           ('A', 'R', 'gamma2 * A'),
+           ('Q', 'Rq', 'gamma1 * Q')],
+          _susceptible_rest(I=0, Q=0, A=1000, R=0, Rq=0), np.linspace(0, 40, 40),
+          observables={'Infected': 'I + A', 'Positive': 'Q + Rq',
+                       'New positive': 'Test * I / (2 * (I + Flu)) + Test * I / (2 * (A + Flu))',
+                       'Positivity rate': 'I / (I + Flu)'}),
+    # seir_ld.py, the contact rate is beta0 before the lockdown at t_ld and beta1 after
+    Model('seir_ld', 'SEIR',
+          dict(N=100000000, gamma=0.2, sigma=0.5, beta0=0.5, beta1=0.10, t_ld=50),
+          [('S', 'E', 'where(t < t_ld, beta0, beta1) * S * I / N'),
+           ('E', 'I', 'sigma * E'),
+           ('I', 'R', 'gamma * I')],
+          _susceptible_rest(E=10000, I=0, R=0), np.linspace(0, 100, 100),
+          observables={'New positive': 'sigma * E'}),
+    # sirs.py, waning rate xi
+    Model('sirs', 'SIR',
+          dict(N=100000000, beta=0.3, gamma=0.2, xi=0.01),
+          [('S', 'I', 'beta * S * I / N'),
+           ('I', 'R', 'gamma * I'),
+           ('R', 'S', 'xi * R')],
+          _susceptible_rest(I=100, R=0), np.linspace(0, 500, 500)),
+    # trasym.py, the maximum tracing capacity is cap
+    Model('trasym', 'SIQAR',
+          dict(N=100000000, beta1=0.25, beta2=0.25, gamma1=0.2, gamma2=0.2, delta=1, cap=1000),
+          [('S', 'I', 'beta1 * S * (I+A) / N'),
+           ('S', 'A', 'beta2 * S * (I+A) / N'),
+           ('I', 'Q', 'minimum(delta * I, cap)'),
+           ('I', 'R', 'gamma1 * I'),
+           ('Q', 'R', 'gamma1 * Q'),
+           ('A', 'R', 'gamma2 * A')],
+          _susceptible_rest(I=100, Q=0, A=0, R=0), np.linspace(0, 100, 100),
+          observables={'Detection rate': 'Q/(I+Q+A)'}),
+    # tracing.py
+    Model('tracing', 'SIQAR',
+          dict(N=100000000, beta1=0.25, beta2=0.25, gamma1=0.2, gamma2=0.2, delta1=0.3, delta2=0.3),
+          [('S', 'I', 'beta1 * S * (I+A) / N'),
+           ('S', 'A', 'beta2 * S * (I+A) / N'),
+           ('I', 'Q', 'delta1 * I'),
+           ('A', 'Q', 'delta2 * A'),
+           ('I', 'R', 'gamma1 * I'),
+           ('Q', 'R', 'gamma1 * Q'),
+           ('A', 'R', 'gamma2 * A')],
+          _susceptible_rest(I=0, Q=0, A=100, R=0), np.linspace(0, 100, 100)),
+    # masstest.py, testing rate r and sensitivity s
+    Model('masstest', 'SIR',
+          dict(N=100000000, beta=0.3, gamma=0.15, r=0.18, s=0.7),
+          [('S', 'I', 'beta * S * I / N'),
+           ('I', 'R', 'gamma * I'),
+           ('I', 'R', 's * r * N * I / (S+I)')],
+          _susceptible_rest(I=100, R=0), np.linspace(0, 500, 500)),
+    # massteststratified.py, the group sizes are N1 = a * N (tested) and N2 = (1-a) * N (not tested)
+    Model('massteststratified', ('S1', 'S2', 'I1', 'I2', 'R1', 'R2'),
+          dict(N=100000000, beta=0.27, gamma=0.15, mu=0.4, r=0.23, s=1, a=0.8),
+          [('S1', 'I1', _FOI1),
+           ('S2', 'I2', _FOI2),
+           ('I1', 'R1', 'gamma * I1'),
+           ('I1', 'R1', 's * r * N * I1 / (S1+I1)'),
+           ('I2', 'R2', 'gamma * I2')],
+          _stratified, np.linspace(0, 1000, 1000), derived=_GROUPS),
+    # vaccinationstratified.py, vaccine efficacy r and the group sizes N1 = a * N (vaccinated) and N2 = (1-a) * N
+    Model('vaccinationstratified', ('S1', 'S2', 'I1', 'I2', 'R1', 'R2'),
+          dict(N=100000000, beta=0.3, gamma=0.15, mu=0.3, r=0.9, a=0.8),
+          [('S1', 'I1', '(1-r) * ' + _FOI1),
+           ('S2', 'I2', _FOI2),
+           ('I1', 'R1', 'gamma * I1'),
+           ('I2', 'R2', 'gamma * I2')],
+          _stratified, np.linspace(0, 500, 500), derived=_GROUPS),
+)}
@@ -0,0 +1,167 @@
+# Headless rendering of the figures of the scripts for many scenarios at once.
+# The figures look as in the scripts (the same curves, colours, labels and scales), but are drawn with
+# the Agg backend of matplotlib without pyplot, so nothing is shown and no display is needed. Every
+# worker process builds the figure of a model once and then only replaces the data of the lines and the
+# title for each scenario before saving it, which is much cheaper than building a new figure.
+#
+#   ret = sweep('siqrar', p, y0)                        # shape (len(t), n_scenarios, n_compartments)
+#   paths = render('siqrar', ret, args, directory='figures', format='svg')
+#
+# The scenarios are split among a pool of workers; the files are written as directory/<name>.<format>
+# with the format png, svg or pdf.
+#
+# python render.py renders 500 scenarios of siqrar.py.
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from diffeq import DIFFERENCE
+from models import MODELS
+
+# The curves of the scripts as (expression or observable, colour, label, divisor).
+CURVES = {
+    'siqr': [('S', 'b', 'Susceptible', 1e8), ('I', 'r', 'Infected', 1e8),
+             ('Q', 'y', 'Quarantined/isolated', 1e8), ('R', 'g', 'Recovered with immunity', 1e8)],
+    'siqrar': [('I + A', 'r', 'Infected (x 10000)', 1e4), ('Q + Rq', 'm', 'Positive', 1e8),
+               ('New positive', 'y', 'New positive (x 10000)', 1e4), ('Positivity rate', 'k', 'Positivity rate', 1)],
+    'seir_ld': [('S', 'b', 'Susceptible', 1e8), ('E', 'r', 'Exposed', 1e8), ('I', 'y', 'Infected', 1e8),
+                ('R', 'g', 'Recovered with immunity', 1e8), ('New positive', 'm', 'New positive (x 10)', 1e7)],
+    'sirs': [('S', 'b', 'S(t): Susceptible', 1e8), ('I', 'r', 'I(t): Infected', 1e8),
+             ('R', 'g', 'R(t): Recovered with immunity', 1e8)],
+    'trasym': [('S', 'b', 'Susceptible', 1e8), ('I', 'r', 'Infected', 1e8), ('Q', 'y', 'Quarantined', 1e8),
+               ('A', 'k', 'Asymptomatic', 1e8), ('R', 'g', 'Recovered with immunity', 1e8),
+               ('Detection rate', 'm', 'Detection rate', 1)],
+    'tracing': [('S', 'b', 'Susceptible', 1e8), ('I', 'r', 'Infected', 1e8), ('Q', 'y', 'Quarantined', 1e8),
+                ('A', 'k', 'Asymptomatic', 1e8), ('R', 'g', 'Recovered with immunity', 1e8)],
+    'massteststratified': [('S1', 'y', 'S(t): Susceptible, testing', 1e8), ('I1', 'm', 'I(t): Infected, testing', 1e8),
+                           ('S2', 'b', 'S(t): Susceptible, no testing', 1e8),
+                           ('I2', 'r', 'I(t): Infected, no testing', 1e8),
+                           ('R1', 'g', 'R(t): Recovered/isolated with immunity', 1e8),
+                           ('R2', 'k', 'R(t): Recovered with immunity', 1e8)],
+    'siqar_test': [('I + A', 'r', 'Undetected infected (x 10000)', 1e4),
+                   ('Q + Rq', 'm', 'Positive confirmed (x 10000)', 1e4),
+                   ('New positive', 'y', 'New positive (x 10000)', 1e4),
+                   ('Positivity rate', 'k', 'Positivity rate', 1)],
+    'sir_diff': [('S', 'b', 'Susceptible', 1e8), ('I', 'r', 'Infected', 1e8), ('R', 'g', 'Recovered', 1e8)],
+}
+CURVES['siqctr'] = CURVES['siqr']
+CURVES['masstest'] = CURVES['sirs']
+CURVES['vaccinationstratified'] = CURVES['massteststratified']
+
+# The titles of the scripts, formatted with the parameters and the initial values (as A0, I0, ...).
+TITLES = {
+    'siqrar': 'Flu = {Flu:g}, Test = {Test:g}/day, A_0 = {A0:g}',
+    'seir_ld': 'SEIR model with beta = {beta0:g} (t<{t_ld:g}), {beta1:g} (t>={t_ld:g})',
+    'siqar_test': 'SIAQR model as a difference equation with fixed number of tests. \n A: asymptomatic.\n '
+                  'Flu = {Flu:g}, Test = {Test:g}/day, A_0 = {A0:g}, delta = {delta:g}',
+}
+
+_FIGURES = {}
+
+
+def _model(model):
+    return MODELS[model] if model in MODELS else DIFFERENCE[model]
+
+
+def _curves(m):
+    colours = 'brykgmc'
+    return CURVES.get(m.name, [(c, colours[i % len(colours)], c, 1e8) for i, c in enumerate(m.compartments)])
+
+
+# The figure of a model as in the scripts, with the lines and the title to be filled in.
+def _figure(m, t):
+    if m.name not in _FIGURES:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        fig = Figure(facecolor='w')
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot(111, facecolor='#dddddd', axisbelow=True)
+        lines = [ax.plot(t, np.zeros(len(t)), colour, alpha=0.5, lw=2, label=label)[0]
+                 for expr, colour, label, scale in _curves(m)]
+        ax.set_xlabel('Time /days')
+        ax.set_ylabel('Number (100000s)')
+        ax.set_xlim(t[0], t[-1])
+        ax.set_ylim(0, 1.2)
+        ax.yaxis.set_tick_params(length=0)
+        ax.xaxis.set_tick_params(length=0)
+        ax.grid(visible=True, which='major', c='w', lw=2, ls='-')
+        legend = ax.legend()
+        legend.get_frame().set_alpha(0.5)
+        for spine in ('top', 'right', 'bottom', 'left'):
+            ax.spines[spine].set_visible(False)
+        _FIGURES[m.name] = (fig, ax, lines, ax.set_title(''))
+    fig, ax, lines, title = _FIGURES[m.name]
+    if len(lines[0].get_xdata()) != len(t) or np.any(lines[0].get_xdata() != t):
+        for line in lines:
+            line.set_xdata(t)
+        ax.set_xlim(t[0], t[-1])
+    return fig, lines, title
+
+
+def _render(model, ret, args, t, paths, format, dpi):
+    m = _model(model)
+    fig, lines, title = _figure(m, t)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        curves = [np.broadcast_to(m.observe(expr, ret, args), ret.shape[:2]) / scale
+                  for expr, colour, label, scale in _curves(m)]
+    for i, path in enumerate(paths):
+        for line, y in zip(lines, curves):
+            line.set_ydata(y[:, i])
+        if m.name in TITLES:
+            values = dict(zip(m.params, (np.broadcast_to(a, ret.shape[1:2])[i] for a in args)))
+            values.update(('%s0' % c, y) for c, y in zip(m.compartments, ret[0, i]))
+            title.set_text(TITLES[m.name].format(**values))
+        fig.savefig(path, format=format, dpi=dpi)
+    return paths
+
+
+# Render the trajectories ret of shape (len(t), n_scenarios, n_compartments) with the arguments args
+# of the model (scalars or arrays of shape (n_scenarios,)) into directory, one file per scenario named
+# names[i] (default <model>_<i>). Returns the paths of the files.
+def render(model, ret, args, t=None, directory='.', names=None, format='png', dpi=100, workers=None, chunk=20):
+    m = _model(model)
+    t = np.asarray(m.t if t is None else t, dtype=float)
+    n = ret.shape[1]
+    names = ['%s_%d' % (model, i) for i in range(n)] if names is None else names
+    paths = [os.path.join(directory, '%s.%s' % (name, format)) for name in names]
+    os.makedirs(directory, exist_ok=True)
+    args = tuple(np.broadcast_to(a, (n,)) for a in args)
+    chunks = [slice(i, min(i + chunk, n)) for i in range(0, n, chunk)]
+    workers = min(workers or os.cpu_count(), len(chunks))
+    jobs = [(model, ret[:, s], tuple(a[s] for a in args), t, paths[s], format, dpi) for s in chunks]
+    if workers == 1:
+        for job in jobs:
+            _render(*job)
+    else:
+        # the data of difference equations usually comes from diffeq.py in this process, and its TBB threads
+        # do not survive a fork
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('forkserver')) as pool:
+            list(pool.map(_render, *zip(*jobs)))
+    return paths
+
+
+if __name__ == '__main__':
+    import tempfile
+    import time
+
+    from sweep import sweep
+
+    rng = np.random.default_rng(0)
+    n = 500
+    p = dict(Flu=rng.uniform(500, 2000, n), Test=rng.uniform(500, 5000, n))
+    y0 = dict(A=rng.uniform(500, 2000, n))
+    m = MODELS['siqrar']
+    ret = sweep('siqrar', p, y0)
+    args, y = m.batch(p, y0)
+    with tempfile.TemporaryDirectory() as directory:
+        runs = [('png', 1)] + [(format, os.cpu_count()) for format in ('png', 'svg', 'pdf')]
+        for format, workers in runs if os.cpu_count() > 1 else runs[:1] + runs[2:]:
+            start = time.perf_counter()
+            render('siqrar', ret, args, directory=directory, format=format, workers=workers)
+            seconds = time.perf_counter() - start
+            print('%d figures of siqrar as %s on %d cores: %.1f s, %.0f figures per minute'
+                  % (n, format, workers, seconds, n / seconds * 60))
@@ -0,0 +1,247 @@
+# Run scenarios from files or from a stream of JSON lines with any model, and write one row of outcomes per
+# scenario as the runs complete, instead of editing the constants at the top of a script.
+# A scenario is a dict with the model, optionally an id and the number of days T (default the grid of the
+# script), and the parameters and initial values which differ from the script, e.g.
+#   {"id": "strict", "model": "siqrar", "T": 100, "Test": 5000, "beta1": 0.3, "A": 1000}
+# A .json or .yaml file holds one scenario, a list of them, or {"scenarios": [...]} with the other keys as
+# defaults for all of them; a .jsonl file (or - for the standard input) one scenario per line, read lazily.
+# The outcomes of every scenario are
+#   peak        the peak of the infectious (the compartments I..., and A)
+#   peak_day    the day of the peak
+#   positives   the total flow into quarantine (Q), or into the tests of the models without Q (POSITIVES)
+#   final_size  the total flow from the susceptible (S...) to the infected, by the end
+# The flows are integrated along with the model (as extra components of RK4, or summed over the days of the
+# difference equations), so the totals are as accurate as the run.
+#
+# The scenarios are grouped by model, days and keys into batches which are integrated at once (sweep.py,
+# diffeq.py), and the batches go to a pool of worker processes. At most two batches per worker are in
+# flight, and reading the input waits for them, and at most 64 batches are filling at once (the oldest is run
+# unfilled when a new model, T or set of keys needs one more), so the memory stays flat however long and
+# mixed the stream is. The rows
+# are written in the order the batches complete, to CSV or (with pyarrow) to Parquet, a row group per batch.
+#
+#   python scenarios.py scenarios.yaml more.jsonl -o outcomes.csv [--workers 4] [--batch 256]
+#   cat scenarios.jsonl | python scenarios.py - -o outcomes.parquet
+#
+# python scenarios.py without input streams 100000 scenarios of several models through the pool.
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from ensemble import _model
+from models import MODELS
+
+COLUMNS = ('id', 'model', 'peak', 'peak_day', 'positives', 'final_size')
+# the flow of positives of the models whose tests do not lead to Q
+POSITIVES = {'seir_ld': 'sigma * E', 'masstest': 's * r * N * I / (S+I)',
+             'massteststratified': 's * r * N * I1 / (S1+I1)'}
+
+
+# The expressions of the infectious, of the flow of positives and of the flow of infections of a model.
+def _outcomes(m):
+    infectious = ' + '.join(c for c in m.compartments if c.startswith('I') or c == 'A')
+    into_q = [rate for source, target, rate in m.transitions if target == 'Q']
+    positives = ' + '.join('(%s)' % r for r in into_q) if into_q else POSITIVES.get(m.name, '0 * t')
+    infections = ' + '.join('(%s)' % rate for source, target, rate in m.transitions
+                            if source and source.startswith('S') and target and not target.startswith('R'))
+    return infectious, positives, infections
+
+
+# The scenarios of a file (or of the standard input for '-') one at a time.
+def read(path):
+    if path == '-' or path.endswith('.jsonl'):
+        f = sys.stdin if path == '-' else open(path)
+        try:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        finally:
+            if f is not sys.stdin:
+                f.close()
+        return
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            import yaml
+
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    if isinstance(data, dict) and 'scenarios' in data:
+        defaults = {k: v for k, v in data.items() if k != 'scenarios'}
+        data = [dict(defaults, **s) for s in data['scenarios']]
+    yield from (data if isinstance(data, list) else [data])
+
+
+# Group the scenarios into batches of at most size with the same model, days and keys, with at most groups
+# batches filling at once (beyond that the oldest is yielded as it is).
+# Yields (model, T, ids, p, y0) with p and y0 dicts of arrays.
+def batches(scenarios, size=256, groups=64):
+    pending = {}
+    for i, s in enumerate(scenarios):
+        s = dict(s)
+        model, T, name = s.pop('model', None), s.pop('T', None), s.pop('id', i)
+        if model is None:
+            raise ValueError('scenario %s has no model' % name)
+        m = _model(model)
+        unknown = [k for k in s if k not in m.params and k not in m.compartments]
+        if unknown:
+            raise ValueError('scenario %s: %s has no parameters or compartments %s' % (name, model, ', '.join(unknown)))
+        key = (model, T, tuple(sorted(s)))
+        if key not in pending and len(pending) == groups:
+            oldest = next(iter(pending))
+            yield _batch(oldest, pending.pop(oldest))
+        group = pending.setdefault(key, [])
+        group.append((name, s))
+        if len(group) == size:
+            yield _batch(key, pending.pop(key))
+    for key, group in pending.items():
+        yield _batch(key, group)
+
+
+def _batch(key, group):
+    model, T, keys = key
+    m = _model(model)
+    values = {k: np.array([s[k] for _, s in group], dtype=float) for k in keys}
+    return (model, T, [name for name, _ in group], {k: v for k, v in values.items() if k not in m.compartments},
+            {k: v for k, v in values.items() if k in m.compartments})
+
+
+# The outcomes of a batch, as a dict of columns.
+def run(model, T, ids, p, y0):
+    m = _model(model)
+    infectious, positives, infections = _outcomes(m)
+    args, y = m.batch(p, y0)
+    n = len(m.compartments)
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        if model in MODELS:
+            from sweep import rk4
+
+            t = np.asarray(m.t if T is None else np.arange(T), dtype=float)
+
+            def f(z, s, *args):
+                x = z[:, :n]
+                flows = [m.observe(e, x, args, s) for e in (positives, infections)]
+                return np.concatenate([m.deriv(x, s, *args)] + [np.broadcast_to(v, (len(z),))[:, None]
+                                                                for v in flows], axis=1)
+
+            ret = rk4(f, np.concatenate([y, np.zeros((len(y), 2))], axis=1), t, args)
+            x, totals = ret[..., :n], ret[-1, :, n:].T
+        else:
+            from diffeq import simulate
+
+            x = np.moveaxis(simulate(model, p, y0, T), -1, 0)
+            t = np.arange(len(x), dtype=float)
+            totals = [np.broadcast_to(m.observe(e, x[:-1], args, t[:-1, None]), x[:-1].shape[:2]).sum(axis=0)
+                      for e in (positives, infections)]
+        I = np.broadcast_to(m.observe(infectious, x, args), x.shape[:2])
+    return dict(id=list(ids), model=[model] * len(ids), peak=I.max(axis=0), peak_day=t[I.argmax(axis=0)],
+                positives=totals[0], final_size=totals[1])
+
+
+# The runs of the batches by workers processes (in this process for workers=1), with at most two batches per
+# worker in flight. Yields the outcomes of every batch as it completes.
+# The workers are started by a fork server, not forked from this process: a fork of a process which has run
+# the parallel loops of diffeq.py (with workers=1) hangs, since the threading layer of Numba (TBB) does not
+# survive a fork.
+def execute(batches, workers=None):
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        for b in batches:
+            yield run(*b)
+        return
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('forkserver')) as pool:
+        running = set()
+        for b in batches:
+            if len(running) >= 2 * workers:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for job in done:
+                    yield job.result()
+            running.add(pool.submit(run, *b))
+        for job in wait(running)[0]:
+            yield job.result()
+
+
+# Write the outcomes to path (.csv or .parquet) as they come. Returns the number of rows.
+def write(outcomes, path):
+    rows = 0
+    if path.endswith('.parquet'):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError('writing %s needs pyarrow' % path)
+        writer = None
+        try:
+            for o in outcomes:
+                table = pa.table({k: [str(x) for x in o[k]] if k == 'id' else o[k] for k in COLUMNS})
+                writer = writer or pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+                rows += table.num_rows
+        finally:
+            if writer:
+                writer.close()
+        return rows
+    with open(path, 'w', newline='') as f:
+        out = csv.writer(f)
+        out.writerow(COLUMNS)
+        for o in outcomes:
+            out.writerows(zip(*(o[k] for k in COLUMNS)))
+            rows += len(o['id'])
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run scenarios and write their outcomes.')
+    parser.add_argument('inputs', nargs='+',
+                        help='.json, .yaml or .jsonl files of scenarios, - for JSON lines on stdin')
+    parser.add_argument('-o', '--output', default='outcomes.csv', help='.csv or .parquet')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--batch', type=int, default=256)
+    options = parser.parse_args(argv)
+    scenarios = (s for path in options.inputs for s in read(path))
+    rows = write(execute(batches(scenarios, options.batch), options.workers), options.output)
+    print('%d scenarios written to %s' % (rows, options.output), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main()
+        sys.exit()
+    import resource
+    import tempfile
+    import time
+
+    # a stream of scenarios which is never in memory: models, tests and contacts drawn at random
+    def stream(n, seed=0):
+        rng = np.random.default_rng(seed)
+        for i in range(n):
+            model = ('siqrar', 'trasym', 'tracing', 'siqar_test')[i % 4]
+            s = dict(id=i, model=model, T=100, beta1=round(rng.uniform(0.2, 0.3), 3))
+            if model in ('siqrar', 'siqar_test'):
+                s['Test'] = int(rng.integers(0, 5000))
+            yield s
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'scenarios.jsonl')
+        with open(path, 'w') as f:
+            for s in stream(100000):
+                f.write(json.dumps(s) + '\n')
+        output = os.path.join(directory, 'outcomes.csv')
+        start = time.perf_counter()
+        main([path, '-o', output, '--batch', '1024'])
+        seconds = time.perf_counter() - start
+        with open(output) as f:
+            rows = list(csv.DictReader(f))
+    print('100000 scenarios in %.1f s (%.0f per second), peak memory %.0f MB (the largest worker %.0f MB)'
+          % (seconds, 1e5 / seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3,
+             resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1e3))
+    for row in sorted(rows, key=lambda r: int(r['id']))[:4]:
+        print('    %s' % ', '.join('%s %s' % (k, v if k in ('id', 'model') else '%.4g' % float(v))
+                                   for k, v in row.items()))
@@ -0,0 +1,189 @@
+# Global sensitivity analysis: which parameters drive the outcome of a model over their whole ranges.
+# The parameters (and initial values) vary uniformly within bounds, e.g.
+#   bounds = {'beta1': (0.2, 0.3), 'gamma1': (0.15, 0.25), 'Test': (1000, 3000), 'Flu': (500, 2000)}
+# and the outcomes are reductions of an expression of the compartments over the time points of the script,
+#   outputs = {'Peak of I+A': ('max', 'I + A'), 'Total positives': ('last', 'Q + Rq')}
+#
+#   sobol(model, bounds, n)   the first-order and total Sobol indices: the share of the variance of an outcome
+#                             due to a parameter alone, and due to it together with all its interactions.
+#                             The points are a scrambled Sobol sequence (scipy.stats.qmc) split into two
+#                             matrices A and B, and the estimators are those of Saltelli (2010) for the first
+#                             order and of Jansen (1999) for the total indices, from n * (d + 2) runs for d
+#                             parameters (A, B and A with the column i from B for every i).
+#   morris(model, bounds, r)  Morris screening: r random one-at-a-time trajectories on a grid of levels,
+#                             the mean of the absolute elementary effects (mu*, the importance) and their
+#                             standard deviation (sigma, nonlinearity and interactions), from r * (d + 1) runs.
+#
+# The runs are integrated in batches (sweep.py for the ODE models, diffeq.py for the difference equations),
+# and the batches are spread over worker processes. A batch only returns the sums of the estimators, which are
+# added up as the batches finish, so the memory does not depend on the number of runs. The batches of the
+# Sobol sequence are fixed slices of it, and the trajectories of Morris come from a random stream per batch,
+# so the result does not depend on the number of workers. Runs which diverge (as siqrar.py can) are left out,
+# with all the runs of the same point.
+#
+# python sensitivity.py ranks the parameters of siqrar.py and siqar_test.py.
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from ensemble import _model, _solve
+
+OUTPUTS = {'Peak of I+A': ('max', 'I + A'), 'Total positives': ('last', 'Q + Rq')}
+_REDUCE = {'max': lambda x: x.max(axis=0), 'min': lambda x: x.min(axis=0), 'last': lambda x: x[-1],
+           'mean': lambda x: x.mean(axis=0)}
+
+
+# The outcomes of the runs of the points u in the unit cube (shape (n, d)), as an array of shape (n_outputs, n).
+def _evaluate(m, bounds, outputs, u, T):
+    p, y0 = {}, {}
+    for (k, (lo, hi)), x in zip(bounds.items(), u.T):
+        (y0 if k in m.compartments else p)[k] = lo + (hi - lo) * x
+    with np.errstate(over='ignore', invalid='ignore'):
+        ret, args = _solve(m, p, y0, T)
+        return np.array([np.broadcast_to(_REDUCE[how](m.observe(expr, ret, args)), (len(u),))
+                         for how, expr in outputs.values()])
+
+
+def _check(m, bounds):
+    unknown = [k for k in bounds if k not in m.params and k not in m.compartments]
+    if unknown:
+        raise ValueError('%s has no parameters or compartments %s' % (m.name, ', '.join(unknown)))
+
+
+def _sobol_batch(model, bounds, outputs, T, seed, start, size):
+    from scipy.stats import qmc
+
+    m = _model(model)
+    d = len(bounds)
+    engine = qmc.Sobol(2 * d, scramble=True, seed=seed)
+    if start:
+        engine.fast_forward(start)
+    points = engine.random(size)
+    A, B = points[:, :d], points[:, d:]
+    # A, B and A with the column i from B, all integrated as one batch
+    AB = np.repeat(A[None], d, axis=0)
+    AB[np.arange(d), :, np.arange(d)] = B.T
+    f = _evaluate(m, bounds, outputs, np.concatenate([A, B] + list(AB)), T).reshape(len(outputs), d + 2, size)
+    ok = np.isfinite(f).all(axis=(0, 1))
+    fA, fB, fAB = f[:, 0, ok], f[:, 1, ok], f[:, 2:, ok]
+    both = np.concatenate([fA, fB], axis=1)
+    return dict(n=ok.sum(), dropped=size - ok.sum(), mean=both.mean(axis=1) if ok.any() else np.zeros(len(outputs)),
+                m2=((both - both.mean(axis=1, keepdims=True)) ** 2).sum(axis=1),
+                first=(fB[:, None] * (fAB - fA[:, None])).sum(axis=2),
+                total=((fA[:, None] - fAB) ** 2).sum(axis=2))
+
+
+# Merge the sums of a batch into the totals. A mean and the sum of squared deviations from it (m2, of the
+# outcomes of A and B) are merged as by Chan et al., so that the large means (of order N) do not cancel out.
+def _merge(total, s):
+    if total is None:
+        return dict(s)
+    if 'mean' in s:
+        n, k = 2 * total['n'], 2 * s['n']
+        if k:
+            delta = s['mean'] - total['mean']
+            total['m2'] = total['m2'] + s['m2'] + delta ** 2 * n * k / (n + k)
+            total['mean'] = total['mean'] + delta * k / (n + k)
+    for key in s:
+        if key not in ('mean', 'm2'):
+            total[key] = total[key] + s[key]
+    return total
+
+
+def _run(task, batches, workers):
+    workers = min(workers or os.cpu_count(), len(batches))
+    total = None
+    if workers == 1:
+        for args in batches:
+            total = _merge(total, task(*args))
+        return total
+    # a fork server, since a fork of a process which has run the parallel loops of diffeq.py hangs (TBB)
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('forkserver')) as pool:
+        for job in as_completed([pool.submit(task, *args) for args in batches]):
+            total = _merge(total, job.result())
+    return total
+
+
+# The Sobol indices of the outcomes from n points (a power of 2 keeps the balance of the sequence), of the
+# parameters and initial values in bounds. T is the number of days (default the grid of the script).
+# Returns {output: dict(first=..., total=...)} with arrays in the order of bounds, and the runs left out.
+def sobol(model, bounds, n, outputs=OUTPUTS, T=None, batch=2048, seed=0, workers=None):
+    _check(_model(model), bounds)
+    total = _run(_sobol_batch, [(model, bounds, outputs, T, seed, start, min(batch, n - start))
+                                for start in range(0, n, batch)], workers)
+    if total['n'] == 0:
+        raise RuntimeError('every run of %s diverged' % model)
+    variance = total['m2'] / (2 * total['n'] - 1)
+    ret = {}
+    for i, name in enumerate(outputs):
+        ret[name] = dict(first=total['first'][i] / total['n'] / variance[i],
+                         total=total['total'][i] / (2 * total['n']) / variance[i])
+    return ret, int(total['dropped'])
+
+
+def _morris_batch(model, bounds, outputs, T, seed, b, size, levels):
+    m = _model(model)
+    d = len(bounds)
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(b,)))
+    delta = levels / (2 * (levels - 1))
+    # the start of every trajectory on the grid of levels, where a step of +delta or -delta stays inside
+    start = rng.integers(0, levels, (size, d)) / (levels - 1)
+    sign = np.where(start + delta <= 1, 1.0, -1.0)
+    order = np.argsort(rng.random((size, d)), axis=1)
+    points = np.repeat(start[:, None], d + 1, axis=1)
+    for j in range(d):
+        i = order[:, j]
+        points[np.arange(size), j + 1:, i] += sign[np.arange(size), i][:, None] * delta
+    f = _evaluate(m, bounds, outputs, points.reshape(-1, d), T).reshape(len(outputs), size, d + 1)
+    effects = np.empty((len(outputs), size, d))
+    for j in range(d):
+        i = order[:, j]
+        effects[:, np.arange(size), i] = (f[:, :, j + 1] - f[:, :, j]) * sign[np.arange(size), i] / delta
+    ok = np.isfinite(effects).all(axis=(0, 2))
+    e = effects[:, ok]
+    return dict(n=ok.sum(), dropped=size - ok.sum(), sum=e.sum(axis=1), abs=np.abs(e).sum(axis=1),
+                square=(e ** 2).sum(axis=1))
+
+
+# Morris screening with r trajectories on a grid of levels (even). The elementary effects are per the
+# whole range of a parameter. Returns {output: dict(mu=..., mu_star=..., sigma=...)} with arrays in the
+# order of bounds, and the trajectories left out.
+def morris(model, bounds, r, outputs=OUTPUTS, levels=4, T=None, batch=1024, seed=0, workers=None):
+    _check(_model(model), bounds)
+    total = _run(_morris_batch, [(model, bounds, outputs, T, seed, b, min(batch, r - start), levels)
+                                 for b, start in enumerate(range(0, r, batch))], workers)
+    n = total['n']
+    if n < 2:
+        raise RuntimeError('too few trajectories of %s converged' % model)
+    ret = {}
+    for i, name in enumerate(outputs):
+        mu = total['sum'][i] / n
+        ret[name] = dict(mu=mu, mu_star=total['abs'][i] / n,
+                         sigma=np.sqrt(np.maximum(total['square'][i] / n - mu ** 2, 0) * n / (n - 1)))
+    return ret, int(total['dropped'])
+
+
+if __name__ == '__main__':
+    import time
+
+    bounds = {'beta1': (0.2, 0.3), 'beta2': (0.2, 0.3), 'gamma1': (0.15, 0.25), 'gamma2': (0.15, 0.25),
+              'Test': (1000, 3000), 'Flu': (500, 2000)}
+    for model, extra in (('siqrar', {}), ('siqar_test', {'delta': (0.5, 1.0)})):
+        b = dict(bounds, **extra)
+        start = time.perf_counter()
+        indices, dropped = sobol(model, b, 2 ** 14)
+        seconds = time.perf_counter() - start
+        print('%s: Sobol indices from %d runs in %.1f s (%d points left out)'
+              % (model, 2 ** 14 * (len(b) + 2), seconds, dropped))
+        start = time.perf_counter()
+        screening, _ = morris(model, b, 2000)
+        seconds = time.perf_counter() - start
+        print('    Morris screening from %d runs in %.1f s' % (2000 * (len(b) + 1), seconds))
+        for name in OUTPUTS:
+            s, e = indices[name], screening[name]
+            print('    %-16s %s' % (name, '  '.join('%s %.2f/%.2f (mu* %.2g)' % (k, s['first'][i], s['total'][i],
+                                                                                   e['mu_star'][i])
+                                                    for i, k in sorted(enumerate(b), key=lambda x: -s['total'][x[0]]))))
@@ -0,0 +1,244 @@
+# A local HTTP service which solves the models on request, for dashboards which move a slider (e.g. Test)
+# and redraw at once. Starting a script per request costs the imports of NumPy, SciPy and Matplotlib and the
+# compilation of the right-hand side every time; here they are paid once:
+#   workers      a pool of worker processes, each of which imports the solvers and solves every model once
+#                when it starts, so that the compiled RHS (compiled.py, diffeq.py) are loaded and warm
+#   coalescing   identical requests which arrive while the first one is being solved wait for its result
+#                instead of solving it again
+#   cache        the results are kept by cache.py (the most recent in memory, the rest on disk), under a key
+#                of the model version, the parameters and initial values after the defaults, and the days
+#
+#   GET  /solve?model=siqrar&Test=3000&T=365[&format=binary]
+#   POST /solve  {"model": "vaccinationstratified", "T": 365, "r": 0.5, "format": "json"}
+#   GET  /models (the parameters and compartments of every model), GET /stats (requests, hits, coalesced)
+#
+# The parameters and initial values are given flat as in scenarios.py, T is the number of days (default the
+# grid of the script). The JSON answer is {"model", "t", "compartments": {name: [...]}}; format=binary
+# answers the float64 array of shape (len(t), n_compartments) in little-endian order, with the shape and the
+# compartments in the headers X-Shape and X-Compartments. Unknown models or parameters answer 400, failures
+# of the solver 500.
+#
+# python server.py [port] serves on 127.0.0.1 (default port 8765); python loadtest.py measures the latency.
+
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+
+from cache import Cache
+from diffeq import DIFFERENCE
+from ensemble import _model
+from models import MODELS
+
+
+# The first thing every worker does: solve the models once, which imports the solvers and loads (or
+# compiles) the right-hand sides, about 2 s per model.
+def _warm(models):
+    for model in models:
+        _solve(model, {}, {}, None if model in MODELS else 2)
+
+
+def _solve(model, p, y0, T):
+    if model in MODELS:
+        from compiled import solve
+
+        return solve(model, p, y0, None if T is None else np.arange(T, dtype=float))
+    from diffeq import simulate
+
+    return simulate(model, p, y0, T)[0].T
+
+
+class Service:
+    # workers: the number of worker processes (default the number of cores), warm: the models to warm up
+    # (default all, the others are compiled on their first request), cache: a cache.Cache
+    def __init__(self, workers=None, warm=None, cache=None):
+        workers = workers or os.cpu_count()
+        warm = list(MODELS) + list(DIFFERENCE) if warm is None else list(warm)
+        # the workers come from a fork server: a service started after difference equations were solved in this
+        # process would otherwise fork the TBB threads of Numba, which hangs
+        context = multiprocessing.get_context('forkserver')
+        self.pool = ProcessPoolExecutor(workers, mp_context=context, initializer=_warm, initargs=(warm,))
+        # start the workers now rather than on the first requests
+        for job in [self.pool.submit(int) for _ in range(workers)]:
+            job.result()
+        self.cache = cache or Cache(memory=4096)
+        self.stats = dict(requests=0, coalesced=0, solved=0, seconds=0.0)
+        self._lock = threading.Lock()
+        self._running = {}
+        self._bodies = OrderedDict()
+
+    # The time points and the trajectory of a model (shape (len(t), n_compartments), read-only) with the
+    # parameters and initial values in values (flat), on T days.
+    def solve(self, model, T=None, **values):
+        return self._lookup(model, T, values)[1:]
+
+    # The body of the answer in format ('json' or 'binary'), its content type and its headers. The bodies are
+    # kept too (as many as the solutions in memory), since encoding the JSON takes longer than solving.
+    def respond(self, model, format='json', T=None, **values):
+        if format not in ('json', 'binary'):
+            raise ValueError('no format %s' % format)
+        key, t, ret = self._lookup(model, T, values)
+        with self._lock:
+            answer = self._bodies.get((key, format))
+            if answer is not None:
+                self._bodies.move_to_end((key, format))
+                return answer
+        m = _model(model)
+        if format == 'binary':
+            answer = (np.ascontiguousarray(ret, dtype='<f8').tobytes(), 'application/octet-stream',
+                      {'X-Shape': '%d,%d' % ret.shape, 'X-Compartments': ','.join(m.compartments)})
+        else:
+            compartments = dict(zip(m.compartments, ret.T.tolist()))
+            answer = (json.dumps(dict(model=m.name, t=t.tolist(), compartments=compartments)).encode(),
+                      'application/json', {})
+        with self._lock:
+            self._bodies[key, format] = answer
+            while len(self._bodies) > self.cache.memory:
+                self._bodies.popitem(last=False)
+        return answer
+
+    def _lookup(self, model, T, values):
+        if model not in MODELS and model not in DIFFERENCE:
+            raise ValueError('no model %s' % model)
+        m = _model(model)
+        unknown = [k for k in values if k not in m.params and k not in m.compartments]
+        if unknown:
+            raise ValueError('%s has no parameters or compartments %s' % (model, ', '.join(unknown)))
+        T = None if T is None else int(T)
+        p = {k: float(v) for k, v in values.items() if k in m.params}
+        y0 = {k: float(v) for k, v in values.items() if k in m.compartments}
+        t = np.asarray(m.t if T is None else np.arange(T), dtype=float)
+        args, y = m.batch(p, y0)
+        key = self.cache.key(m, args, y, t, 'server', {})
+        with self._lock:
+            self.stats['requests'] += 1
+            ret = self.cache.get(key)
+            if ret is not None:
+                return key, t, ret
+            job = self._running.get(key)
+            first = job is None
+            if first:
+                job = self._running[key] = self.pool.submit(_solve, model, p, y0, T)
+            else:
+                self.stats['coalesced'] += 1
+        start = time.perf_counter()
+        try:
+            ret = job.result()
+        except Exception:
+            if first:
+                with self._lock:
+                    del self._running[key]
+            raise
+        if first:
+            # into the cache before it leaves the running, so that no request in between solves it again
+            with self._lock:
+                seconds = time.perf_counter() - start
+                self.stats['solved'] += 1
+                self.stats['seconds'] += seconds
+                self.cache.put(key, ret, seconds)
+                del self._running[key]
+        return key, t, ret
+
+    def report(self):
+        with self._lock:
+            return dict(self.stats, memory_hits=self.cache.stats['memory'], disk_hits=self.cache.stats['disk'])
+
+    def close(self):
+        self.pool.shutdown()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # the headers and the body go out as separate writes, which Nagle's algorithm would hold back for the
+    # delayed acknowledgement of the client (some 40 ms)
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/solve':
+            self._solve(dict(parse_qsl(url.query)))
+        elif url.path == '/models':
+            self._send(200, {name: dict(params=m.params, compartments=m.compartments)
+                             for name, m in list(MODELS.items()) + list(DIFFERENCE.items())})
+        elif url.path == '/stats':
+            self._send(200, self.server.service.report())
+        else:
+            self._send(404, dict(error='no such path %s' % url.path))
+
+    def do_POST(self):
+        if urlsplit(self.path).path != '/solve':
+            self._send(404, dict(error='no such path %s' % self.path))
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        except ValueError as e:
+            self._send(400, dict(error='invalid JSON: %s' % e))
+            return
+        self._solve(request)
+
+    def _solve(self, request):
+        request = dict(request)
+        try:
+            answer = self.server.service.respond(request.pop('model', 'siqrar'), **request)
+        except (ValueError, TypeError) as e:
+            self._send(400, dict(error=str(e)))
+            return
+        except Exception as e:
+            # a failure of the solver or of the workers (BrokenProcessPool): an answer rather than a dropped
+            # connection
+            self._send(500, dict(error='%s: %s' % (type(e).__name__, e)))
+            return
+        self._send(200, *answer)
+
+    def _send(self, status, body, kind='application/json', headers=None):
+        headers = headers or {}
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', kind)
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Serve on host:port (0 for any free port) until interrupted, or in a thread if background: then returns the
+# server, to be stopped with server.shutdown() and server.service.close().
+def serve(port=8765, host='127.0.0.1', workers=None, warm=None, cache=None, background=False):
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.service = Service(workers, warm, cache)
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.service.close()
+    return server
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    print('warming up the workers')
+    server = serve(port, background=True)
+    print('serving on http://127.0.0.1:%d' % port)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        server.service.close()
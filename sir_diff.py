@@ -15,9 +15,9 @@ beta, beta2, gamma, gamma2, delta, Test = 0.25, 0.25, 0.2, 0.2, 0.01, 2000
 # A grid of time points (in days)
 TIME = 100
 t = np.linspace(0, TIME, TIME)
-S, I, A, Q, Rq, R = np.empty(TIME), np.empty(TIME), np.empty(TIME), np.empty(TIME), np.empty(TIME), np.empty(TIME)
+S, I, A, Q, Rq, R = np.zeros(TIME), np.zeros(TIME), np.zeros(TIME), np.zeros(TIME), np.zeros(TIME), np.zeros(TIME)
 
-S[0], I[0], Q[0] = S0, I0, Q0
+S[0], I[0], A[0], Q[0], Rq[0], R[0] = S0, I0, A0, Q0, Rq0, R0
 
 # The SIR model differential equations.
 
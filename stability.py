@@ -0,0 +1,241 @@
+# Stability of the models and the boundary between outbreak and no outbreak in parameter space.
+# The README notes that whether siqrar.py diverges depends both on the number of tests and on the initial
+# number of infection: the tests remove Test * I / (2 * (I + Flu)) a day, about Test / (2 * Flu) * I while
+# I is small, but at most Test / 2, so a large enough initial infection overwhelms the tests even when
+# the disease-free equilibrium is stable.
+#
+#   equilibria(model, p)    the equilibria, solved with SymPy from the equations of models.py; where the
+#                           equilibria form a family (e.g. any S with I = Q = 0), the free compartments
+#                           are those of the disease-free state of the script
+#   stability(model, p, y)  the eigenvalues of the Jacobian (jacobians_generated.py) restricted to the infected
+#                           compartments (all but S... and R...), the growth rate (the largest real part)
+#                           and R_eff, the spectral radius of the next-generation matrix F V^-1 with F the
+#                           new infections (the transitions out of S...) and V the other transitions, at the
+#                           state y (default the disease-free state); vectorized over arrays of parameters
+#   boundary(model, x, y, xs, ys)
+#                           the smallest value of y (a parameter or an initial value) on the grid ys which
+#                           gives an outbreak, for every value of x on the grid xs
+#
+# boundary() does not integrate the whole grid. For every x it bisects the grid ys between a value without
+# and a value with an outbreak, all the columns in lockstep as one batch. It first solves every coarse-th
+# column and then continues to the columns in between, starting from a narrow bracket around the boundary
+# of their neighbours. Every trajectory is stopped as soon as its fate is certain: an outbreak when the
+# infectious compartments (those in the rates of infection) exceed a fraction high of N, no outbreak when
+# they fall below low people.
+#
+# python stability.py prints the stability of the models and maps the (Test, A0) boundary of siqrar.py
+# on a 1000 x 1000 grid.
+
+import numpy as np
+
+from models import MODELS
+from stochastic import infectious
+
+_EQUILIBRIA = {}
+_NEXT_GENERATION = {}
+
+
+# The infected compartments of a model: all but the susceptible S... and the removed R...
+def infected(m):
+    return [i for i, c in enumerate(m.compartments) if c[0] not in 'SR']
+
+
+# The disease-free state of the script (nobody infected or removed) as an array of shape (..., n_compartments).
+def disease_free(m, p=None):
+    p = p or {}
+    args, y = m.batch(p, {c: 0 for c in m.compartments if c[0] != 'S'})
+    return y
+
+
+def equilibria(model, p=None):
+    import sympy as sp
+
+    from jacobian import symbolic
+
+    p = p or {}
+    m = MODELS[model]
+    if model not in _EQUILIBRIA:
+        y, t, q, f, env = symbolic(m)
+        _EQUILIBRIA[model] = (y, q, sp.solve(list(f) + [sum(y) - env['N']], list(y), dict=True))
+    y, q, solutions = _EQUILIBRIA[model]
+    p = dict(m.params, **p)
+    free = dict(zip(y, disease_free(m, p)[0]))
+    values = dict(zip(q, m.args(p)))
+    ret = []
+    for solution in solutions:
+        state = {}
+        for c, symbol in zip(m.compartments, y):
+            expr = solution.get(symbol, symbol)
+            # a family of equilibria: the free compartments as in the disease-free state
+            state[c] = float(expr.subs(values).subs({s: free[s] for s in y if s not in solution}))
+        if min(state.values()) >= 0:
+            ret.append(state)
+    return ret
+
+
+# F (the new infections) and V (the other transitions) linearized in the infected compartments,
+# as functions of (y, t, *args) returning nested lists.
+def _next_generation(m):
+    if m.name not in _NEXT_GENERATION:
+        import sympy as sp
+
+        from jacobian import symbolic
+
+        y, t, p, f, env = symbolic(m)
+        k = infected(m)
+        inflow = sp.zeros(len(m.compartments), 1)
+        for i, (source, target, rate) in enumerate(m.transitions):
+            if source is not None and source[0] == 'S' and target is not None:
+                inflow[m.compartments.index(target)] += env['f%d' % i]
+        F = inflow.extract(k, [0]).jacobian([y[i] for i in k])
+        V = (inflow - f).extract(k, [0]).jacobian([y[i] for i in k])
+        _NEXT_GENERATION[m.name] = (sp.lambdify((y, t) + tuple(p), F.tolist(), 'numpy'),
+                                    sp.lambdify((y, t) + tuple(p), V.tolist(), 'numpy'))
+    return _NEXT_GENERATION[m.name]
+
+
+def _stack(matrix, shape):
+    return np.array([[np.broadcast_to(np.asarray(e, dtype=float), shape) for e in row] for row in matrix])
+
+
+def stability(model, p=None, y=None, t=0.0):
+    from jacobians_generated import JACOBIANS
+
+    p = p or {}
+    m = MODELS[model]
+    args, y0 = m.batch(p)
+    y = disease_free(m, p) if y is None else np.broadcast_to(np.asarray(y, dtype=float), y0.shape)
+    k = infected(m)
+    J = JACOBIANS[model](y, t, *args)[:, k][:, :, k]
+    eigenvalues = np.linalg.eigvals(J)
+    F, V = _next_generation(m)
+    shape = y.shape[:1]
+    F = np.moveaxis(_stack(F(np.moveaxis(y, -1, 0), t, *args), shape), -1, 0)
+    V = np.moveaxis(_stack(V(np.moveaxis(y, -1, 0), t, *args), shape), -1, 0)
+    R = np.abs(np.linalg.eigvals(F @ np.linalg.inv(V))).max(axis=-1)
+    return dict(eigenvalues=eigenvalues, growth=eigenvalues.real.max(axis=-1), R=R)
+
+
+# The fate of a batch of runs: True for an outbreak. The runs are integrated with RK4 (with a step below
+# the stability limit of the largest eigenvalue at the start) for at most T days, and every day the runs
+# whose fate is certain are dropped from the batch. The runs still undecided after T days count as an
+# outbreak if their infectious compartments have grown. Returns the fates and the days integrated.
+def fate(model, p=None, y0=None, T=365, high=0.01, low=1.0, dt=0.25):
+    from jacobians_generated import JACOBIANS
+
+    p, y0 = p or {}, y0 or {}
+    m = MODELS[model]
+    args, y = m.batch(p, y0)
+    args = [np.array(np.broadcast_to(a, y.shape[:1])) for a in args]
+    y = y.copy()
+    n = len(y)
+    spectral = np.abs(np.linalg.eigvals(JACOBIANS[model](y, 0.0, *args))).max()
+    steps = int(np.ceil(1 / min(dt, 2.0 / max(spectral, 1e-12))))
+    h = 1.0 / steps
+    sick = infectious(m)
+    N = args[list(m.params).index('N')]
+    x0 = y[:, sick].sum(axis=1)
+    ret = np.zeros(n, dtype=bool)
+    days = np.zeros(n, dtype=int)
+    active = np.arange(n)
+    f = m.deriv
+    for day in range(1, T + 1):
+        t = day - 1.0
+        for i in range(steps):
+            k1 = f(y, t, *args)
+            k2 = f(y + h / 2 * k1, t + h / 2, *args)
+            k3 = f(y + h / 2 * k2, t + h / 2, *args)
+            k4 = f(y + h * k3, t + h, *args)
+            y += h / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+            t += h
+        x = y[:, sick].sum(axis=1)
+        outbreak = x > high * N
+        done = outbreak | (x < low) | (day == T)
+        if day == T:
+            outbreak = x > x0
+        ret[active[done]] = outbreak[done]
+        days[active[done]] = day
+        keep = ~done
+        active, y, x0, N = active[keep], y[keep], x0[keep], N[keep]
+        args = [a[keep] for a in args]
+        if len(active) == 0:
+            break
+    return ret, days
+
+
+# For every value of x in xs, the index in ys of the smallest value of y giving an outbreak (len(ys) if
+# none does), assuming more of y gives more outbreaks. x and y are parameters or initial values.
+# Returns the indices and the number of trajectories and of days integrated.
+def boundary(model, x, y, xs, ys, p=None, y0=None, coarse=32, margin=2, **options):
+    p, y0 = p or {}, y0 or {}
+    m = MODELS[model]
+    xs, ys = np.asarray(xs, dtype=float), np.asarray(ys, dtype=float)
+    stats = dict(runs=0, days=0)
+
+    def outbreak(columns, rows):
+        values = {x: xs[columns], y: ys[rows]}
+        q = dict(p, **{k: v for k, v in values.items() if k not in m.compartments})
+        q.update((k, np.broadcast_to(v, len(columns))) for k, v in p.items() if np.ndim(v))
+        z = dict(y0, **{k: v for k, v in values.items() if k in m.compartments})
+        ret, days = fate(model, q, z, **options)
+        stats['runs'] += len(columns)
+        stats['days'] += days.sum()
+        return ret
+
+    # bisection of the brackets lo (no outbreak, -1 below the grid) < hi (outbreak, len(ys) above the grid)
+    def bisect(columns, lo, hi):
+        while True:
+            open_ = hi - lo > 1
+            if not open_.any():
+                return hi
+            mid = (lo + hi) // 2
+            hit = outbreak(columns[open_], mid[open_])
+            hi[np.flatnonzero(open_)[hit]] = mid[open_][hit]
+            lo[np.flatnonzero(open_)[~hit]] = mid[open_][~hit]
+
+    ret = np.empty(len(xs), dtype=int)
+    first = np.arange(0, len(xs), coarse)
+    if first[-1] != len(xs) - 1:
+        first = np.append(first, len(xs) - 1)
+    ret[first] = bisect(first, np.full(len(first), -1), np.full(len(first), len(ys)))
+    # continuation: the brackets of the other columns from the boundary of the solved neighbours
+    rest = np.setdiff1d(np.arange(len(xs)), first)
+    if len(rest):
+        left = first[np.searchsorted(first, rest) - 1]
+        right = first[np.searchsorted(first, rest)]
+        lo = np.maximum(np.minimum(ret[left], ret[right]) - margin, 0)
+        hi = np.minimum(np.maximum(ret[left], ret[right]) + margin, len(ys) - 1)
+        ends = outbreak(np.concatenate([rest, rest]), np.concatenate([lo, hi]))
+        lo_hit, hi_hit = ends[:len(rest)], ends[len(rest):]
+        # where the guess does not bracket the boundary, bisect the rest of the grid
+        lo, hi = np.where(lo_hit, -1, lo), np.where(lo_hit, lo, hi)
+        lo, hi = np.where(~hi_hit, hi, lo), np.where(~hi_hit, len(ys), hi)
+        ret[rest] = bisect(rest, lo, hi)
+    return ret, stats
+
+
+if __name__ == '__main__':
+    import time
+
+    for model in MODELS:
+        s = stability(model)
+        print('%-22s growth at the disease-free state %+.3f/day, R_eff %.2f, %d equilibria'
+              % (model, s['growth'][0], s['R'][0], len(equilibria(model))))
+
+    Test = np.linspace(0, 10000, 1000)
+    A0 = np.logspace(0, 6, 1000)
+    start = time.perf_counter()
+    edge, stats = boundary('siqrar', 'Test', 'A', Test, A0)
+    seconds = time.perf_counter() - start
+    print('siqrar: boundary over the %d x %d (Test, A0) grid in %.1f s, %d runs (instead of %d) of %.0f days on average'
+          % (len(Test), len(A0), seconds, stats['runs'], len(Test) * len(A0), stats['days'] / stats['runs']))
+    for i in range(0, len(Test), 111):
+        print('    Test = %6.0f: outbreak from A0 = %s'
+              % (Test[i], '%.0f' % A0[edge[i]] if edge[i] < len(A0) else 'never'))
+    # the bisection agrees with the fate of the grid points next to the boundary
+    i = np.arange(0, len(Test), 50)
+    inside = edge[i] < len(A0)
+    below, _ = fate('siqrar', dict(Test=Test[i][inside]), dict(A=A0[np.maximum(edge[i][inside] - 1, 0)]))
+    above, _ = fate('siqrar', dict(Test=Test[i][inside]), dict(A=A0[edge[i][inside]]))
+    print('    check next to the boundary: %d of %d below without and %d of %d above with an outbreak'
+          % ((~below | (edge[i][inside] == 0)).sum(), inside.sum(), above.sum(), inside.sum()))
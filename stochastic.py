@@ -0,0 +1,217 @@
+# Stochastic versions of the models of models.py, driven by the same transitions.
+# Every transition (source, target, rate) is an event which moves one individual from source to target
+# with the propensity rate (it cannot fire when source is empty).
+#   method='ssa'   the exact stochastic simulation algorithm of Gillespie (direct method), for small populations
+#   method='tau'   adaptive tau-leaping (Cao, Gillespie and Petzold 2006): the number of events of every
+#                  transition in a leap of length tau is Poisson, with tau chosen so that no propensity
+#                  changes by more than a fraction eps. When the leap would be shorter than a few exact
+#                  events, it falls back to a short run of exact events, so that small counts (the start
+#                  and the end of an outbreak) are treated exactly. This is what makes N = 1e8 feasible.
+# The replicates run in a compiled loop (in parallel threads with Numba, plain Python without it),
+# each with its own random stream spawned from np.random.SeedSequence(seed), so the results are reproducible
+# and the streams of different seeds do not overlap.
+#
+# out, extinct = simulate('trasym', replicates=10000)
+#   out[k, r] is the state (counts in each compartment) of replicate r of the parameter set k at the time points t,
+#   extinct[k, r] tells whether the infection died out, i.e. the infectious compartments (INFECTIOUS, e.g. I
+#   and A, or E and I) are empty at the end; extinct.mean(axis=1) is the extinction probability.
+#
+# python stochastic.py runs 10000 replicates of trasym.py over 100 days.
+
+import types
+
+import numpy as np
+
+from models import MODELS
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+    prange = range
+
+
+def _jit(f):
+    return njit(cache=True)(f) if njit else f
+
+
+# The change of the compartments by every transition, of shape (n_transitions, n_compartments),
+# and the index of the source of every transition (-1 for none).
+def stoichiometry(m):
+    V = np.zeros((len(m.transitions), len(m.compartments)))
+    source = np.full(len(m.transitions), -1)
+    for j, (s, d, rate) in enumerate(m.transitions):
+        if s is not None:
+            V[j, m.compartments.index(s)] -= 1
+            source[j] = m.compartments.index(s)
+        if d is not None:
+            V[j, m.compartments.index(d)] += 1
+    return V, source
+
+
+# The compartments of every model which carry the infection (including the exposed, who will be infectious):
+# the infection has died out when they are all empty. A model not listed here has I, I1, I2, ...
+INFECTIOUS = {'siqr': ('I',), 'siqctr': ('I',), 'siqrar': ('I', 'A'), 'seir_ld': ('E', 'I'), 'sirs': ('I',),
+              'trasym': ('I', 'A'), 'tracing': ('I', 'A'), 'masstest': ('I',),
+              'massteststratified': ('I1', 'I2'), 'vaccinationstratified': ('I1', 'I2')}
+
+
+# The indices of the infectious compartments of a model.
+def infectious(m):
+    names = INFECTIOUS.get(m.name) or [c for c in m.compartments if c.startswith('I')]
+    return [m.compartments.index(c) for c in names]
+
+
+# _propensities, _replicate and _run call the rates of the model as the global rates: _runner compiles a copy
+# of them for every model.
+def _propensities(x, t, p, source):
+    a = rates(x, t, p)
+    for j in range(len(a)):
+        if a[j] < 0 or (source[j] >= 0 and x[source[j]] < 1):
+            a[j] = 0.0
+    return a
+
+
+@_jit
+def _choose(a, a0):
+    u = np.random.random() * a0
+    j = 0
+    acc = a[0]
+    while acc < u and j < len(a) - 1:
+        j += 1
+        acc += a[j]
+    return j
+
+
+# The leap length of Cao, Gillespie and Petzold, bounding the relative change of every compartment
+# which is the source of a transition (the others do not change any propensity) by eps.
+@_jit
+def _tau(x, a, V, reactants, eps):
+    tau = np.inf
+    for i in reactants:
+        mu = 0.0
+        sigma2 = 0.0
+        for j in range(len(a)):
+            mu += a[j] * V[j, i]
+            sigma2 += a[j] * V[j, i] * V[j, i]
+        bound = max(eps * x[i] / 2, 1.0)
+        if mu != 0:
+            tau = min(tau, bound / abs(mu))
+        if sigma2 > 0:
+            tau = min(tau, bound * bound / sigma2)
+    return tau
+
+
+def _replicate(V, source, reactants, x, p, t_out, leap, eps, out):
+    t = t_out[0]
+    k = 0
+    x_new = np.empty_like(x)
+    while k < len(t_out) and t >= t_out[k]:
+        out[:, k] = x
+        k += 1
+    while k < len(t_out):
+        a = _propensities(x, t, p, source)
+        a0 = a.sum()
+        if a0 == 0:
+            while k < len(t_out):
+                out[:, k] = x
+                k += 1
+            break
+        tau = _tau(x, a, V, reactants, eps) if leap else 0.0
+        if tau < 10 / a0:
+            # a short run of exact events
+            for n in range(100):
+                t += np.random.exponential(1 / a0)
+                while k < len(t_out) and t >= t_out[k]:
+                    out[:, k] = x
+                    k += 1
+                if k == len(t_out):
+                    break
+                x += V[_choose(a, a0)]
+                a = _propensities(x, t, p, source)
+                a0 = a.sum()
+                if a0 == 0:
+                    break
+        else:
+            tau = min(tau, t_out[k] - t)
+            while True:
+                x_new[:] = x
+                for j in range(len(a)):
+                    if a[j] > 0:
+                        k_j = np.random.poisson(a[j] * tau)
+                        for i in range(len(x)):
+                            x_new[i] += k_j * V[j, i]
+                if x_new.min() >= 0:
+                    break
+                tau /= 2
+            x[:] = x_new
+            t += tau
+            while k < len(t_out) and t >= t_out[k] * (1 - 1e-12):
+                out[:, k] = x
+                k += 1
+
+
+def _run(V, source, reactants, x0, P, t_out, leap, eps, seeds, out):
+    for r in prange(out.shape[0]):
+        np.random.seed(seeds[r])
+        _replicate(V, source, reactants, x0[r].copy(), P[r], t_out, leap, eps, out[r])
+
+
+_RUN = {}
+
+
+# The copies of _propensities, _replicate and _run for every version of the model, with its rates as a global
+# (as in diffeq._advancer), so that the cache of Numba keeps them apart from the other models and is reused
+# by new processes.
+def _runner(m):
+    if m.name not in _RUN:
+        scope = dict(_run.__globals__, rates=njit(cache=True)(m.rates) if njit else m.rates)
+        for f in (_propensities, _replicate, _run):
+            copy = types.FunctionType(f.__code__, scope, '%s_%s_%s' % (f.__name__, m.name, m.key))
+            copy.__qualname__ = copy.__name__
+            scope[f.__name__] = njit(cache=True, parallel=f is _run)(copy) if njit else copy
+        _RUN[m.name] = scope['_run']
+    return _RUN[m.name]
+
+
+# Simulate replicates of a model for every parameter set in p and y0 (dicts of arrays of length n_sets,
+# missing entries take the defaults of the script) at the time points t.
+# Returns out of shape (n_sets, replicates, n_compartments, len(t)) and extinct of shape (n_sets, replicates).
+# The initial counts must not be negative (e.g. S when N is less than the default initial I).
+def simulate(model, p=None, y0=None, replicates=1000, t=None, method='tau', eps=0.03, seed=0):
+    p, y0 = p or {}, y0 or {}
+    if method not in ('ssa', 'tau'):
+        raise ValueError('no method %s' % method)
+    m = MODELS[model]
+    args, y = m.batch(p, y0)
+    n = len(y)
+    t = np.arange(int(m.t[-1]) + 1, dtype=float) if t is None else np.asarray(t, dtype=float)
+    x0 = np.repeat(np.round(y), replicates, axis=0)
+    # a leap can never make a negative count non-negative
+    if (x0 < 0).any():
+        raise ValueError('negative initial counts in %s' % model)
+    P = np.repeat(np.stack(args, axis=-1), replicates, axis=0)
+    V, source = stoichiometry(m)
+    out = np.empty((n * replicates, len(m.compartments), len(t)))
+    reactants = np.unique(source[source >= 0])
+    seeds = np.array([s.generate_state(1)[0] for s in np.random.SeedSequence(seed).spawn(len(out))])
+    _runner(m)(V, source, reactants, x0, np.ascontiguousarray(P), t, method == 'tau', eps, seeds, out)
+    out = out.reshape(n, replicates, len(m.compartments), len(t))
+    extinct = out[:, :, infectious(m), -1].sum(axis=-1) == 0
+    return out, extinct
+
+
+if __name__ == '__main__':
+    import time
+
+    simulate('trasym', replicates=2, t=np.arange(3.0))
+    start = time.perf_counter()
+    out, extinct = simulate('trasym', replicates=10000)
+    print('10000 replicates of trasym over 100 days: %.1f s' % (time.perf_counter() - start))
+    S, I, Q, A, R = np.moveaxis(out[0], 1, 0)
+    print('extinction probability %.3f, median peak of I %.0f' % (extinct.mean(), np.median(I.max(axis=1))))
+
+    start = time.perf_counter()
+    out, extinct = simulate('trasym', dict(N=10000), dict(I=1), replicates=10000, method='ssa')
+    print('10000 exact replicates of trasym with N = 10000, I0 = 1: %.1f s, extinction probability %.3f'
+          % (time.perf_counter() - start, extinct.mean()))
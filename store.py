@@ -0,0 +1,178 @@
+# A persistent store of trajectories on disk, so that sweeps, plots and analyses can run as separate processes.
+# A store is a directory with
+#   meta.json                the model, its compartments and parameters, the time points, the dtype, the
+#                            chunk size, the solver settings and the number of scenarios written
+#   <compartment>/<k>.npy    the trajectories of one compartment for the scenarios k*chunk ... (k+1)*chunk-1,
+#                            an array of shape (chunk, len(t)), one scenario per row
+#   params/<name>/<k>.npy    the parameters of the scenarios, of shape (chunk,)
+# Every column is a separate file, so reading one compartment does not touch the others, and the files
+# are plain .npy which are memory-mapped: reading a slice of a chunk is a view of the file without a copy,
+# and only the pages which are used are read. Appending writes into the current chunk (created at its
+# full size, which takes no space on disk until written) and then updates the count in meta.json,
+# so readers in other processes never see half-written scenarios. The trajectories can be stored as
+# float32 to halve the size.
+#
+#   store = Store.create('runs', 'siqrar', t, dtype='float32', solver=dict(method='rk4', substeps=10))
+#   store.append(sweep('siqrar', p, y0), args)     # shape (len(t), n, n_compartments) as sweep
+#   Store('runs').read('I', day=20)                  # I on day 20 of all the scenarios
+#
+# python store.py writes 100000 scenarios of siqrar.py and reads them back in another process.
+
+import json
+import os
+
+import numpy as np
+
+from diffeq import DIFFERENCE
+from models import MODELS
+
+
+class Store:
+    # Open an existing store; Store.create makes a new one.
+    def __init__(self, path):
+        self.path = path
+        self._files = {}
+        self.refresh()
+
+    # Create a store for the trajectories of model on the time points t; solver records the settings
+    # of the solver (and anything else) in the metadata.
+    @classmethod
+    def create(cls, path, model, t, dtype='float64', chunk=65536, solver=None):
+        solver = solver or {}
+        m = MODELS[model] if model in MODELS else DIFFERENCE[model]
+        os.makedirs(path)
+        meta = dict(model=model, key=m.key, compartments=list(m.compartments), params=list(m.params),
+                    defaults=m.params, t=np.asarray(t, dtype=float).tolist(), dtype=np.dtype(dtype).name,
+                    chunk=chunk, solver=dict(solver), count=0)
+        _write_meta(path, meta)
+        return cls(path)
+
+    # Read meta.json again, e.g. to see the scenarios appended by another process since the store was opened.
+    def refresh(self):
+        with open(os.path.join(self.path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.t = np.array(self.meta['t'])
+        return self
+
+    def __len__(self):
+        return self.meta['count']
+
+    def _file(self, column, k, shape, dtype, mode):
+        name = os.path.join(self.path, column, '%d.npy' % k)
+        if (name, mode) not in self._files:
+            if mode == 'w+' and not os.path.exists(name):
+                os.makedirs(os.path.dirname(name), exist_ok=True)
+                np.lib.format.open_memmap(name, 'w+', dtype, shape)
+            self._files[name, mode] = np.load(name, mmap_mode='r+' if mode == 'w+' else 'r')
+        return self._files[name, mode]
+
+    # Append scenarios: ret of shape (len(t), n, n_compartments) (as returned by sweep) and args the
+    # arguments of the model, scalars or arrays of shape (n,).
+    def append(self, ret, args):
+        meta = self.meta
+        T, n = len(self.t), ret.shape[1]
+        if ret.shape != (T, n, len(meta['compartments'])):
+            raise ValueError('expected trajectories of shape (%d, n, %d), not %s'
+                             % (T, len(meta['compartments']), ret.shape))
+        chunk, start = meta['chunk'], meta['count']
+        columns = [(c, ret[:, :, i].T, (chunk, T), meta['dtype']) for i, c in enumerate(meta['compartments'])]
+        columns += [(os.path.join('params', k), np.broadcast_to(a, (n,)), (chunk,), 'float64')
+                    for k, a in zip(meta['params'], args)]
+        for column, values, shape, dtype in columns:
+            i = 0
+            while i < n:
+                k, offset = divmod(start + i, chunk)
+                j = min(n - i, chunk - offset)
+                out = self._file(column, k, shape, dtype, 'w+')
+                # values beyond the range of float32 (diverging runs) are stored as inf
+                with np.errstate(over='ignore'):
+                    out[offset:offset + j] = values[i:i + j]
+                i += j
+        for out in self._files.values():
+            if out.mode == 'r+':
+                out.flush()
+        meta['count'] = start + n
+        _write_meta(self.path, meta)
+
+    # The chunks of a column (a compartment or 'params/<name>') as memory-mapped arrays, cut at the count.
+    def chunks(self, column):
+        meta = self.meta
+        shape = (meta['chunk'],) if column.startswith('params') else (meta['chunk'], len(self.t))
+        for k in range(-(-len(self) // meta['chunk'])):
+            yield self._file(column, k, shape, None, 'r')[:min(meta['chunk'], len(self) - k * meta['chunk'])]
+
+    # A compartment of the scenarios start ... stop-1 (all by default), of shape (n, len(t)), or on one day
+    # (an index of t) of shape (n,). Within one chunk this is a view of the file, otherwise the chunks
+    # are concatenated.
+    def read(self, compartment, start=0, stop=None, day=None):
+        stop = len(self) if stop is None else min(stop, len(self))
+        chunk = self.meta['chunk']
+        parts = []
+        for k, block in enumerate(self.chunks(compartment)):
+            lo, hi = max(start - k * chunk, 0), min(stop - k * chunk, len(block))
+            if lo < hi:
+                parts.append(block[lo:hi] if day is None else block[lo:hi, day])
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate(parts) if parts else np.empty((0,) if day is not None else (0, len(self.t)))
+
+    # The parameters of the scenarios start ... stop-1 as a dict of arrays.
+    def params(self, start=0, stop=None):
+        ret = {}
+        for name in self.meta['params']:
+            parts = list(self.chunks(os.path.join('params', name)))
+            ret[name] = (np.concatenate(parts) if parts else np.empty(0))[start:stop]
+        return ret
+
+
+def _write_meta(path, meta):
+    tmp = os.path.join(path, 'meta.json.%d' % os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump(meta, f, indent=1)
+    os.replace(tmp, os.path.join(path, 'meta.json'))
+
+
+def _read_back(path, day):
+    import time
+
+    start = time.perf_counter()
+    store = Store(path)
+    I = store.read('I', day=day)
+    A = store.read('A', day=day)
+    Test = store.params()['Test']
+    print('read back in another process: I+A on day %d of %d scenarios in %.3f s, median %.0f, '
+          'median among Test > 2000 %.0f' % (day, len(I), time.perf_counter() - start, np.median(I + A),
+                                            np.median((I + A)[Test > 2000])))
+
+
+if __name__ == '__main__':
+    import multiprocessing
+    import tempfile
+    import time
+
+    from sweep import sweep
+
+    m = MODELS['siqrar']
+    rng = np.random.default_rng(0)
+    n, batch = 100000, 10000
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'siqrar')
+        store = Store.create(path, 'siqrar', m.t, dtype='float32', solver=dict(method='rk4', substeps=10))
+        seconds = 0
+        for b in range(n // batch):
+            p = dict(Test=rng.uniform(1000, 3000, batch), beta1=rng.uniform(0.2, 0.3, batch))
+            y0 = dict(A=rng.uniform(500, 2000, batch))
+            args, y = m.batch(p, y0)
+            # draws which diverge (as siqrar.py can) are stored as inf and nan
+            with np.errstate(over='ignore', invalid='ignore'):
+                ret = sweep('siqrar', p, y0)
+            start = time.perf_counter()
+            store.append(ret, args)
+            seconds += time.perf_counter() - start
+        # the space used on disk, the rest of the last chunk is not allocated
+        size = sum(os.stat(os.path.join(d, f)).st_blocks * 512 for d, _, files in os.walk(path) for f in files)
+        print('appended %d scenarios of siqrar in batches of %d: %.2f s, %.0f MB on disk as float32'
+              % (len(store), batch, seconds, size / 1e6))
+        process = multiprocessing.Process(target=_read_back, args=(path, 20))
+        process.start()
+        process.join()
@@ -0,0 +1,130 @@
+# The SIR model with mass testing and vaccination of massteststratified.py and vaccinationstratified.py
+# for K groups instead of two. Group k has N_k people, and the mixing is a contact matrix C (K x K),
+# C[i, j] the fraction of the contacts of a person of group i made with people of group j, which can be
+# a scipy.sparse matrix. The new infections of group i are
+#   (1 - v_i) * beta_i * S_i * sum_j C[i, j] * I_j / N_j,
+# so the force of infection is one sparse matrix-vector product per evaluation of the right-hand side.
+# v_i is the vaccine efficacy of the group (r of vaccinationstratified.py for the vaccinated group), and
+# r_i * N_i tests per day with sensitivity s_i isolate s_i * r_i * N_i * I_i / (S_i + I_i) infected people.
+# The two groups of the scripts are C = [[1 - mu * N2/N1, mu * N2/N1], [mu, 1 - mu]] (see two_groups).
+#
+# The state is kept as three arrays S, I, R of length K (y of shape (3, K), flattened for the solvers),
+# and C is only used in the matrix-vector product, so the memory grows with the number of contacts and
+# not with K^2. The testing and recovery rates are well below 1/day, so the explicit RK45 is the default.
+#
+#   m = Stratified(sizes, contacts, beta=0.27, gamma=0.15, r=tests_per_person, s=1, v=efficacy)
+#   ret = m.solve(m.initial(I0), t)    # shape (len(t), 3, K)
+#
+# python stratified.py compares two groups with massteststratified.py and vaccinationstratified.py and
+# solves a model of 10000 groups.
+
+import numpy as np
+
+from models import MODELS
+
+
+class Stratified:
+    # sizes: N_k, contacts: the contact matrix C, dense or scipy.sparse, beta, gamma: the contact and
+    # recovery rates, r: the tests per day per person of each group, s: the sensitivity of the tests,
+    # v: the vaccine efficacy; all scalars or arrays of length K
+    def __init__(self, sizes, contacts, beta, gamma, r=0, s=1, v=0):
+        import scipy.sparse
+
+        self.sizes = np.asarray(sizes, dtype=float)
+        K = len(self.sizes)
+        self.contacts = scipy.sparse.csr_matrix(contacts, dtype=float)
+        if self.contacts.shape != (K, K):
+            raise ValueError('the contact matrix must be %d x %d, not %s' % (K, K, self.contacts.shape))
+        self.beta = np.broadcast_to(np.asarray(beta, dtype=float), (K,))
+        self.gamma = np.broadcast_to(np.asarray(gamma, dtype=float), (K,))
+        self.r = np.broadcast_to(np.asarray(r, dtype=float), (K,))
+        self.s = np.broadcast_to(np.asarray(s, dtype=float), (K,))
+        self.v = np.broadcast_to(np.asarray(v, dtype=float), (K,))
+
+    @property
+    def K(self):
+        return len(self.sizes)
+
+    # The initial state of shape (3, K): I0 and R0 infected and removed people in each group, the rest susceptible.
+    def initial(self, I0, R0=0):
+        I0 = np.broadcast_to(np.asarray(I0, dtype=float), (self.K,))
+        R0 = np.broadcast_to(np.asarray(R0, dtype=float), (self.K,))
+        return np.stack([self.sizes - I0 - R0, I0, R0])
+
+    def _rates(self, y):
+        S, I, R = y.reshape(3, self.K)
+        force = self.beta * (self.contacts @ (I / self.sizes))
+        infection = (1 - self.v) * force * S
+        # a group with nobody left to test (S + I = 0) has no tests positive
+        testing = self.s * self.r * self.sizes * I / np.maximum(S + I, 1e-12)
+        return S, I, force, infection, testing
+
+    # The right-hand side for odeint or solve_ivp with the flattened state of length 3K.
+    def deriv(self, y, t):
+        S, I, force, infection, testing = self._rates(y)
+        recovery = self.gamma * I
+        return np.concatenate([-infection, infection - recovery - testing, recovery + testing])
+
+    # Integrate from y0 of shape (3, K) over the time points t with a solver of solve_ivp.
+    # Returns the states of shape (len(t), 3, K).
+    def solve(self, y0, t, method='RK45', rtol=1e-6, atol=1e-3):
+        from scipy.integrate import solve_ivp
+
+        sol = solve_ivp(lambda s, y: self.deriv(y, s), (t[0], t[-1]), np.ravel(y0), method=method, t_eval=t,
+                        rtol=rtol, atol=atol)
+        if not sol.success:
+            raise RuntimeError(sol.message)
+        return sol.y.T.reshape(len(t), 3, self.K)
+
+
+# The two groups of massteststratified.py or vaccinationstratified.py (with the defaults of the script
+# overridden by p), and the initial state of the script.
+def two_groups(model, p=None):
+    p = p or {}
+    m = MODELS[model]
+    p = dict(m.params, **p)
+    N, a, mu = p['N'], p['a'], p['mu']
+    sizes = np.array([a * N, (1 - a) * N])
+    contacts = [[1 - mu * sizes[1] / sizes[0], mu * sizes[1] / sizes[0]], [mu, 1 - mu]]
+    if model == 'massteststratified':
+        # r * N tests per day, all in the first group
+        strat = Stratified(sizes, contacts, p['beta'], p['gamma'], r=[p['r'] * N / sizes[0], 0], s=p['s'])
+    else:
+        strat = Stratified(sizes, contacts, p['beta'], p['gamma'], v=[p['r'], 0])
+    init = m.initial(p)
+    return strat, np.array([[init['S1'], init['S2']], [init['I1'], init['I2']], [init['R1'], init['R2']]])
+
+
+if __name__ == '__main__':
+    import time
+
+    import scipy.sparse
+    from scipy.integrate import odeint
+
+    for model in ('massteststratified', 'vaccinationstratified'):
+        m = MODELS[model]
+        init = m.initial(m.params)
+        ref = odeint(m.deriv, [init[c] for c in m.compartments], m.t, args=m.args(m.params), rtol=1e-10, atol=1e-4)
+        strat, y0 = two_groups(model)
+        ret = strat.solve(y0, m.t, rtol=1e-10, atol=1e-4)
+        # S1, S2, I1, I2, R1, R2 as in the script
+        print('%s: max deviation from the script %.2e of N'
+              % (model, np.abs(ret.reshape(len(m.t), 6) - ref).max() / m.params['N']))
+
+    K, contacts = 10000, 20
+    rng = np.random.default_rng(0)
+    sizes = rng.uniform(5000, 20000, K)
+    # every group meets itself and 20 random groups, with the rows normalized to 1
+    rows = np.repeat(np.arange(K), contacts + 1)
+    cols = np.concatenate([np.arange(K)[:, None], rng.integers(0, K, (K, contacts))], axis=1).ravel()
+    C = scipy.sparse.csr_matrix((rng.uniform(0, 1, len(rows)), (rows, cols)), shape=(K, K))
+    C = scipy.sparse.diags(1 / np.asarray(C.sum(axis=1)).ravel()) @ C
+    strat = Stratified(sizes, C, beta=rng.uniform(0.2, 0.35, K), gamma=0.15, r=rng.uniform(0, 0.01, K), s=0.9,
+                       v=rng.choice([0, 0.5], K, p=[0.7, 0.3]))
+    t = np.linspace(0, 200, 201)
+    y0 = strat.initial(np.where(rng.random(K) < 0.01, 10, 0))
+    start = time.perf_counter()
+    ret = strat.solve(y0, t)
+    print('%d groups with %d contacts: %.2f s, final size %.3f of N, population kept within %.1e'
+          % (K, C.nnz, time.perf_counter() - start, ret[-1, 2].sum() / sizes.sum(),
+             np.abs(ret.sum(axis=(1, 2)) / sizes.sum() - 1).max()))
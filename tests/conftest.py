@@ -0,0 +1,35 @@
+# The scripts of the repository, run without their figures, as the reference of the tests.
+
+import os
+import re
+
+import matplotlib
+import pytest
+
+matplotlib.use('Agg')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# The namespace of the script name.py run up to its figure, with 'args' the arguments it passes to odeint.
+def run_script(name):
+    with open(os.path.join(ROOT, name + '.py')) as f:
+        source = f.read()
+    source = source[:source.index('fig = plt.figure')]
+    namespace = {}
+    exec(compile(source, name + '.py', 'exec'), namespace)
+    match = re.search(r'odeint\(deriv, y0, t, args=(\(.*\))\)', source)
+    if match:
+        namespace['args'] = eval(match.group(1), namespace)
+    return namespace
+
+
+@pytest.fixture(scope='session')
+def script():
+    cache = {}
+
+    def get(name):
+        if name not in cache:
+            cache[name] = run_script(name)
+        return cache[name]
+    return get
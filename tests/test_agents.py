@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from agents import STATES, A, I, Q, R, S, _trace, neighbours, random_graph, simulate
+
+
+@pytest.fixture(scope='module')
+def graph():
+    return random_graph(20000, 10)
+
+
+def test_random_graph(graph):
+    indptr, indices = graph
+    n = len(indptr) - 1
+    source = np.repeat(np.arange(n), np.diff(indptr))
+    assert not (source == indices).any()
+    # every contact in both directions
+    edges = set(zip(source.tolist(), indices.tolist()))
+    assert all((b, a) in edges for a, b in edges)
+    assert len(indices) / n == pytest.approx(10, rel=0.01)
+
+
+def test_neighbours(graph):
+    indptr, indices = graph
+    nodes = np.array([5, 0, 5, 19999])
+    expected = np.concatenate([indices[indptr[i]:indptr[i + 1]] for i in nodes])
+    np.testing.assert_array_equal(neighbours(indptr, indices, nodes), expected)
+    assert len(neighbours(indptr, indices, nodes[:0])) == 0
+
+
+def _path(n):
+    # the agents 0 - 1 - 2 - ... - n-1 in a line
+    a = np.arange(n - 1)
+    source, target = np.concatenate([a, a + 1]), np.concatenate([a + 1, a])
+    order = np.argsort(source, kind='stable')
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(source, minlength=n), out=indptr[1:])
+    return indptr, target[order].astype(np.int32)
+
+
+@pytest.mark.parametrize('depth, budget, found', [(1, 10, [1]), (2, 10, [1, 2]), (4, 10, [1, 2]), (2, 1, [1])])
+def test_trace_along_a_path(depth, budget, found):
+    indptr, indices = _path(6)
+    # 0 is the positive of the day, 1 symptomatic, 2 asymptomatic, 3 susceptible: the search stops at the
+    # negative 3 and does not reach the asymptomatic 4
+    state = np.array([Q, I, A, S, A, R], dtype=np.uint8)
+    seen = np.full(6, -1, dtype=np.int32)
+    traced = _trace(indptr, indices, state, np.array([0]), budget, depth, seen, 0, np.random.default_rng(0))
+    assert sorted(traced.tolist()) == found
+    assert (state[found] == Q).all()
+    assert state[4] == A
+
+
+def test_simulate(graph):
+    indptr, indices = graph
+    h = simulate(indptr, indices, dict(Test=200, Flu=20), A0=20, T=60, depth=2)
+    total = sum(h[c] for c in STATES)
+    assert (total == 20000).all()
+    assert h['A'][0] == 20 and h['I'][0] == 0
+    # the removed never come back
+    assert (np.diff(h['R'] + h['Rq']) >= 0).all()
+    np.testing.assert_array_equal(simulate(indptr, indices, dict(Test=200, Flu=20), A0=20, T=60, depth=2)['I'],
+                                  h['I'])
+
+
+def test_tracing_finds_positives(graph):
+    indptr, indices = graph
+    p = dict(Test=400, Flu=20)
+    none = simulate(indptr, indices, p, A0=20, T=60, depth=0)
+    deep = simulate(indptr, indices, p, A0=20, T=60, depth=2)
+    assert none['traced'].sum() == 0 and deep['traced'].sum() > 0
+    # the quarantine of the traced contacts leaves more agents never infected
+    assert deep['S'][-1] > none['S'][-1]
+
+
+def test_quarantine_starts_the_next_day(graph):
+    indptr, indices = graph
+    # with gamma1 = 1 the quarantined of a day are all removed the next, except the new ones
+    h = simulate(indptr, indices, dict(Test=400, Flu=20, gamma1=1.0), A0=20, T=40, depth=2)
+    assert h['tested'].sum() > 0 and h['traced'].sum() > 0
+    np.testing.assert_array_equal(h['Q'][1:], h['tested'][:-1] + h['traced'][:-1])
+
+
+def test_threads(graph):
+    indptr, indices = graph
+    h = simulate(indptr, indices, dict(Test=200, Flu=20), A0=20, T=30, threads=True)
+    assert (sum(h[c] for c in STATES) == 20000).all()
+    assert h['S'][-1] < 20000 - 20
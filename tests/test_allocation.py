@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from allocation import _Problem, optimize
+from stratified import Stratified
+
+
+@pytest.fixture(scope='module')
+def strat():
+    rng = np.random.default_rng(1)
+    contacts = rng.uniform(0, 1, (4, 4)) + 2 * np.eye(4)
+    return Stratified(rng.uniform(1e5, 4e5, 4), contacts / contacts.sum(axis=1, keepdims=True),
+                      beta=[0.35, 0.3, 0.25, 0.2], gamma=0.15, r=0.001, s=0.9)
+
+
+@pytest.mark.parametrize('objective', ['final', 'peak'])
+def test_gradient_against_finite_differences(strat, objective):
+    problem = _Problem(strat, strat.initial(500), 60, 15, 5e3, 1e4, 0.9, objective, 20, 2)
+    rng = np.random.default_rng(0)
+    z = rng.normal(0, 1, 2 * problem.P * problem.K)
+    value, grad = problem(z)
+    for _ in range(3):
+        e = rng.normal(0, 1, z.size)
+        numeric = (problem(z + 1e-5 * e)[0] - problem(z - 1e-5 * e)[0]) / 2e-5
+        assert grad @ e == pytest.approx(numeric, rel=1e-5)
+
+
+def test_schedule_and_outcome(strat):
+    problem = _Problem(strat, strat.initial(500), 60, 15, 5e3, 1e4, 0.9, 'final', 20, 2)
+    u = problem.schedule(np.random.default_rng(0).normal(0, 1, (2, problem.P, problem.K)))
+    # every schedule spends the budgets exactly
+    np.testing.assert_allclose(u.sum(axis=-1), [[5e3] * 4, [1e4] * 4])
+    # without budgets the infections are the susceptible lost by the stratified model
+    none = problem.outcome(np.zeros((2, problem.P, problem.K)))
+    y0 = strat.initial(500)
+    ret = strat.solve(y0, np.arange(61.0), rtol=1e-10, atol=1e-6)
+    assert none['final'] == pytest.approx((y0[0] - ret[-1, 0]).sum(), rel=1e-6)
+    assert none['peak'] == pytest.approx(ret[:, 1].sum(axis=1).max(), rel=1e-3)
+    assert problem.outcome(u)['final'] < none['final']
+
+
+def test_optimize(strat):
+    best = optimize(strat, strat.initial(500), tests=5e3, doses=1e4, days=60, starts=2, iterations=30, workers=1)
+    assert best['tests'].shape == best['doses'].shape == (4, 4)
+    assert best['final'] <= best['baseline']['final']
+    two = optimize(strat, strat.initial(500), tests=5e3, doses=1e4, days=60, starts=2, iterations=30, workers=2)
+    np.testing.assert_array_equal(two['tests'], best['tests'])
+
+
+def test_errors(strat):
+    # the default period is 15 days
+    with pytest.raises(ValueError):
+        optimize(strat, strat.initial(500), tests=5e3, days=100, workers=1)
+    with pytest.raises(ValueError):
+        optimize(strat, strat.initial(500), tests=5e3, days=60, objective='mean', workers=1)
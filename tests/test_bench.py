@@ -0,0 +1,30 @@
+from bench import BACKENDS, DIFFERENCE_BACKENDS, bench, compare, population
+from diffeq import DIFFERENCE
+from models import MODELS
+
+RESULT = dict(seconds=0.01, rhs=100, jac=0, memory=1000, deviation=1e-8, drift=0.0)
+
+
+def test_population():
+    assert population(MODELS['siqrar']) == list(range(6))
+    m = DIFFERENCE['siqar_test']
+    assert 'Np' not in [m.compartments[i] for i in population(m)]
+
+
+def test_compare():
+    baseline = {'siqr/odeint': RESULT}
+    assert compare({'siqr/odeint': dict(RESULT, seconds=0.019)}, baseline) == []
+    assert compare({'other/odeint': dict(RESULT, seconds=10)}, baseline) == []
+    for change in (dict(seconds=0.021), dict(rhs=101), dict(deviation=1.1e-7), dict(drift=2e-6)):
+        assert len(compare({'siqr/odeint': dict(RESULT, **change)}, baseline)) == 1
+    # a tighter threshold of the time
+    assert len(compare({'siqr/odeint': dict(RESULT, seconds=0.013)}, baseline, slower=0.2)) == 1
+
+
+def test_bench_of_two_models():
+    results = bench(models=('sirs', 'sir_diff'), repeat=1)
+    assert set(results) == {'sirs/%s' % b for b in BACKENDS} | {'sir_diff/%s' % b for b in DIFFERENCE_BACKENDS}
+    for key, r in results.items():
+        assert r['seconds'] > 0 and r['rhs'] > 0
+        assert r['deviation'] < 1e-5 and r['drift'] < 1e-6, key
+    assert compare(results, results) == []
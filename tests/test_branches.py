@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from branches import Branch, run
+from events import Event, integrate
+
+T = np.linspace(0, 100, 101)
+
+
+def _tree():
+    policies = [Branch(day, {'Test': x}) for day in (10, 30) for x in (3000.0, 6000.0)]
+    return policies + [Branch(b.time + 10, {'beta1': 0.2, 'beta2': 0.2}, b) for b in policies]
+
+
+def test_agrees_with_the_integration_from_day_0():
+    branches = _tree()
+    ret, stats = run('siqrar', branches, dict(Test=500), t=T, workers=1)
+    assert ret.shape == (len(branches), len(T), 6)
+    for b, r in zip(branches, ret):
+        events = [Event('branch', b.time, b.changes)]
+        if b.parent is not None:
+            events.insert(0, Event('parent', b.parent.time, b.parent.changes))
+        ref, _ = integrate('siqrar', events, dict(Test=500), t=T)
+        np.testing.assert_allclose(r, ref, atol=1e-6 * 1e8)
+    assert stats['days'] < stats['full'] + 100
+
+
+def test_past_of_a_branch_is_its_parent():
+    branches = _tree()
+    ret, _ = run('siqrar', branches, dict(Test=500), t=T, workers=1)
+    for j, b in enumerate(branches):
+        if b.parent is not None:
+            i = branches.index(b.parent)
+            np.testing.assert_array_equal(ret[j, T <= b.time], ret[i, T <= b.time])
+            assert not np.array_equal(ret[j, -1], ret[i, -1])
+
+
+def test_workers():
+    branches = _tree()
+    one, _ = run('siqrar', branches, dict(Test=500), t=T, workers=1)
+    two, _ = run('siqrar', branches, dict(Test=500), t=T, workers=2)
+    np.testing.assert_array_equal(one, two)
+
+
+def test_branch_between_time_points():
+    # a branch on day 30.5 of a daily grid
+    ret, _ = run('siqrar', [Branch(30.5, {'Test': 6000.0})], dict(Test=500), t=T, workers=1)
+    ref, _ = integrate('siqrar', [Event('branch', 30.5, {'Test': 6000.0})], dict(Test=500), t=T)
+    np.testing.assert_allclose(ret[0], ref, atol=1e-6 * 1e8)
+
+
+def test_order_of_the_tree():
+    parent = Branch(10, {'Test': 3000.0})
+    with pytest.raises(ValueError):
+        Branch(5, {'Test': 1.0}, parent)
+    with pytest.raises(ValueError):
+        run('siqrar', [Branch(20, {'Test': 1.0}, parent), parent], workers=1)
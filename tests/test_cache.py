@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+import pytest
+from scipy.integrate import odeint
+
+from cache import Cache
+from models import MODELS
+from sweep import sweep
+
+
+def test_hits_in_memory_and_on_disk(tmp_path):
+    cache = Cache(str(tmp_path))
+    first = cache.solve('trasym', dict(cap=2000))
+    m = MODELS['trasym']
+    p = dict(m.params, cap=2000)
+    init = m.initial(p)
+    np.testing.assert_array_equal(first, odeint(m.deriv, [init[c] for c in m.compartments], m.t, args=m.args(p)))
+    assert cache.solve('trasym', dict(cap=2000)) is first
+    assert not first.flags.writeable
+    # the defaults filled in give the same key
+    assert cache.solve('trasym', dict(cap=2000, delta=1)) is first
+    again = Cache(str(tmp_path)).solve('trasym', dict(cap=2000))
+    np.testing.assert_array_equal(again, first)
+    assert cache.stats['misses'] == 1 and cache.stats['memory'] == 2
+
+
+def test_keys_differ():
+    cache = Cache('unused')
+    m = MODELS['siqrar']
+    args, y = m.batch({})
+    keys = {cache.key(m, args, y, m.t, 'odeint', {}),
+            cache.key(m, args, y + 1, m.t, 'odeint', {}),
+            cache.key(m, args, y, m.t[:-1], 'odeint', {}),
+            cache.key(m, args, y, m.t, 'rk4', {}),
+            cache.key(m, args, y, m.t, 'odeint', dict(rtol=1e-8))}
+    assert len(keys) == 5
+
+
+def test_sweeps(tmp_path):
+    cache = Cache(str(tmp_path))
+    p = dict(Test=np.array([500.0, 1000.0]))
+    np.testing.assert_array_equal(cache.solve('siqrar', p, method='rk4'), sweep('siqrar', p))
+    with pytest.raises(ValueError):
+        cache.solve('siqrar', p)
+
+
+def test_old_equations_are_deleted(tmp_path):
+    cache = Cache(str(tmp_path))
+    cache.solve('sirs')
+    cache.solve('siqr')
+    m = MODELS['sirs']
+    stale = os.path.join(str(tmp_path), 'sirs_%s_%s.npz' % ('0' * len(m.key), '0' * 24))
+    os.rename(os.path.join(str(tmp_path), [f for f in os.listdir(str(tmp_path)) if f.startswith('sirs_')][0]), stale)
+    Cache(str(tmp_path)).solve('sirs')
+    names = os.listdir(str(tmp_path))
+    assert not os.path.exists(stale)
+    assert sum(name.startswith('sirs_%s_' % m.key) for name in names) == 1
+    assert sum(name.startswith('siqr_') for name in names) == 1
+
+
+def test_size_limit(tmp_path):
+    cache = Cache(str(tmp_path), size=0, memory=0)
+    for cap in (1000, 2000, 3000):
+        cache.solve('trasym', dict(cap=cap))
+    assert os.listdir(str(tmp_path)) == []
+    assert cache.solve('trasym', dict(cap=1000)) is not None and cache.stats['misses'] == 4
+
+
+def test_size_limit_of_a_shared_directory(tmp_path):
+    one = Cache(str(tmp_path), memory=0)
+    one.solve('trasym', dict(cap=1000))
+    limit = 10.5 * os.path.getsize(os.path.join(str(tmp_path), os.listdir(str(tmp_path))[0]))
+    # two caches (as two processes) on the same directory keep the limit of both together
+    one.size = limit
+    two = Cache(str(tmp_path), size=limit, memory=0)
+    for cap in range(2000, 2040):
+        for cache in (one, two):
+            cache.solve('trasym', dict(cap=cap + 0.5 * (cache is two)))
+            assert sum(os.path.getsize(os.path.join(str(tmp_path), f)) for f in os.listdir(str(tmp_path))) <= limit
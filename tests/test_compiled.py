@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from compiled import JACOBIANS, KERNELS, njit, params, solve
+from jacobians_generated import JACOBIANS as VECTORIZED
+from models import MODELS
+
+
+@pytest.mark.parametrize('model', list(MODELS))
+@pytest.mark.parametrize('method', ['rk45', 'lsoda'])
+def test_solve_agrees_with_the_script(script, model, method):
+    s = script(model)
+    np.testing.assert_allclose(solve(model, method=method), s['ret'], rtol=0, atol=1e-5 * s['N'])
+
+
+@pytest.mark.parametrize('model', list(MODELS))
+def test_kernels_agree_with_deriv(model):
+    m = MODELS[model]
+    y = solve(model)[len(m.t) // 2]
+    args = m.args(m.params)
+    np.testing.assert_allclose(KERNELS[model](y, 3.0, params(model)), m.deriv(y, 3.0, *args), rtol=1e-12)
+    np.testing.assert_allclose(JACOBIANS[model](y, 3.0, params(model)), VECTORIZED[model](y, 3.0, *args),
+                               rtol=1e-12, atol=1e-300)
+
+
+def test_parameters_and_initial_values():
+    ret = solve('siqrar', dict(Test=5000), dict(A=2000), t=np.arange(10.0))
+    assert ret.shape == (10, 6)
+    assert ret[0, 3] == 2000 and ret[-1, 2] > 0
+
+
+@pytest.mark.skipif(njit is None, reason='the compiled RK45 needs Numba')
+def test_singular_right_hand_side_gives_nan():
+    # the tests drain A + Flu to 0
+    ret = solve('siqrar', dict(beta1=0.3, beta2=0.2, Test=1000), t=np.arange(40.0))
+    assert np.isfinite(ret[:10]).all() and np.isnan(ret[-1]).all()
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        solve('siqr', method='euler')
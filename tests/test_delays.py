@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from delays import Convolution, gamma, geometric, simulate, survival
+from diffeq import simulate as difference
+
+
+@pytest.mark.parametrize('gamma2', [0.2, 0.5])
+def test_geometric_delays_are_the_script(gamma2):
+    # without tests the delays of siqar_test.py give the same epidemic, with the recovery of A at gamma2
+    ret = simulate(dict(Test=0, gamma2=gamma2))
+    S, I, Q, A, R, Rq, Np = difference('siqar_test', dict(Test=np.array([0.0]), gamma2=np.array([gamma2])))[0]
+    for k, v in (('S', S), ('I', I), ('A', A), ('R', R)):
+        np.testing.assert_allclose(ret[k], v, rtol=1e-12, atol=1e-6)
+
+
+@pytest.mark.parametrize('rate', ['gamma1', 'gamma2'])
+def test_no_recovery(rate):
+    ret = simulate({'Test': 0, rate: 0})
+    S, I, Q, A, R, Rq, Np = difference('siqar_test', {'Test': np.array([0.0]), rate: np.array([0.0])})[0]
+    for k, v in (('S', S), ('I', I), ('A', A), ('R', R)):
+        np.testing.assert_allclose(ret[k], v, rtol=1e-12, atol=1e-6)
+    with pytest.raises(ValueError):
+        geometric(0)
+    np.testing.assert_array_equal(survival(geometric(0, 5)), 1)
+
+
+def test_recovery_of_a_at_gamma2():
+    slow, fast = simulate(dict(gamma2=0.2)), simulate(dict(gamma2=0.5))
+    assert (fast['A'][1:] < slow['A'][1:]).all()
+    np.testing.assert_array_equal(simulate(dict(gamma2=0.5), infectious_A=geometric(0.5))['A'], fast['A'])
+    # infectious alone applies to both
+    both = simulate(dict(gamma2=0.5), infectious=gamma(7, 3))
+    np.testing.assert_array_equal(both['A'], simulate(infectious=gamma(7, 3), infectious_A=gamma(7, 3))['A'])
+
+
+def test_blocks_against_the_direct_sums():
+    rng = np.random.default_rng(0)
+    T = 1000
+    kernel = rng.random(700)
+    x = rng.random(T)
+    blocked, direct = Convolution(kernel, T, 'fft', short=16), Convolution(kernel, T, 'direct')
+    expected = np.convolve(x, kernel)[:T]
+    for t in range(T):
+        # the delays of at least one day are known before x(t)
+        assert blocked.pending(t) == pytest.approx(expected[t] - kernel[0] * x[t], rel=1e-9, abs=1e-9)
+        assert direct.pending(t) == pytest.approx(expected[t] - kernel[0] * x[t], rel=1e-9, abs=1e-9)
+        blocked.push(x[t])
+        direct.push(x[t])
+
+
+def test_fft_and_direct_simulations_agree():
+    T = 600
+    runs = [simulate(dict(Test=20000, beta1=0.001, beta2=0.001), T=T, method=method,
+                     infectious=gamma(T / 25, T / 25, T)) for method in ('fft', 'direct')]
+    for k in runs[0]:
+        np.testing.assert_allclose(runs[0][k], runs[1][k], rtol=1e-9, atol=1e-6)
+
+
+def test_distributions():
+    # the mass of (d-1, d] on day d adds half a day to the mean of the gamma distribution
+    for pmf, mean in ((geometric(0.2), 5), (gamma(5, 2), 5.5)):
+        assert pmf.sum() == pytest.approx(1)
+        assert pmf[0] == 0
+        assert (np.arange(len(pmf)) * pmf).sum() == pytest.approx(mean, rel=1e-3)
+    s = survival(geometric(0.2))
+    np.testing.assert_allclose(s[:4], [1, 0.8, 0.64, 0.512])
+
+
+def test_realistic_delays():
+    ret = simulate(dict(Test=700), T=200, incubation=gamma(5, 2), turnaround=gamma(2, 1), tracing=gamma(3, 1.5),
+                   quarantine=gamma(14, 3))
+    for k in ('S', 'E', 'I', 'A', 'W', 'Q', 'R', 'Rq'):
+        assert ret[k].min() > -1e-6, k
+    assert (np.diff(ret['S']) <= 0).all() and (np.diff(ret['Rq']) >= -1e-6).all()
+    # the incubation delays the epidemic against the one-day incubation of the script
+    assert np.argmax(ret['I'] + ret['A']) > np.argmax((lambda r: r['I'] + r['A'])(simulate(dict(Test=700), T=200)))
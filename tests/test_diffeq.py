@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from diffeq import DIFFERENCE, njit, simulate, stream
+
+
+@pytest.mark.parametrize('model', list(DIFFERENCE))
+@pytest.mark.parametrize('backend', ['numba', 'numpy'])
+def test_agrees_with_the_loop_of_the_script(script, model, backend):
+    if backend == 'numba' and njit is None:
+        pytest.skip('no Numba')
+    m = DIFFERENCE[model]
+    s = script(model)
+    ret = simulate(model, backend=backend)[0]
+    # Np of the script is only the last new positive, not a history
+    for i, c in enumerate(m.compartments):
+        if np.ndim(s.get(c)) == 1:
+            np.testing.assert_allclose(ret[i], s[c], rtol=1e-12, atol=1e-6)
+
+
+def test_batch_and_stream():
+    rng = np.random.default_rng(0)
+    p = dict(Test=rng.uniform(0, 2000, 50), beta1=rng.uniform(0.2, 0.3, 50))
+    y0 = dict(A=rng.uniform(100, 1000, 50))
+    ret = simulate('siqar_test', p, y0, T=100)
+    assert ret.shape == (50, 7, 100)
+    single = simulate('siqar_test', dict(Test=p['Test'][7], beta1=p['beta1'][7]), dict(A=y0['A'][7]), T=100)
+    np.testing.assert_allclose(ret[7], single[0], rtol=1e-12)
+    # the buffer is reused, so every block is copied
+    blocks = [(t0, b.copy()) for t0, b in stream('siqar_test', p, y0, T=100, chunk=32)]
+    assert [t0 for t0, _ in blocks] == [0, 32, 64, 96]
+    np.testing.assert_allclose(np.concatenate([b for _, b in blocks], axis=-1), ret, rtol=1e-12)
+
+
+def test_backends_agree():
+    p = dict(Test=np.linspace(0, 3000, 20))
+    np.testing.assert_allclose(simulate('siqar_test', p, T=200, backend='numpy'), simulate('siqar_test', p, T=200),
+                               rtol=1e-10)
+    with pytest.raises(ValueError):
+        simulate('siqar_test', p, T=200, backend='cuda')
+    with pytest.raises(ValueError):
+        next(stream('siqar_test', p, T=200, backend='Numba'))
@@ -0,0 +1,44 @@
+import json
+
+import numpy as np
+
+from diffeq import DIFFERENCE
+from ensemble import ensemble
+from models import MODELS
+from sweep import rk4
+
+PRIORS = {'beta1': ('uniform', 0.2, 0.3), 'Test': ('uniform', 1000, 3000), 'A': ('uniform', 500, 2000)}
+
+
+def test_does_not_depend_on_the_workers():
+    one = ensemble('siqrar', PRIORS, 400, batch=100, workers=1)
+    two = ensemble('siqrar', PRIORS, 400, batch=100, workers=2)
+    for name in one:
+        np.testing.assert_array_equal(one[name], two[name])
+
+
+def test_priors_from_json():
+    q = ensemble('siqrar', json.loads(json.dumps(PRIORS)), 200, batch=100, workers=1)
+    expected = ensemble('siqrar', PRIORS, 200, batch=100, workers=1)
+    for name in expected:
+        np.testing.assert_array_equal(q[name], expected[name])
+
+
+def test_grid_of_the_script():
+    q = ensemble('siqrar', PRIORS, 200, batch=100, workers=1)
+    assert q['Infected'].shape == (3, len(MODELS['siqrar'].t))
+    q = ensemble('siqar_test', PRIORS, 200, batch=100, workers=1)
+    assert q['Infected'].shape == (3, len(DIFFERENCE['siqar_test'].t))
+    q = ensemble('siqrar', PRIORS, 200, T=30, batch=100, workers=1)
+    assert q['Infected'].shape == (3, 30)
+
+
+def test_quantiles_of_a_fixed_draw():
+    # every draw the same: all the quantiles are the single trajectory, up to the width of a bin
+    q = ensemble('siqrar', {'A': 1000.0}, 50, outputs=('Infected',), batch=25, workers=1)['Infected']
+    m = MODELS['siqrar']
+    args, y = m.batch({}, {'A': np.array([1000.0])})
+    x = m.observe('Infected', rk4(m.deriv, y, m.t, args), args)[:, 0]
+    for row in q:
+        np.testing.assert_allclose(row[1:], x[1:], rtol=0.025)
+    assert np.all(np.diff(q, axis=0) >= 0)
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from scipy.integrate import odeint
+
+from events import Event, integrate, locked
+from models import MODELS
+
+
+def _odeint(model, p=None, t=None):
+    m = MODELS[model]
+    p = dict(m.params, **(p or {}))
+    init = m.initial(p)
+    t = m.t if t is None else t
+    return odeint(m.deriv, [init[c] for c in m.compartments], t, args=m.args(p), rtol=1e-12, atol=1e-6,
+                  tcrit=[p['t_ld']] if 't_ld' in p else None, mxstep=100000)
+
+
+@pytest.mark.parametrize('method', ['RK45', 'LSODA'])
+@pytest.mark.parametrize('model', ['seir_ld', 'trasym'])
+def test_switches_agree_with_odeint(model, method):
+    ret, stats = integrate(model, method=method)
+    ref = _odeint(model)
+    assert ret.shape == ref.shape
+    np.testing.assert_allclose(ret, ref, atol=1e-5 * ref[0].sum())
+    assert stats[-1]['event'] == 'end' and stats[-1]['t'] == MODELS[model].t[-1]
+
+
+def test_switch_times():
+    ret, stats = integrate('seir_ld')
+    assert [s['event'] for s in stats][:-1] == ['t < t_ld']
+    assert stats[0]['t'] == pytest.approx(MODELS['seir_ld'].params['t_ld'])
+
+
+def test_locked_rates():
+    m, switches = locked(MODELS['trasym'])
+    assert switches and all('_s%d' % i in m.params for i in range(len(switches)))
+    assert 'minimum(' not in ''.join(rate for _, _, rate in m.transitions)
+
+
+def test_time_event_is_a_change_of_parameters():
+    t = np.linspace(0, 100, 101)
+    ret, stats = integrate('siqrar', [Event('tests', 40, {'Test': 5000})], t=t)
+    before = _odeint('siqrar', t=t[:41])
+    np.testing.assert_allclose(ret[:41], before, atol=1e-5 * before[0].sum())
+    assert stats[0]['event'] == 'tests' and stats[0]['t'] == 40
+
+
+def test_event_at_the_start():
+    # an event at or before t[0] is the same as the changed parameters from the start
+    t = np.linspace(0, 100, 101)
+    for when in (0, -5):
+        ret, _ = integrate('siqrar', [Event('tests', when, {'Test': 5000})], t=t)
+        ref, _ = integrate('siqrar', p=dict(Test=5000), t=t)
+        np.testing.assert_allclose(ret, ref, rtol=1e-10)
+
+
+def test_condition_fires_once():
+    t = np.linspace(0, 100, 101)
+    event = Event('lockdown', 'I + A > 1e5', {'beta1': 'beta1 / 2', 'beta2': 'beta2 / 2'})
+    ret, stats = integrate('siqrar', [event], dict(Test=500), t=t)
+    names = [s['event'] for s in stats]
+    assert names.count('lockdown') == 1
+    k = names.index('lockdown')
+    m = MODELS['siqrar']
+    infected = ret[:, m.compartments.index('I')] + ret[:, m.compartments.index('A')]
+    assert infected[t < stats[k]['t']].max() <= 1e5
+    # the root is where I + A reaches 1e5
+    at, _ = integrate('siqrar', p=dict(Test=500), t=np.array([0, stats[k]['t']]))
+    assert at[-1, m.compartments.index('I')] + at[-1, m.compartments.index('A')] == pytest.approx(1e5, rel=1e-6)
+
+
+def test_not_a_comparison():
+    with pytest.raises(ValueError):
+        integrate('siqrar', [Event('bad', 'I + A', {'Test': 1})])
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from fitting import _loss, fit, predict
+from models import MODELS
+
+
+def _finite_differences(f, q, h=1e-6):
+    ret = []
+    for j in range(len(q)):
+        up, down = dict(q), dict(q)
+        k = list(q)[j]
+        up[k], down[k] = q[k] * (1 + h), q[k] * (1 - h)
+        ret.append((f(up) - f(down)) / (2 * h * q[k]))
+    return np.stack(ret, axis=-1)
+
+
+@pytest.mark.parametrize('model, q', [('siqrar', dict(beta1=0.3, beta2=0.2, Test=400.0)),
+                                      ('seir_ld', dict(beta0=0.5, beta1=0.12, t_ld=42.5))])
+def test_gradient_of_the_prediction(model, q):
+    t = np.arange(60.0)
+    mu, dmu = predict(model, q, tuple(q), t)
+    assert mu.shape == (len(t),) and dmu.shape == (len(t), len(q))
+    expected = _finite_differences(lambda p: predict(model, p, tuple(q)[:1], t)[0], q)
+    np.testing.assert_allclose(dmu, expected, rtol=1e-4, atol=1e-6 * np.abs(mu).max())
+
+
+def test_gradient_of_the_loss():
+    rng = np.random.default_rng(0)
+    t = np.arange(40.0)
+    tests = rng.integers(300, 500, len(t)).astype(float)
+    positives = rng.poisson(100, len(t)).astype(float)
+    names = ('beta1', 'beta2', 'Test')
+    fixed = dict(MODELS['siqrar'].params)
+    logq = np.log([0.3, 0.2, 400.0])
+    for loss in ('poisson', 'lsq'):
+        args = (names, fixed, t, positives, tests, loss)
+        value, grad = _loss(logq, 'siqrar', *args)
+        h = 1e-6
+        expected = [(_loss(logq + h * e, 'siqrar', *args)[0] - _loss(logq - h * e, 'siqrar', *args)[0]) / (2 * h)
+                    for e in np.eye(len(logq))]
+        np.testing.assert_allclose(grad, expected, rtol=1e-4)
+
+
+def test_switch_at_a_time_point():
+    # t_ld on a day of the grid: the grid is kept as it is
+    t = np.arange(60.0)
+    mu, dmu = predict('seir_ld', dict(t_ld=42.0), ('t_ld',), t)
+    assert mu.shape == (60,) and np.isfinite(dmu).all()
+
+
+def test_fit_recovers_the_parameters():
+    t = np.arange(80.0)
+    true = dict(beta0=0.5, beta1=0.12, t_ld=42)
+    mu, _ = predict('seir_ld', true, ('beta0',), t)
+    best = fit('seir_ld', mu, params=('beta1',), p=dict(beta0=0.5, t_ld=42), starts=2, workers=1)
+    assert best['beta1'] == pytest.approx(0.12, rel=1e-3)
+
+
+def test_tests_need_the_parameter_test():
+    with pytest.raises(ValueError):
+        fit('seir_ld', np.ones(10), np.ones(10), params=('beta0',))
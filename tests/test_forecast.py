@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from scipy.integrate import odeint
+
+from forecast import Forecaster
+from models import MODELS
+
+
+def test_without_reports_the_members_follow_the_model():
+    m = MODELS['siqrar']
+    f = Forecaster('siqrar', 3, dict(Test=np.array([500.0, 1000.0, 2000.0])), members=4)
+    for day in range(5):
+        positives = f.assimilate(np.full(3, np.nan))
+    mean, std = f.state()
+    for i, Test in enumerate((500.0, 1000.0, 2000.0)):
+        p = dict(m.params, Test=Test)
+        init = m.initial(p)
+        # the positives of the day as an extra compartment of the integration
+        rhs = lambda z, s: np.append(m.deriv(z[:-1], s, *m.args(p)), m.observe('New positive', z[:-1], m.args(p), s))
+        ref = odeint(rhs, [init[c] for c in m.compartments] + [0], np.arange(6.0), rtol=1e-10, atol=1e-6)
+        np.testing.assert_allclose([mean[c][i] for c in m.compartments], ref[-1, :-1], rtol=1e-6)
+        assert positives[i] == pytest.approx(ref[-1, -1] - ref[-2, -1], rel=1e-6)
+        assert max(std[c][i] for c in m.compartments) == 0
+
+
+def test_reports_move_only_their_regions():
+    f = Forecaster('siqrar', 2, members=20, estimate={'beta1': 0.25})
+    g = Forecaster('siqrar', 2, members=20, estimate={'beta1': 0.25})
+    f.assimilate(np.array([np.nan, np.nan]))
+    g.assimilate(np.array([np.nan, 1e4]))
+    np.testing.assert_array_equal(f.x[0], g.x[0])
+    assert not np.array_equal(f.x[1], g.x[1])
+
+
+def test_estimates_the_contact_rates():
+    m = MODELS['siqrar']
+    rng = np.random.default_rng(0)
+    r, T = 20, 40
+    N = np.full(r, 1e7)
+    beta1 = rng.uniform(0.15, 0.35, r)
+    p = dict(N=N, beta1=beta1, Flu=N / 1e3, Test=N / 1e4)
+    args, y = m.batch(p, dict(A=N / 1e5))
+    ret = odeint(lambda z, s: m.deriv(z.reshape(r, -1), s, *args).ravel(), y.ravel(), np.arange(T + 1.0), rtol=1e-8)
+    rates = m.observe('New positive', ret.reshape(T + 1, r, -1), args)
+    positives = rng.poisson(np.maximum(rates[:-1], 0))
+    f = Forecaster('siqrar', r, dict(N=N, Flu=N / 1e3, Test=N / 1e4), dict(A=N / 1e5), estimate={'beta1': 0.25})
+    for day in range(T):
+        f.assimilate(positives[day])
+    mean, std = f.state()
+    assert np.abs(mean['beta1'] - beta1).mean() < np.abs(0.25 - beta1).mean() / 3
+
+
+def test_forecast_keeps_the_members():
+    f = Forecaster('siqrar', 4, members=10, estimate={'beta1': 0.25})
+    f.assimilate(np.full(4, 100.0))
+    x = f.x.copy()
+    q = f.forecast(7, quantiles=(0.1, 0.5, 0.9))
+    assert q.shape == (3, 7, 4)
+    assert np.all(np.diff(q, axis=0) >= 0)
+    np.testing.assert_array_equal(f.x, x)
+    assert f.t == 1
+
+
+def test_errors():
+    with pytest.raises(ValueError):
+        Forecaster('siqr', 2)
+    with pytest.raises(ValueError):
+        Forecaster('siqrar', 3, dict(N=np.array([1e6, 2e6])))
+    with pytest.raises(ValueError):
+        Forecaster('siqrar', 3, estimate={'beta': 0.3})
+    # seir_ld has no parameter Test
+    f = Forecaster('seir_ld', 2, members=5)
+    with pytest.raises(ValueError):
+        f.assimilate(np.array([10.0, 20.0]), np.array([100.0, 100.0]))
+
+
+def test_estimate_a_parameter_given_in_p():
+    f = Forecaster('siqrar', 3, p=dict(beta1=0.3), estimate={'beta1': 0.25}, spread=0)
+    np.testing.assert_allclose(np.exp(f.x[..., -1]), 0.25)
@@ -0,0 +1,48 @@
+import json
+
+import numpy as np
+from scipy.integrate import odeint
+
+from instrument import folded, run, survey, write_folded, write_json
+from models import MODELS
+
+
+def test_run_is_plain_odeint():
+    m = MODELS['trasym']
+    p = dict(m.params, cap=2000)
+    init = m.initial(p)
+    ret, r = run('trasym', dict(cap=2000))
+    ref, info = odeint(m.deriv, [init[c] for c in m.compartments], m.t, args=m.args(p), rtol=1e-8, atol=1e-6,
+                       full_output=True)
+    np.testing.assert_array_equal(ret, ref)
+    assert r['success'] and r['rhs'] == info['nfe'][-1] and r['steps'] == info['nst'][-1]
+    # the intervals add up to the totals
+    assert r['interval_rhs'].sum() == r['rhs'] and r['interval_steps'].sum() == r['steps']
+    assert len(r['method']) == len(r['t']) == len(m.t) - 1
+    assert 0 < r['rhs_seconds'] <= r['wall']
+
+
+def test_switches_of_the_method():
+    _, r = run('siqrar', dict(Flu=1, Test=10000), t=np.linspace(0, 100, 101))
+    assert r['switches']
+    for t, method in r['switches']:
+        i = np.searchsorted(r['t'], t)
+        assert r['method'][i] == method and r['method'][i - 1] != method
+
+
+def test_survey_and_files(tmp_path):
+    p = dict(Flu=np.array([10.0, 1000.0]), Test=np.array([5000.0, 500.0]))
+    records = survey('siqrar', p, t=np.linspace(0, 40, 41))
+    assert [r['params']['Flu'] for r in records] == [10.0, 1000.0]
+    write_json(records, str(tmp_path / 'profile.json'))
+    with open(str(tmp_path / 'profile.json')) as f:
+        assert json.load(f)[1]['params']['Test'] == 500.0
+    lines = folded(records)
+    # only the varying parameters are in the stacks
+    assert all(line.startswith('siqrar;Flu=') and ',Test=' in line for line in lines)
+    assert {line.rsplit(' ', 1)[0].split(';')[-1] for line in lines} <= {'rhs', 'solver'}
+    total = sum(int(line.rsplit(' ', 1)[1]) for line in lines)
+    assert abs(total - 1e6 * sum(r['wall'] for r in records)) <= len(lines)
+    write_folded(records, str(tmp_path / 'profile.folded'))
+    with open(str(tmp_path / 'profile.folded')) as f:
+        assert f.read().split('\n')[:-1] == lines
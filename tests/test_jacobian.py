@@ -0,0 +1,40 @@
+import os
+
+import numpy as np
+import pytest
+
+from jacobians_generated import JACOBIANS, KERNELS
+from models import MODELS
+from sweep import sweep
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('model', list(MODELS))
+def test_jacobian_agrees_with_finite_differences(model):
+    m = MODELS[model]
+    args = m.args(m.params)
+    y = sweep(model)[len(m.t) // 3, 0]
+    t = 3.0
+    h = 1e-6 * np.maximum(np.abs(y), 1.0)
+    J = np.array([(m.deriv(y + h[j] * e, t, *args) - m.deriv(y - h[j] * e, t, *args)) / (2 * h[j])
+                  for j, e in enumerate(np.eye(len(y)))]).T
+    np.testing.assert_allclose(JACOBIANS[model](y, t, *args), J, rtol=1e-5, atol=1e-8)
+    np.testing.assert_allclose(KERNELS[model](y, t, np.array(args, dtype=float)), J, rtol=1e-5, atol=1e-8)
+
+
+def test_batch_of_states():
+    m = MODELS['siqrar']
+    ret = sweep('siqrar', dict(Test=[0.0, 3000.0]))
+    J = JACOBIANS['siqrar'](ret[5], 5.0, *m.batch(dict(Test=[0.0, 3000.0]))[0])
+    assert J.shape == (2, 6, 6)
+    np.testing.assert_allclose(J[1], JACOBIANS['siqrar'](ret[5, 1], 5.0, *m.args(dict(m.params, Test=3000.0))))
+
+
+def test_generated_file_is_current(tmp_path):
+    pytest.importorskip('sympy')
+    from jacobian import generate
+
+    generate(str(tmp_path / 'jacobians_generated.py'))
+    with open(os.path.join(ROOT, 'jacobians_generated.py')) as f:
+        assert (tmp_path / 'jacobians_generated.py').read_text() == f.read()
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+import scipy.sparse as sp
+from scipy.integrate import odeint
+
+from jacobians_generated import JACOBIANS
+from metapopulation import Metapopulation, _structure
+from models import MODELS
+
+N = np.array([1e5, 3e5, 2e6, 5e4])
+SEEDS = np.array([100.0, 0, 0, 20])
+
+
+def _meta(scale=1.0, **options):
+    flows = 0.01 * np.minimum.outer(N, N) * scale
+    np.fill_diagonal(flows, 0)
+    mobility = sp.diags(1 / N) @ sp.csr_matrix(flows)
+    return Metapopulation('siqrar', mobility, dict(N=N, Flu=N / 1e5, Test=N * 2e-5), dict(S=N - SEEDS, A=SEEDS),
+                          **options)
+
+
+def test_without_mobility_the_regions_are_independent():
+    meta = _meta(0.0)
+    t = np.linspace(0, 100, 101)
+    totals, final = meta.solve(t, rtol=1e-10, atol=1e-6)
+    m = MODELS['siqrar']
+    for i in range(len(N)):
+        args = tuple(np.broadcast_to(a, N.shape)[i] for a in meta.args)
+        ref = odeint(m.deriv, meta.y0[:, i], t, args=args, rtol=1e-10, atol=1e-6)
+        np.testing.assert_allclose(final[:, i], ref[-1], rtol=1e-6, atol=1e-3)
+
+
+def test_symmetric_flows_keep_the_populations():
+    # when everybody travels (the quarantined too)
+    meta = _meta(mobile=MODELS['siqrar'].compartments)
+    t = np.linspace(0, 100, 11)
+    populations, final = meta.solve(t, reduce=lambda y, s: y.sum(axis=0))
+    np.testing.assert_allclose(populations, np.broadcast_to(N, populations.shape), rtol=1e-6)
+    totals, _ = _meta().solve(t)
+    np.testing.assert_allclose(totals.sum(axis=1), N.sum(), rtol=1e-9)
+    # the infection reaches the regions without seeds
+    assert (final[MODELS['siqrar'].compartments.index('R')] > 0).all()
+
+
+def test_quarantined_stay():
+    meta = _meta()
+    assert [MODELS['siqrar'].compartments[c] for c in meta.mobile] == ['S', 'I', 'A', 'R']
+    y = np.random.default_rng(0).uniform(0, 1e3, meta.y0.shape)
+    k = MODELS['siqrar'].compartments.index('Q')
+    np.testing.assert_allclose(meta.deriv(y.ravel(), 0).reshape(y.shape)[k],
+                               _meta(0.0).deriv(y.ravel(), 0).reshape(y.shape)[k])
+
+
+def test_jacobian_against_finite_differences():
+    meta = _meta()
+    y = meta.y0.ravel() + np.random.default_rng(0).uniform(0, 100, meta.y0.size)
+    J = meta.jacobian(y, 10.0).toarray()
+    h = 1e-3
+    expected = np.stack([(meta.deriv(y + h * e, 10.0) - meta.deriv(y - h * e, 10.0)) / (2 * h)
+                         for e in np.eye(len(y))], axis=-1)
+    np.testing.assert_allclose(J, expected, rtol=1e-5, atol=1e-8)
+
+
+@pytest.mark.parametrize('model', list(MODELS))
+def test_structure_covers_the_jacobian(model):
+    m = MODELS[model]
+    rng = np.random.default_rng(0)
+    pattern = _structure(m)
+    for _ in range(10):
+        J = JACOBIANS[model](rng.uniform(0, 1e6, len(m.compartments)), rng.uniform(0, 100), *m.args(m.params))
+        assert not J[~pattern].any()
+
+
+def test_stiff_solver_agrees():
+    t = np.linspace(0, 100, 11)
+    rk45, _ = _meta().solve(t, rtol=1e-8, atol=1e-4)
+    bdf, _ = _meta().solve(t, method='BDF', rtol=1e-8, atol=1e-4)
+    np.testing.assert_allclose(bdf, rk45, rtol=1e-4, atol=1)
+
+
+def test_number_of_regions():
+    with pytest.raises(ValueError):
+        Metapopulation('siqr', sp.eye(3), dict(N=np.array([1e5, 1e5])))
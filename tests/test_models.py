@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from models import MODELS, Model
+
+
+@pytest.mark.parametrize('model', list(MODELS))
+def test_equations_are_those_of_the_script(script, model):
+    m = MODELS[model]
+    s = script(model)
+    np.testing.assert_allclose(m.t, s['t'])
+    init = m.initial(m.params)
+    np.testing.assert_allclose([init[c] for c in m.compartments], s['y0'])
+    args = m.args(m.params)
+    for k in range(0, len(s['t']), max(1, len(s['t']) // 10)):
+        y, t = s['ret'][k], s['t'][k]
+        np.testing.assert_allclose(m.deriv(y, t, *args), s['deriv'](y, t, *s['args']), rtol=1e-10, atol=1e-6)
+
+
+@pytest.mark.parametrize('model', list(MODELS))
+def test_kernel_and_rates_agree_with_deriv(model):
+    m = MODELS[model]
+    init = m.initial(m.params)
+    y = np.array([init[c] for c in m.compartments], dtype=float) * 0.9 + 100
+    p = np.array(m.args(m.params), dtype=float)
+    dydt = m.deriv(y, 1.5, *m.args(m.params))
+    np.testing.assert_allclose(m.kernel(y, 1.5, p), dydt, rtol=1e-12)
+    flows = np.zeros(len(y))
+    for (source, target, _), rate in zip(m.transitions, m.rates(y, 1.5, p)):
+        if source:
+            flows[m.compartments.index(source)] -= rate
+        if target:
+            flows[m.compartments.index(target)] += rate
+    np.testing.assert_allclose(flows, dydt, rtol=1e-12, atol=1e-9)
+
+
+def test_batch():
+    m = MODELS['siqrar']
+    args, y = m.batch(dict(Test=np.array([1.0, 2.0, 3.0])), dict(A=np.array([10.0, 20.0, 30.0])))
+    assert y.shape == (3, 6) and all(np.shape(a) == (3,) for a in args)
+    np.testing.assert_allclose(y[:, 0], m.params['N'] - y[:, 3])
+    out = m.deriv(y, 0.0, *args)
+    np.testing.assert_allclose(out[1], m.deriv(y[1], 0.0, *[a[1] for a in args]))
+
+
+def test_observable_of_the_script(script):
+    m = MODELS['siqrar']
+    s = script('siqrar')
+    S, I, Q, A, R, Rq = s['ret'].T
+    Test, Flu = s['Test'], s['Flu']
+    np.testing.assert_allclose(m.observe('New positive', s['ret'], m.args(m.params)),
+                               Test * I / (2 * (I + Flu)) + Test * I / (2 * (A + Flu)))
+
+
+def test_key_follows_the_equations():
+    m = MODELS['sirs']
+    other = Model('sirs', m.compartments, m.params, m.transitions[:-1], m.initial, m.t)
+    same = Model('sirs', m.compartments, m.params, m.transitions, m.initial, m.t)
+    assert same.key == m.key != other.key
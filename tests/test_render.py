@@ -0,0 +1,55 @@
+import os
+
+import numpy as np
+import pytest
+
+from diffeq import DIFFERENCE, simulate
+from models import MODELS
+from render import render
+from sweep import sweep
+
+
+@pytest.fixture(scope='module')
+def scenarios():
+    p = dict(Test=np.array([500.0, 1000.0, 2000.0]))
+    y0 = dict(A=np.array([500.0, 1000.0, 1500.0]))
+    args, y = MODELS['siqrar'].batch(p, y0)
+    return sweep('siqrar', p, y0), args
+
+
+def test_files(tmp_path, scenarios):
+    ret, args = scenarios
+    paths = render('siqrar', ret, args, directory=str(tmp_path), workers=1)
+    assert paths == [os.path.join(str(tmp_path), 'siqrar_%d.png' % i) for i in range(3)]
+    for path in paths:
+        with open(path, 'rb') as f:
+            assert f.read(8) == b'\x89PNG\r\n\x1a\n'
+
+
+def test_workers_give_the_same_figures(tmp_path, scenarios):
+    ret, args = scenarios
+    one = render('siqrar', ret, args, directory=str(tmp_path / 'one'), workers=1, chunk=1)
+    two = render('siqrar', ret, args, directory=str(tmp_path / 'two'), workers=2, chunk=1)
+    for a, b in zip(one, two):
+        with open(a, 'rb') as f, open(b, 'rb') as g:
+            assert f.read() == g.read()
+
+
+def test_titles_and_names(tmp_path, scenarios):
+    ret, args = scenarios
+    paths = render('siqrar', ret, args, directory=str(tmp_path), names=['a', 'b', 'c'], format='svg', workers=1)
+    assert [os.path.basename(path) for path in paths] == ['a.svg', 'b.svg', 'c.svg']
+    with open(paths[1]) as f:
+        svg = f.read()
+    assert 'Test = 1000/day, A_0 = 1000' in svg
+
+
+def test_difference_equations(tmp_path):
+    p = dict(Test=np.array([300.0, 700.0]))
+    ret = np.moveaxis(simulate('siqar_test', p), -1, 0)
+    args, y = DIFFERENCE['siqar_test'].batch(p, {})
+    paths = render('siqar_test', ret, args, directory=str(tmp_path), format='svg', workers=1)
+    with open(paths[1]) as f:
+        svg = f.read()
+    # the curves of siqar_test.py, not the compartments (Np is internal)
+    assert 'Undetected infected (x 10000)' in svg and 'Test = 700/day' in svg and 'Np' not in svg
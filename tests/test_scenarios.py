@@ -0,0 +1,97 @@
+import csv
+import json
+
+import numpy as np
+import pytest
+
+from diffeq import simulate
+from scenarios import COLUMNS, batches, main, read, run
+from sweep import sweep
+
+
+def test_read(tmp_path):
+    path = tmp_path / 'one.json'
+    path.write_text(json.dumps({'model': 'siqrar', 'Test': 5000}))
+    assert list(read(str(path))) == [{'model': 'siqrar', 'Test': 5000}]
+    path = tmp_path / 'many.json'
+    path.write_text(json.dumps({'model': 'siqrar', 'T': 50, 'scenarios': [{'Test': 1}, {'Test': 2, 'T': 60}]}))
+    assert list(read(str(path))) == [{'model': 'siqrar', 'T': 50, 'Test': 1}, {'model': 'siqrar', 'T': 60, 'Test': 2}]
+    path = tmp_path / 'lines.jsonl'
+    path.write_text('{"model": "sirs"}\n\n{"model": "siqr", "beta": 0.3}\n')
+    assert list(read(str(path))) == [{'model': 'sirs'}, {'model': 'siqr', 'beta': 0.3}]
+
+
+def test_read_yaml(tmp_path):
+    pytest.importorskip('yaml')
+    path = tmp_path / 'scenarios.yaml'
+    path.write_text('model: siqrar\nscenarios:\n  - id: a\n    Test: 1000\n  - id: b\n    A: 10\n')
+    assert list(read(str(path))) == [{'model': 'siqrar', 'id': 'a', 'Test': 1000},
+                                     {'model': 'siqrar', 'id': 'b', 'A': 10}]
+
+
+def test_batches():
+    scenarios = [dict(model='siqrar', Test=i) for i in range(5)] + [dict(model='siqrar', A=10, id='x'),
+                                                                   dict(model='sirs', T=20)]
+    groups = list(batches(scenarios, size=2))
+    assert [(b[0], b[1], b[2]) for b in groups] == [('siqrar', None, [0, 1]), ('siqrar', None, [2, 3]),
+                                                    ('siqrar', None, [4]), ('siqrar', None, ['x']),
+                                                    ('sirs', 20, [6])]
+    np.testing.assert_array_equal(groups[1][3]['Test'], [2, 3])
+    assert groups[3][3] == {} and list(groups[3][4]) == ['A']
+    # a new key with all the groups filling runs the oldest first
+    groups = list(batches(scenarios, size=2, groups=1))
+    assert [b[2] for b in groups] == [[0, 1], [2, 3], [4], ['x'], [6]]
+    groups = list(batches([dict(model='sirs', T=t) for t in (10, 20, 10, 30, 10)], size=4, groups=2))
+    assert [(b[1], b[2]) for b in groups] == [(10, [0, 2]), (20, [1]), (30, [3]), (10, [4])]
+    with pytest.raises(ValueError):
+        list(batches([dict(Test=1)]))
+    with pytest.raises(ValueError):
+        list(batches([dict(model='siqrar', beta=0.3)]))
+
+
+def test_outcomes_of_an_ode_model():
+    p = dict(Test=np.array([500.0, 3000.0]))
+    out = run('siqrar', 60, ['a', 'b'], p, {})
+    ret = sweep('siqrar', p, t=np.arange(60.0))
+    S, I, Q, A, R, Rq = np.moveaxis(ret, -1, 0)
+    np.testing.assert_allclose(out['peak'], (I + A).max(axis=0))
+    np.testing.assert_array_equal(out['peak_day'], (I + A).argmax(axis=0))
+    # the flows integrated along the run are the changes of the compartments
+    np.testing.assert_allclose(out['positives'], Q[-1] + Rq[-1], rtol=1e-6)
+    np.testing.assert_allclose(out['final_size'], S[0] - S[-1], rtol=1e-6)
+
+
+def test_outcomes_of_difference_equations():
+    p = dict(Test=np.array([0.0, 700.0]))
+    out = run('siqar_test', None, [0, 1], p, {})
+    S, I, Q, A, R, Rq, Np = np.moveaxis(simulate('siqar_test', p), 1, 0)
+    np.testing.assert_allclose(out['final_size'], S[:, 0] - S[:, -1], rtol=1e-12)
+    assert out['positives'][0] == 0 and out['positives'][1] > 0
+
+
+def test_main(tmp_path):
+    path = tmp_path / 'scenarios.jsonl'
+    with open(str(path), 'w') as f:
+        for i in range(40):
+            model = ('siqrar', 'trasym', 'siqar_test', 'seir_ld')[i % 4]
+            f.write(json.dumps(dict(id=i, model=model, T=30, beta1=0.2 + 0.002 * i)) + '\n')
+    rows = {}
+    for workers in (1, 2):
+        output = str(tmp_path / ('outcomes%d.csv' % workers))
+        main([str(path), '-o', output, '--workers', str(workers), '--batch', '4'])
+        with open(output) as f:
+            reader = csv.DictReader(f)
+            assert tuple(reader.fieldnames) == COLUMNS
+            rows[workers] = sorted(reader, key=lambda r: int(r['id']))
+    assert len(rows[1]) == 40 and rows[1] == rows[2]
+    assert [r['model'] for r in rows[1][:4]] == ['siqrar', 'trasym', 'siqar_test', 'seir_ld']
+
+
+def test_parquet(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    path = tmp_path / 'scenarios.json'
+    path.write_text(json.dumps([dict(id='a', model='sirs'), dict(id='b', model='sirs', beta=0.4)]))
+    output = str(tmp_path / 'outcomes.parquet')
+    main([str(path), '-o', output, '--workers', '1'])
+    table = pq.read_table(output)
+    assert table.column_names == list(COLUMNS) and table.num_rows == 2
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from sensitivity import OUTPUTS, _merge, morris, sobol
+
+BOUNDS = {'beta1': (0.2, 0.3), 'beta2': (0.2, 0.3), 'Test': (1000, 3000)}
+# a linear function of the parameters: beta2 has 4 times the variance of beta1, Test none
+LINEAR = {'linear': ('last', 'beta1 + 2 * beta2 + 0 * S')}
+
+
+def test_sobol_of_a_linear_function():
+    indices, dropped = sobol('siqrar', BOUNDS, 1024, LINEAR, T=5, workers=1)
+    assert dropped == 0
+    np.testing.assert_allclose(indices['linear']['first'], [0.2, 0.8, 0], atol=0.03)
+    np.testing.assert_allclose(indices['linear']['total'], [0.2, 0.8, 0], atol=0.03)
+
+
+def test_morris_of_a_linear_function():
+    screening, dropped = morris('siqrar', BOUNDS, 50, LINEAR, T=5, workers=1)
+    # the elementary effects per the whole range are the coefficients times the widths
+    np.testing.assert_allclose(screening['linear']['mu'], [0.1, 0.2, 0], atol=1e-12)
+    np.testing.assert_allclose(screening['linear']['mu_star'], [0.1, 0.2, 0], atol=1e-12)
+    np.testing.assert_allclose(screening['linear']['sigma'], 0, atol=1e-6)
+
+
+def test_batches_and_workers():
+    one, _ = sobol('siqrar', BOUNDS, 256, T=20, batch=64, workers=1)
+    two, _ = sobol('siqrar', BOUNDS, 256, T=20, batch=64, workers=2)
+    whole, _ = sobol('siqrar', BOUNDS, 256, T=20, workers=1)
+    for name in OUTPUTS:
+        for key in ('first', 'total'):
+            np.testing.assert_allclose(one[name][key], two[name][key], rtol=1e-9)
+            np.testing.assert_allclose(one[name][key], whole[name][key], rtol=1e-9)
+    one, _ = morris('siqrar', BOUNDS, 40, T=20, batch=16, workers=1)
+    two, _ = morris('siqrar', BOUNDS, 40, T=20, batch=16, workers=2)
+    for name in OUTPUTS:
+        np.testing.assert_allclose(one[name]['mu_star'], two[name]['mu_star'], rtol=1e-9)
+
+
+def test_merge_of_the_variances():
+    rng = np.random.default_rng(0)
+    x = 1e8 + rng.standard_normal((2, 100))
+    total = None
+    for part in np.split(x, [10, 55], axis=1):
+        both = np.concatenate([part, part], axis=1)
+        total = _merge(total, dict(n=part.shape[1], mean=both.mean(axis=1),
+                                   m2=((both - both.mean(axis=1, keepdims=True)) ** 2).sum(axis=1)))
+    both = np.concatenate([x, x], axis=1)
+    np.testing.assert_allclose(total['mean'], both.mean(axis=1))
+    np.testing.assert_allclose(total['m2'], ((both - both.mean(axis=1, keepdims=True)) ** 2).sum(axis=1))
+
+
+def test_difference_equations_and_unknown_bounds():
+    indices, _ = sobol('siqar_test', dict(BOUNDS, delta=(0.5, 1.0)), 64, workers=1)
+    assert indices['Total positives']['total'].shape == (4,)
+    with pytest.raises(ValueError):
+        sobol('siqrar', {'beta': (0.1, 0.2)}, 64, workers=1)
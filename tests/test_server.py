@@ -0,0 +1,100 @@
+import http.client
+import json
+import threading
+
+import numpy as np
+import pytest
+
+from cache import Cache
+from compiled import solve
+from diffeq import simulate
+from server import Service, serve
+
+
+@pytest.fixture(scope='module')
+def service(tmp_path_factory):
+    # an empty cache, not the one on disk of earlier runs
+    service = Service(workers=2, warm=['sirs', 'siqar_test'], cache=Cache(str(tmp_path_factory.mktemp('results'))))
+    yield service
+    service.close()
+
+
+def test_solve(service):
+    t, ret = service.solve('sirs', T=50, beta=0.4)
+    np.testing.assert_array_equal(t, np.arange(50.0))
+    np.testing.assert_array_equal(ret, solve('sirs', dict(beta=0.4), t=np.arange(50.0)))
+    assert not ret.flags.writeable
+    t, ret = service.solve('siqar_test', T=30, Test=700, A=10)
+    np.testing.assert_array_equal(ret, simulate('siqar_test', dict(Test=700), dict(A=10), 30)[0].T)
+
+
+def test_respond(service):
+    body, kind, headers = service.respond('sirs', T=20, I=50)
+    answer = json.loads(body)
+    assert kind == 'application/json' and answer['model'] == 'sirs' and answer['t'] == list(range(20))
+    ret = service.solve('sirs', T=20, I=50)[1]
+    assert answer['compartments']['I'] == ret[:, 1].tolist()
+    body, kind, headers = service.respond('sirs', format='binary', T=20, I=50)
+    assert kind == 'application/octet-stream' and headers['X-Shape'] == '20,%d' % ret.shape[1]
+    np.testing.assert_array_equal(np.frombuffer(body, '<f8').reshape(ret.shape), ret)
+    # the bodies are kept
+    assert service.respond('sirs', format='binary', T=20, I=50)[0] is body
+
+
+def test_coalescing(service):
+    before = service.report()
+    results = []
+
+    def request():
+        results.append(service.solve('sirs', T=365, beta=0.321)[1])
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    after = service.report()
+    # one solve for the eight requests, the others waited for it or found it in the cache
+    assert after['requests'] - before['requests'] == 8 and after['solved'] - before['solved'] == 1
+    assert (after['coalesced'] - before['coalesced']) + (after['memory_hits'] - before['memory_hits']) == 7
+    assert all(r is results[0] for r in results)
+
+
+def test_errors(service):
+    with pytest.raises(ValueError):
+        service.solve('nomodel')
+    with pytest.raises(ValueError):
+        service.solve('sirs', Test=1)
+    with pytest.raises(ValueError):
+        service.respond('sirs', format='csv')
+
+
+def test_http(tmp_path):
+    server = serve(port=0, workers=1, warm=['sirs'], cache=Cache(str(tmp_path)), background=True)
+    try:
+        connection = http.client.HTTPConnection('127.0.0.1', server.server_address[1])
+        connection.request('GET', '/solve?model=sirs&T=10&beta=0.4')
+        response = connection.getresponse()
+        assert response.status == 200
+        S = server.service.solve('sirs', 10, beta=0.4)[1][:, 0]
+        assert json.loads(response.read())['compartments']['S'] == S.tolist()
+        connection.request('POST', '/solve', json.dumps(dict(model='sirs', T=10, format='binary')))
+        response = connection.getresponse()
+        assert response.status == 200 and response.getheader('X-Shape').startswith('10,')
+        response.read()
+        for path, status in (('/solve?model=nomodel', 400), ('/solve?model=sirs&Test=1', 400), ('/nothing', 404)):
+            connection.request('GET', path)
+            response = connection.getresponse()
+            assert response.status == status, path
+            assert 'error' in json.loads(response.read())
+        connection.request('GET', '/models')
+        assert 'siqar_test' in json.loads(connection.getresponse().read())
+        # without workers the solves fail, and the connection still gets an answer
+        server.service.pool.shutdown()
+        connection.request('GET', '/solve?model=sirs&T=12')
+        response = connection.getresponse()
+        assert response.status == 500 and 'RuntimeError' in json.loads(response.read())['error']
+        connection.close()
+    finally:
+        server.shutdown()
+        server.service.close()
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from models import MODELS
+from stability import boundary, disease_free, equilibria, fate, infected, stability
+
+
+def test_disease_free_state():
+    y = disease_free(MODELS['siqrar'], dict(N=np.array([1e6, 2e6])))
+    np.testing.assert_array_equal(y, [[1e6, 0, 0, 0, 0, 0], [2e6, 0, 0, 0, 0, 0]])
+    assert [MODELS['seir_ld'].compartments[i] for i in infected(MODELS['seir_ld'])] == ['E', 'I']
+
+
+# R and the growth rate at the disease-free state as functions of the parameters of the script
+@pytest.mark.parametrize('model, R, growth', [
+    ('sirs', lambda p: p['beta'] / p['gamma'], lambda p: p['beta'] - p['gamma']),
+    ('siqr', lambda p: p['beta'] / (p['gamma'] + p['delta']), lambda p: p['beta'] - p['gamma'] - p['delta']),
+    # F = beta (the rows of I and A), V = diag(gamma + delta)
+    ('tracing', lambda p: p['beta1'] / (p['gamma1'] + p['delta1']) + p['beta2'] / (p['gamma2'] + p['delta2']),
+     None),
+])
+def test_closed_forms(model, R, growth):
+    p = MODELS[model].params
+    s = stability(model)
+    assert s['R'][0] == pytest.approx(R(p))
+    if growth is not None:
+        assert s['growth'][0] == pytest.approx(growth(p))
+
+
+def test_seir_before_and_after_the_lockdown():
+    p = MODELS['seir_ld'].params
+    assert stability('seir_ld')['R'][0] == pytest.approx(p['beta0'] / p['gamma'])
+    assert stability('seir_ld', t=p['t_ld'] + 1)['R'][0] == pytest.approx(p['beta1'] / p['gamma'])
+    # the exposed: growth is the largest root of (x + sigma)(x + gamma) = sigma * beta0
+    b, c = p['sigma'] + p['gamma'], p['sigma'] * p['gamma'] - p['sigma'] * p['beta0']
+    assert stability('seir_ld')['growth'][0] == pytest.approx((-b + np.sqrt(b * b - 4 * c)) / 2)
+
+
+def test_siqrar_with_the_tests():
+    # the tests remove a = Test / (2 Flu) of I per day, and as many of A per infected I
+    p = MODELS['siqrar'].params
+    Test = np.array([0.0, 500.0, 2000.0, 5000.0])
+    a = Test / (2 * p['Flu'])
+    b1, b2, g1, g2 = p['beta1'], p['beta2'], p['gamma1'], p['gamma2']
+    s = stability('siqrar', dict(Test=Test))
+    np.testing.assert_allclose(s['R'], b1 * (1 - a / g2) / (g1 + a) + b2 / g2)
+    J = np.array([[[b1 - x - g1, b1], [b2 - x, b2 - g2]] for x in a])
+    np.testing.assert_allclose(s['growth'], np.maximum(np.linalg.eigvals(J).real.max(axis=1), -g1))
+    # the defaults of the script
+    assert s['growth'][2] == pytest.approx(-0.2)
+    assert s['R'][2] == pytest.approx(0.4167, abs=1e-4)
+
+
+def test_equilibria():
+    p = MODELS['sirs'].params
+    states = equilibria('sirs')
+    assert dict(S=p['N'], I=0, R=0) in states
+    # the endemic equilibrium: S = gamma / beta * N and xi * R = gamma * I
+    endemic = [s for s in states if s['I'] > 0]
+    assert len(endemic) == 1
+    assert endemic[0]['S'] == pytest.approx(p['gamma'] / p['beta'] * p['N'])
+    assert p['xi'] * endemic[0]['R'] == pytest.approx(p['gamma'] * endemic[0]['I'])
+
+
+def test_boundary_agrees_with_the_fate_of_every_point():
+    Test = np.linspace(0, 6000, 7)
+    A0 = np.logspace(1, 6, 12)
+    edge, stats = boundary('siqrar', 'Test', 'A', Test, A0, coarse=3, T=200)
+    x, y = np.meshgrid(Test, A0, indexing='ij')
+    outbreak, _ = fate('siqrar', dict(Test=x.ravel()), dict(A=y.ravel()), T=200)
+    outbreak = outbreak.reshape(x.shape)
+    for i in range(len(Test)):
+        assert not outbreak[i, :edge[i]].any() and outbreak[i, edge[i]:].all()
+    assert stats['runs'] < x.size
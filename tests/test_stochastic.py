@@ -0,0 +1,94 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from models import MODELS
+from stochastic import INFECTIOUS, infectious, simulate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# A small population, with fewer initial infected than the defaults of the scripts
+SMALL = {'siqr': ({'N': 2000.0}, {'I': 20.0}), 'siqrar': ({'N': 2000.0}, {'A': 20.0}),
+         'seir_ld': ({'N': 2000.0}, {'E': 20.0})}
+
+# Two models one after the other in a fresh process, printing a checksum of each
+TWO = """
+import numpy as np
+from stochastic import simulate
+for model, (p, y0) in %r:
+    p, y0 = ({k: np.array([v]) for k, v in d.items()} for d in (p, y0))
+    out, extinct = simulate(model, p, y0, replicates=20, t=np.arange(31.0), seed=3)
+    print(model, repr(float(out.sum())), int(extinct.sum()))
+"""
+
+
+def _small(model, replicates, t, **options):
+    p, y0 = ({k: np.array([v]) for k, v in d.items()} for d in SMALL[model])
+    return simulate(model, p, y0, replicates=replicates, t=t, **options)
+
+
+def _fresh(models):
+    code = TWO % ([(model, SMALL[model]) for model in models],)
+    ret = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return sorted(ret.stdout.split('\n')[:-1])
+
+
+def test_two_models_in_fresh_processes():
+    # each model has its own compiled copy, whichever runs first and whatever is in the cache
+    first = _fresh(('siqr', 'seir_ld'))
+    second = _fresh(('seir_ld', 'siqr'))
+    assert first == second
+    for line in first:
+        model, total, extinct = line.split()
+        out, here = _small(model, 20, np.arange(31.0), seed=3)
+        assert float(total) == float(out.sum())
+        assert int(extinct) == here.sum()
+
+
+def test_seeds():
+    run = lambda seed: _small('siqr', 10, np.arange(21.0), seed=seed)[0]
+    np.testing.assert_array_equal(run(1), run(1))
+    assert not np.array_equal(run(1), run(2))
+    # the replicates have streams of their own
+    out = run(1)[0]
+    assert len({r.tobytes() for r in out}) == len(out)
+
+
+@pytest.mark.parametrize('method', ['ssa', 'tau'])
+@pytest.mark.parametrize('model', list(SMALL))
+def test_conservation(model, method):
+    out, _ = _small(model, 5, np.arange(31.0), method=method)
+    total = out.sum(axis=2)
+    np.testing.assert_array_equal(total, np.broadcast_to(total[..., :1], total.shape))
+    assert out.min() >= 0
+
+
+def test_infectious_compartments():
+    m = MODELS['seir_ld']
+    assert [m.compartments[i] for i in infectious(m)] == ['E', 'I']
+    for name, m in MODELS.items():
+        assert all(c in m.compartments for c in INFECTIOUS.get(name, ()))
+        assert infectious(m)
+    # only exposed at the start: not extinct, the infection is still to come
+    out, extinct = _small('seir_ld', 5, np.array([0.0]))
+    assert not extinct.any()
+
+
+def test_without_infection():
+    out, extinct = simulate('siqr', dict(N=np.array([1000.0])), dict(I=np.array([0.0])), replicates=3,
+                            t=np.arange(11.0))
+    assert extinct.all()
+    np.testing.assert_array_equal(out[..., -1], out[..., 0])
+
+
+def test_negative_initial_counts():
+    with pytest.raises(ValueError):
+        simulate('siqr', dict(N=np.array([2000.0])), replicates=1, t=np.arange(2.0))
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        simulate('siqr', replicates=1, method='euler')
@@ -0,0 +1,75 @@
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+
+from models import MODELS
+from store import Store
+from sweep import sweep
+
+
+def _batch(n, seed):
+    rng = np.random.default_rng(seed)
+    p = dict(Test=rng.uniform(1000, 3000, n))
+    y0 = dict(A=rng.uniform(500, 2000, n))
+    args, y = MODELS['siqrar'].batch(p, y0)
+    return sweep('siqrar', p, y0), args
+
+
+def test_append_and_read_across_chunks(tmp_path):
+    m = MODELS['siqrar']
+    store = Store.create(str(tmp_path / 'runs'), 'siqrar', m.t, chunk=16, solver=dict(method='rk4'))
+    ret = []
+    for n, seed in ((10, 0), (25, 1), (3, 2)):
+        r, args = _batch(n, seed)
+        store.append(r, args)
+        ret.append((r, args))
+    assert len(store) == 38
+    I = np.concatenate([r[:, :, m.compartments.index('I')].T for r, _ in ret])
+    np.testing.assert_array_equal(store.read('I'), I)
+    np.testing.assert_array_equal(store.read('I', 5, 30), I[5:30])
+    np.testing.assert_array_equal(store.read('I', day=20), I[:, 20])
+    Test = np.concatenate([np.broadcast_to(args[list(m.params).index('Test')], r.shape[1]) for r, args in ret])
+    np.testing.assert_array_equal(store.params()['Test'], Test)
+    # within one chunk, a view of the file
+    assert not store.read('A', 16, 20).flags.owndata
+    # the solver settings are kept with the data
+    assert Store(str(tmp_path / 'runs')).meta['solver'] == dict(method='rk4')
+
+
+def test_float32(tmp_path):
+    store = Store.create(str(tmp_path / 'runs'), 'siqrar', MODELS['siqrar'].t, dtype='float32')
+    r, args = _batch(4, 0)
+    store.append(r, args)
+    assert store.read('S').dtype == np.float32
+    np.testing.assert_allclose(store.read('S'), r[:, :, 0].T, rtol=1e-7)
+
+
+def test_wrong_shape(tmp_path):
+    store = Store.create(str(tmp_path / 'runs'), 'siqrar', np.arange(10.0))
+    r, args = _batch(2, 0)
+    with pytest.raises(ValueError):
+        store.append(r, args)
+    assert len(store) == 0
+
+
+def _count(path, queue):
+    queue.put((len(Store(path)), float(Store(path).read('I', day=-1).sum())))
+
+
+def test_another_process_reads_what_was_appended(tmp_path):
+    path = str(tmp_path / 'runs')
+    store = Store.create(path, 'siqrar', MODELS['siqrar'].t, chunk=8)
+    reader = Store(path)
+    r, args = _batch(12, 0)
+    store.append(r, args)
+    assert len(reader) == 0 and len(reader.refresh()) == 12
+    # not forked, the parallel loops of Numba which ran earlier in this process do not survive a fork
+    context = multiprocessing.get_context('forkserver')
+    queue = context.Queue()
+    process = context.Process(target=_count, args=(path, queue))
+    process.start()
+    process.join()
+    assert queue.get() == (12, float(r[-1, :, 1].sum()))
+    assert sorted(os.listdir(os.path.join(path, 'I'))) == ['0.npy', '1.npy']
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+import scipy.sparse
+from scipy.integrate import odeint
+
+from models import MODELS
+from stratified import Stratified, two_groups
+
+
+@pytest.mark.parametrize('model', ['massteststratified', 'vaccinationstratified'])
+def test_two_groups_as_the_script(model):
+    m = MODELS[model]
+    p = dict(m.params, beta=0.3)
+    init = m.initial(p)
+    ref = odeint(m.deriv, [init[c] for c in m.compartments], m.t, args=m.args(p), rtol=1e-10, atol=1e-4)
+    strat, y0 = two_groups(model, dict(beta=0.3))
+    ret = strat.solve(y0, m.t, rtol=1e-10, atol=1e-4)
+    # S1, S2, I1, I2, R1, R2 as in the script
+    np.testing.assert_allclose(ret.reshape(len(m.t), 6), ref, atol=1e-6 * p['N'])
+
+
+def test_equal_groups_are_one_group():
+    # K equal groups mixing uniformly behave as one group of the total size
+    K = 50
+    t = np.linspace(0, 100, 101)
+    many = Stratified(np.full(K, 1e4), np.full((K, K), 1 / K), beta=0.3, gamma=0.1, r=0.002, s=0.9)
+    one = Stratified([K * 1e4], [[1]], beta=0.3, gamma=0.1, r=0.002, s=0.9)
+    ret = many.solve(many.initial(10), t, rtol=1e-10, atol=1e-6)
+    ref = one.solve(one.initial(10 * K), t, rtol=1e-10, atol=1e-6)
+    np.testing.assert_allclose(ret.sum(axis=2), ref[:, :, 0], rtol=1e-6, atol=1e-3)
+
+
+def test_sparse_contacts_and_conservation():
+    rng = np.random.default_rng(0)
+    K = 200
+    sizes = rng.uniform(5000, 20000, K)
+    C = scipy.sparse.random(K, K, density=0.05, random_state=0, format='csr') + scipy.sparse.eye(K)
+    C = scipy.sparse.diags(1 / np.asarray(C.sum(axis=1)).ravel()) @ C
+    strat = Stratified(sizes, C, beta=0.3, gamma=0.15, r=rng.uniform(0, 0.01, K), v=rng.choice([0, 0.5], K))
+    ret = strat.solve(strat.initial(np.where(np.arange(K) < 5, 10, 0)), np.linspace(0, 100, 51))
+    assert ret.shape == (51, 3, K)
+    np.testing.assert_allclose(ret.sum(axis=1), np.broadcast_to(sizes, (51, K)), rtol=1e-9)
+    assert ret.min() > -1e-3
+
+
+def test_shape_of_the_contacts():
+    with pytest.raises(ValueError):
+        Stratified([1e4, 1e4], np.eye(3), beta=0.3, gamma=0.1)
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from models import MODELS
+from sweep import grid, rk4_step, sweep
+
+
+@pytest.mark.parametrize('model', ['siqr', 'siqrar', 'sirs', 'tracing', 'vaccinationstratified'])
+@pytest.mark.parametrize('method', ['rk4', 'rk45'])
+def test_sweep_agrees_with_the_script(script, model, method):
+    s = script(model)
+    ret = sweep(model, method=method)
+    assert ret.shape == (len(s['t']), 1, len(MODELS[model].compartments))
+    assert np.abs(ret[:, 0] - s['ret']).max() < 1e-5 * s['N']
+
+
+def test_batch_equals_single_runs():
+    p, y0 = grid('siqrar', Test=[0, 2000, 8000], A=[100, 5000])
+    ret = sweep('siqrar', p, y0)
+    assert ret.shape[1] == 6
+    for k in range(6):
+        single = sweep('siqrar', dict(Test=p['Test'][k]), dict(A=y0['A'][k]))
+        np.testing.assert_allclose(ret[:, k], single[:, 0], rtol=1e-12)
+
+
+def test_grid_is_the_cartesian_product():
+    p, y0 = grid('siqrar', Test=[1, 2, 3], A=[10, 20])
+    assert sorted(zip(p['Test'], y0['A'])) == [(a, b) for a in (1, 2, 3) for b in (10, 20)]
+
+
+def test_rk4_step_is_fourth_order():
+    f = lambda y, t: -y
+    errors = [abs(rk4_step(f, np.array([1.0]), 0.0, h)[0] - np.exp(-h)) for h in (0.1, 0.05)]
+    assert 25 < errors[0] / errors[1] < 40
+
+
+def test_rk45_stops_on_nan():
+    # without Flu and infected the testing rate of siqrar.py is 0 / 0
+    with np.errstate(invalid='ignore'):
+        ret = sweep('siqrar', dict(Flu=[0.0]), dict(I=0, A=0), method='rk45')
+        assert np.isnan(ret[1:]).all()
+        np.testing.assert_array_equal(np.isnan(ret), np.isnan(sweep('siqrar', dict(Flu=[0.0]), dict(I=0, A=0))))
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        sweep('siqr', method='euler')